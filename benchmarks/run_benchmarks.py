@@ -0,0 +1,142 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from util import MD2, md2_writer  # noqa: E402
+from benchmarks.synthetic_md2 import synthetic_md2_bytes  # noqa: E402
+"""
+Headless benchmarks of the MD2 parser stages on synthetic models, run from the repository root with
+    python benchmarks/run_benchmarks.py --output bench.json
+and compare a later run against it with
+    python benchmarks/run_benchmarks.py --compare bench.json --max-ratio 1.5
+"""
+
+# (frames, vertices, triangles, gl command length)
+DEFAULT_GRID = {
+    "frames": [1, 40, 200],
+    "vertices": [100, 600],
+    "triangles": [200, 1200],
+    "gl_command_length": [8],
+}
+
+
+def parser_stages(file_bytes):
+    """
+    :param file_bytes: content of an .md2 file
+    :return: dict of stage name -> (function without arguments, number of input bytes)
+    """
+    byte_list = memoryview(file_bytes)
+    header = MD2.load_header(byte_list)
+    tris = byte_list[header.ofs_tris:header.ofs_frames]
+    frames = byte_list[header.ofs_frames:header.ofs_glcmds]
+    st = byte_list[header.ofs_st:header.ofs_tris]
+    gl_commands = byte_list[header.ofs_glcmds:header.ofs_end]
+    gl_command_arrays = MD2.load_gl_command_arrays(gl_commands)
+    model = MD2.load_buffer(file_bytes)
+    encode_arguments = (model.positions, model.vertex_indices, model.texture_indices, model.st, header.skinwidth,
+                        header.skinheight, model.skin_names, model.frame_info["name"].tolist(), model.normal_indices)
+    return {
+        "header": (lambda: MD2.load_header(byte_list), 68),
+        "triangles": (lambda: MD2.load_triangle_arrays(tris, header), len(tris)),
+        "frames": (lambda: MD2.load_frame_arrays(frames, header), len(frames)),
+        "texture_coordinates": (lambda: MD2.load_texture_coordinate_array(st, header), len(st)),
+        "gl_commands": (lambda: MD2.load_gl_command_arrays(gl_commands), len(gl_commands)),
+        "gl_command_triangles": (lambda: MD2.gl_command_triangles(gl_command_arrays), len(gl_commands)),
+        "load_buffer": (lambda: MD2.load_buffer(file_bytes), len(file_bytes)),
+        "load_buffer_lazy": (lambda: MD2.load_buffer(file_bytes, lazy=True), len(file_bytes)),
+        "encode_model": (lambda: md2_writer.encode_model(*encode_arguments), len(file_bytes)),
+    }
+
+
+def measure(function, num_bytes, repeat):
+    """
+    :return: dict of best wall time in seconds, peak traced memory in bytes and bytes per second
+    """
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(times)
+    return {"seconds": best, "peak_bytes": peak, "bytes_per_second": num_bytes / best if best else None}
+
+
+def run(grid, repeat):
+    """
+    :param grid: dict of lists like DEFAULT_GRID
+    :param repeat: number of timed runs per stage, the best one is reported
+    :return: list of result dicts, one per model size and stage
+    """
+    results = list()
+    for frames, vertices, triangles, gl_length in itertools.product(
+            grid["frames"], grid["vertices"], grid["triangles"], grid["gl_command_length"]):
+        file_bytes = synthetic_md2_bytes(frames, vertices, triangles, gl_length)
+        size = {"frames": frames, "vertices": vertices, "triangles": triangles, "gl_command_length": gl_length}
+        for stage, (function, num_bytes) in parser_stages(file_bytes).items():
+            results.append({**size, "stage": stage, "input_bytes": num_bytes, **measure(function, num_bytes, repeat)})
+    return results
+
+
+def result_key(result):
+    return (result["frames"], result["vertices"], result["triangles"], result["gl_command_length"], result["stage"])
+
+
+def regressions(baseline, current, max_ratio):
+    """
+    Compares two runs
+    :param baseline: results of an earlier run
+    :param current: results of this run
+    :param max_ratio: maximum allowed ratio of current to baseline time per stage
+    :return: list of (key, ratio) of the stages slower than allowed
+    """
+    baseline_times = {result_key(x): x["seconds"] for x in baseline}
+    slower = list()
+    for result in current:
+        old = baseline_times.get(result_key(result))
+        if old and result["seconds"] / old > max_ratio:
+            slower.append((result_key(result), result["seconds"] / old))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the MD2 parser stages on synthetic models")
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--compare", help="JSON file of an earlier run to check for regressions")
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="allowed slowdown per stage for --compare")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage, the best one counts")
+    parser.add_argument("--frames", type=int, nargs="+", default=DEFAULT_GRID["frames"])
+    parser.add_argument("--vertices", type=int, nargs="+", default=DEFAULT_GRID["vertices"])
+    parser.add_argument("--triangles", type=int, nargs="+", default=DEFAULT_GRID["triangles"])
+    parser.add_argument("--gl-command-length", type=int, nargs="+", default=DEFAULT_GRID["gl_command_length"])
+    args = parser.parse_args(argv)
+
+    grid = {"frames": args.frames, "vertices": args.vertices, "triangles": args.triangles,
+            "gl_command_length": args.gl_command_length}
+    results = run(grid, args.repeat)
+    for x in results:
+        print(f"{x['frames']:5} frames {x['vertices']:6} verts {x['triangles']:6} tris  {x['stage']:21}"
+              f"{x['seconds'] * 1000:10.3f} ms {x['peak_bytes'] / 1024:10.1f} KiB"
+              f"{(x['bytes_per_second'] or 0) / 2 ** 20:10.1f} MiB/s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            slower = regressions(json.load(f), results, args.max_ratio)
+        for key, ratio in slower:
+            print(f"REGRESSION {key}: {ratio:.2f}x slower")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import struct
+import numpy as np
+"""
+Generator for valid synthetic MD2 files of arbitrary size, used by the benchmarks and tests
+"""
+
+HEADER_SIZE = 68
+
+
+def synthetic_md2_bytes(num_frames, num_xyz, num_tris, gl_command_length=8, num_skins=1, skin_size=256, seed=0):
+    """
+    Creates the bytes of a valid MD2 file with random content
+    :param num_frames: number of frames
+    :param num_xyz: number of vertices per frame
+    :param num_tris: number of triangles
+    :param gl_command_length: number of vertices per gl command, alternating between strips and fans
+    :param num_skins: number of skin names
+    :param skin_size: skin width and height
+    :param seed: random seed
+    :return: bytes of the .md2 file
+    """
+    rng = np.random.default_rng(seed)
+    num_st = num_xyz
+
+    skins = b"".join(f"models/synthetic/skin{i}.pcx".encode("ascii").ljust(64, b"\x00") for i in range(num_skins))
+    st = rng.integers(0, skin_size, size=(num_st, 2), dtype="<i2")
+    vertex_indices = rng.integers(0, num_xyz, size=(num_tris, 3), dtype="<i2")
+    texture_indices = rng.integers(0, num_st, size=(num_tris, 3), dtype="<i2")
+    tris = np.concatenate((vertex_indices, texture_indices), axis=1)
+
+    frames = bytearray()
+    for i in range(num_frames):
+        scale = rng.uniform(0.01, 1, size=3).astype("<f4")
+        translate = rng.uniform(-100, 100, size=3).astype("<f4")
+        frames += scale.tobytes() + translate.tobytes() + f"frame{i:03}".encode("ascii").ljust(16, b"\x00")
+        frames += rng.integers(0, 256, size=(num_xyz, 4), dtype=np.uint8).tobytes()
+
+    gl_commands = bytearray()
+    num_commands = -(-num_tris // max(gl_command_length - 2, 1)) if gl_command_length > 2 else 0
+    for i in range(num_commands):
+        mode = gl_command_length if i % 2 == 0 else -gl_command_length
+        records = np.zeros(gl_command_length, dtype=[("s", "<f4"), ("t", "<f4"), ("index", "<i4")])
+        records["s"], records["t"] = rng.uniform(0, 1, size=(2, gl_command_length))
+        records["index"] = rng.integers(0, num_xyz, size=gl_command_length)
+        gl_commands += struct.pack("<i", mode) + records.tobytes()
+    gl_commands += struct.pack("<i", 0)
+
+    ofs_skins = HEADER_SIZE
+    ofs_st = ofs_skins + len(skins)
+    ofs_tris = ofs_st + st.nbytes
+    ofs_frames = ofs_tris + tris.nbytes
+    ofs_glcmds = ofs_frames + len(frames)
+    ofs_end = ofs_glcmds + len(gl_commands)
+    header = struct.pack("<17i", 844121161, 8, skin_size, skin_size, 40 + 4 * num_xyz, num_skins, num_xyz, num_st,
+                         num_tris, len(gl_commands) // 4, num_frames, ofs_skins, ofs_st, ofs_tris, ofs_frames,
+                         ofs_glcmds, ofs_end)
+    return header + skins + st.tobytes() + tris.tobytes() + bytes(frames) + bytes(gl_commands)
+
+
+def write_synthetic_md2(path, *args, **kwargs):
+    """
+    Writes a synthetic MD2 file, see synthetic_md2_bytes for the arguments
+    """
+    with open(path, "wb") as f:
+        f.write(synthetic_md2_bytes(*args, **kwargs))
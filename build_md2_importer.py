@@ -6,7 +6,19 @@ files = [
     "util/MD2.py",
     "md2_importer/__init__.py",
     "md2_importer/blender_load_md2.py",
-    "util/prepare_skin_paths.py"
+    "util/prepare_skin_paths.py",
+    "util/keyframes.py",
+    "util/pcx.py",
+    "util/batch.py",
+    "util/md2_cache.py",
+    "util/pak.py",
+    "util/animations.py",
+    "util/profiling.py",
+    "util/catalog.py",
+    "util/anorms.py",
+    "util/jobs.py",
+    "util/reimport.py",
+    "util/playback.py",
 ]
 
 # intermediary location for the directory to be zipped
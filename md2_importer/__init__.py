@@ -3,7 +3,7 @@ bl_info = {
     "author": "Lennart G",
     "location": "File > Import > Quake 2 (.md2)",
     "version": (0, 3, 0),
-    "blender": (2, 80, 0),
+    "blender": (3, 1, 0),  # Python 3.10, e.g. for dataclass slots
     "category": "Import-Export"
 }
 
@@ -11,22 +11,127 @@ bl_info = {
 # if it's there, reload everything
 if "bpy" in locals():
     import imp
+    # every util module the add-on imports, each one after the modules it imports
+    try:
+        imp.reload(profiling)
+    except NameError:
+        from util import profiling
+        imp.reload(profiling)
+
+    try:
+        imp.reload(anorms)
+    except NameError:
+        from util import anorms
+        imp.reload(anorms)
+
+    try:
+        imp.reload(animations)
+    except NameError:
+        from util import animations
+        imp.reload(animations)
+
     try:
         imp.reload(MD2)
     except NameError:
         from util import MD2
         imp.reload(MD2)
 
+    try:
+        imp.reload(pcx)
+    except NameError:
+        from util import pcx
+        imp.reload(pcx)
+
     try:
         imp.reload(prepare_skin_paths)
     except NameError:
         from util import prepare_skin_paths
         imp.reload(prepare_skin_paths)
+
+    try:
+        imp.reload(pak)
+    except NameError:
+        from util import pak
+        imp.reload(pak)
+
+    try:
+        imp.reload(keyframes)
+    except NameError:
+        from util import keyframes
+        imp.reload(keyframes)
+
+    try:
+        imp.reload(batch)
+    except NameError:
+        from util import batch
+        imp.reload(batch)
+
+    try:
+        imp.reload(md2_cache)
+    except NameError:
+        from util import md2_cache
+        imp.reload(md2_cache)
+
+    try:
+        imp.reload(catalog)
+    except NameError:
+        from util import catalog
+        imp.reload(catalog)
+
+    try:
+        imp.reload(reimport)
+    except NameError:
+        from util import reimport
+        imp.reload(reimport)
+
+    try:
+        imp.reload(jobs)
+    except NameError:
+        from util import jobs
+        imp.reload(jobs)
+
+    try:
+        imp.reload(playback)
+    except NameError:
+        from util import playback
+        imp.reload(playback)
     imp.reload(blender_load_md2)
-    print("Reloaded multifiles")
+    logger.debug("Reloaded multifiles")
 else:
     from . import blender_load_md2
-    print("Imported multifiles")
+    try:
+        from . import profiling
+        from . import anorms
+        from . import animations
+        from . import MD2
+        from . import pcx
+        from . import prepare_skin_paths
+        from . import pak
+        from . import keyframes
+        from . import batch
+        from . import md2_cache
+        from . import catalog
+        from . import reimport
+        from . import jobs
+        from . import playback
+    except ImportError:
+        from util import profiling
+        from util import anorms
+        from util import animations
+        from util import MD2
+        from util import pcx
+        from util import prepare_skin_paths
+        from util import pak
+        from util import keyframes
+        from util import batch
+        from util import md2_cache
+        from util import catalog
+        from util import reimport
+        from util import jobs
+        from util import playback
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.debug("Imported multifiles")
 
 """
 This part is required for the UI, to make the Addon appear under File > Import once it's
@@ -39,8 +144,33 @@ The code here calls blender_load_md2
 # invoke() function which calls the file selector.
 import bpy
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty
-from bpy.types import Operator
+import json
+import os
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, FloatProperty, CollectionProperty
+from bpy.types import Operator, OperatorFileListElement
+
+
+# models listed for the selected .pak, blender requires a reference to dynamic enum items to be kept
+_pak_entry_items = list()
+_pak_entry_items_key = None
+
+
+def pak_entry_items(self, context):
+    """ Lists the models inside the .pak selected in the file browser """
+    global _pak_entry_items, _pak_entry_items_key
+    path = self.filepath
+    if not path.lower().endswith(".pak") or not os.path.isfile(path):
+        return [('NONE', "No .pak selected", "Select a .pak file to choose a model inside of it")]
+    key = (path, os.path.getmtime(path))
+    if key != _pak_entry_items_key:
+        try:
+            with pak.PakFile(path) as archive:
+                names = archive.names(".md2")
+        except ValueError:
+            names = list()
+        _pak_entry_items = [(x, x, "") for x in names] or [('NONE', "No models in .pak", "")]
+        _pak_entry_items_key = key
+    return _pak_entry_items
 
 
 class ImportSomeData(Operator, ImportHelper):
@@ -74,8 +204,428 @@ class ImportSomeData(Operator, ImportHelper):
                                                default="",
                                                maxlen=1024)
 
+    animation_mode: EnumProperty(
+        name="Animation",
+        description="How the MD2 frames are turned into a Blender animation",
+        items=(
+            ('SHAPE_KEYS', "Shape keys", "One shape key per frame, only the shape key values are keyed"),
+            ('VERTEX_KEYFRAMES', "Vertex keyframes", "Keyframe every vertex in every frame (slow, large .blend files)"),
+            ('PLAYBACK', "Playback without keys", "Write the current frame into the mesh on every frame change from "
+                                                  "the memory-mapped MD2 frames. Fast to import, can be baked to keys"),
+        ),
+        default='SHAPE_KEYS',
+    )
+
+    interpolate_playback: BoolProperty(
+        name="Interpolate playback",
+        description="Playback without keys only: blend linearly between MD2 frames instead of holding each frame",
+        default=True,
+    )
+
+    reduce_keyframes: BoolProperty(
+        name="Reduce keyframes",
+        description="Vertex keyframes only: skip vertices that never move and keys that linear interpolation "
+                    "between their neighbours reproduces",
+        default=True,
+    )
+    keyframe_tolerance: FloatProperty(
+        name="Keyframe tolerance",
+        description="Largest difference to the MD2 frames when reducing keyframes, in quantization steps of the "
+                    "compressed MD2 vertices",
+        default=0.5,
+        min=0.0,
+        soft_max=2.0,
+    )
+
+    # multi-selection in the file browser and its directory, used for batch imports
+    files: CollectionProperty(type=OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN', 'SKIP_SAVE'})
+
+    import_directory: BoolProperty(
+        name="Import whole directory",
+        description="Import every .md2 file in the selected directory and its subdirectories",
+        default=False,
+    )
+    directory_filter: StringProperty(
+        name="Directory filter",
+        description="Only import models of the directory whose path, skin names or animation names contain this text. "
+                    "The directory is indexed into the model catalog, unchanged files aren't read again",
+        default="",
+        maxlen=1024,
+    )
+    parse_workers: IntProperty(
+        name="Parse processes",
+        description="Number of processes parsing files in batch imports not run in background, 0 for one per CPU core",
+        default=0,
+        min=0,
+    )
+
+    use_cache: BoolProperty(
+        name="Use parse cache",
+        description="Keep parsed models in an on-disk cache so re-importing unchanged files skips parsing",
+        default=False,
+    )
+
+    skin_search_paths: StringProperty(
+        name="Skin search paths",
+        description="Game directories like quake2/baseq2 in which stored skin paths are looked up, "
+                    f"separated by '{os.pathsep}'",
+        default="",
+        maxlen=4096,
+    )
+
+    pak_entry: EnumProperty(
+        name="Model in .pak",
+        description="Model to import if a Quake 2 .pak archive is selected",
+        items=pak_entry_items,
+    )
+
+    animation_names: StringProperty(
+        name="Animations",
+        description="Comma separated names of the animations to import, e.g. 'stand, run'. "
+                    "Frames are grouped into animations by their names. Empty imports all of them",
+        default="",
+        maxlen=4096,
+    )
+    use_frame_range: BoolProperty(
+        name="Limit frame range",
+        description="Only import the MD2 frames from first to last frame",
+        default=False,
+    )
+    frame_start: IntProperty(name="First frame", description="First MD2 frame to import", default=0, min=0)
+    frame_end: IntProperty(name="Last frame", description="Last MD2 frame to import", default=0, min=0)
+    fps: IntProperty(
+        name="Animation fps",
+        description="MD2 frames per second, Quake 2 animates at 10",
+        default=10,
+        min=1,
+    )
+
+    use_md2_normals: BoolProperty(
+        name="Use MD2 normals",
+        description="Apply the vertex normals stored in the MD2 as custom normals (of the first imported frame)",
+        default=True,
+    )
+
+    reload_skins: BoolProperty(
+        name="Reload skins",
+        description="Load skins again even if an unchanged skin file was imported before. "
+                    "By default the image and material of earlier imports are reused",
+        default=False,
+    )
+
+    update_existing: BoolProperty(
+        name="Update existing",
+        description="If a model was imported from the same file before, update that object in place. "
+                    "Only changed frames, UVs, skin or mesh are rewritten",
+        default=False,
+    )
+
+    run_in_background: BoolProperty(
+        name="Import in background",
+        description="Parse on a worker thread and build the objects in small steps, showing the progress and keeping "
+                    "the UI responsive. Esc cancels the import. Not used for .pak archives or without a window, "
+                    "e.g. in blender --background",
+        default=True,
+    )
+
+    report_path: StringProperty(
+        name="Import report",
+        description="Optional .json file the time of each import stage and the created vertices, frames and "
+                    "keyframes are written to",
+        default="",
+        subtype='FILE_PATH',
+        maxlen=1024,
+    )
+    profile_path: StringProperty(
+        name="cProfile output",
+        description="Optional file the import's cProfile stats are written to, for e.g. snakeviz. "
+                    "Only used if not importing in background",
+        default="",
+        subtype='FILE_PATH',
+        maxlen=1024,
+    )
+
+    def import_options(self):
+        """ keyword arguments of blender_load_md2 selecting the frames to import and the skin loading """
+        names = [x.strip() for x in self.animation_names.split(",") if x.strip()]
+        return {
+            "animation_names": names or None,
+            "frame_range": (self.frame_start, self.frame_end) if self.use_frame_range else None,
+            "fps": self.fps,
+            "reload_skin": self.reload_skins,
+            "use_md2_normals": self.use_md2_normals,
+            "keyframe_tolerance": self.keyframe_tolerance if self.reduce_keyframes else None,
+            "update_existing": self.update_existing,
+            "interpolate": self.interpolate_playback,
+        }
+
+    def selected_paths(self):
+        if self.import_directory and self.directory_filter.strip():
+            index = get_catalog()
+            index.scan([self.directory])
+            index.save()
+            return [x.path for x in index.filter(text=self.directory_filter.strip(), root=self.directory)]
+        if self.import_directory:
+            return batch.find_md2_files(self.directory)
+        paths = [os.path.join(self.directory, x.name) for x in self.files if x.name]
+        return paths or [self.filepath]
+
+    def execute(self, context):
+        reports = dict()  # imported path -> ImportReport
+        # a modal job needs a window to deliver its timer events, blender --background and scripts calling the
+        # operator without one import synchronously
+        background = self.run_in_background and context.window is not None and not bpy.app.background
+        if background and not self.filepath.lower().endswith(".pak"):
+            return self.start_job(context, reports)
+        with profiling.profiled(bpy.path.abspath(self.profile_path) if self.profile_path else None):
+            result = self.import_files(reports)
+        self.finish_reports(reports)
+        return result
+
+    def start_job(self, context, reports):
+        """
+        Parses the selected files on a worker thread, the timer events of modal() then create the objects
+        """
+        paths = self.selected_paths()
+        cache = get_cache() if self.use_cache else None
+        skin_resolver = get_skin_resolver(self.skin_search_paths)
+        displayed_name = self.displayed_name if len(paths) == 1 else ""
+        options = dict(self.import_options(), skin_resolver=skin_resolver)
+
+        def parse():
+            # runs on the job's thread, so no process pool is forked from it. The files are memory-mapped and only
+            # the selected frames are decoded while the animation is created.
+            return batch.parse_files(paths, cache=cache, lazy=True)
+
+        def apply(results):
+            for i, result in enumerate(results):
+                if result.error is None:
+                    report = reports[result.path] = profiling.ImportReport()
+                    steps = blender_load_md2.blender_load_md2_steps(
+                        result.path, displayed_name, self.use_custom_skin, self.custom_skin_path, self.animation_mode,
+                        my_object=result.model, report=report, **options)
+                    try:
+                        yield from jobs.scaled_progress(steps, i / len(results), (i + 1) / len(results))
+                    except Exception as e:
+                        result.error = f"{type(e).__name__}: {e}"
+                if result.error:
+                    self._failed.append(result)
+                yield (i + 1) / len(results)
+
+        self._failed = list()
+        self._num_files = len(paths)
+        self._reports = reports
+        self._job = jobs.ImportJob(parse, apply)
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(0.02, window=context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self._job.cancel()
+        elif event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        else:
+            jobs.update_progress(self._job, context.window_manager)
+        if not self._job.done:
+            return {'RUNNING_MODAL'}
+
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._timer)
+        window_manager.progress_end()
+        if self._job.state == jobs.CANCELLED:
+            self.report({'WARNING'}, "MD2 import cancelled")
+            return {'CANCELLED'}
+        if self._job.state == jobs.FAILED:
+            self.report({'ERROR'}, f"MD2 import failed: {self._job.error}")
+            return {'CANCELLED'}
+        for result in self._failed:
+            self.report({'WARNING'}, f"{result.path}: {result.error}")
+        if self._num_files > 1:
+            self.report({'INFO'}, f"Imported {self._num_files - len(self._failed)} of {self._num_files} MD2 files")
+        self.finish_reports(self._reports)
+        return {'FINISHED'} if len(self._failed) < self._num_files else {'CANCELLED'}
+
+    def finish_reports(self, reports):
+        """ writes the import reports and reports the saved keyframes """
+        if self.report_path:
+            with open(bpy.path.abspath(self.report_path), "w") as f:
+                json.dump({path: x.to_dict() for path, x in reports.items()}, f, indent=1)
+        for path, report in reports.items():
+            logger.info("%s: %s", path, report.summary())
+        saved = sum(x.counters.get("keyframes_saved", 0) for x in reports.values())
+        if saved:
+            self.report({'INFO'}, f"Reduced keyframes: {saved} keys saved")
+
+    def import_files(self, reports):
+        skin_resolver = get_skin_resolver(self.skin_search_paths)
+        if self.filepath.lower().endswith(".pak"):
+            if self.pak_entry == 'NONE':
+                self.report({'ERROR'}, "No model selected inside the .pak")
+                return {'CANCELLED'}
+            # the model and its skin are parsed straight from the memory-mapped archive
+            report = reports[f"{self.filepath}/{self.pak_entry}"] = profiling.ImportReport()
+            with pak.PakFile(self.filepath) as archive:
+                return blender_load_md2.blender_load_md2(self.pak_entry, self.displayed_name, self.use_custom_skin,
+                                                         self.custom_skin_path, self.animation_mode, pak=archive,
+                                                         report=report, **self.import_options())
+
+        paths = self.selected_paths()
+        cache = get_cache() if self.use_cache else None
+        if len(paths) == 1:
+            report = reports[paths[0]] = profiling.ImportReport()
+            with report.stage("cache"):
+                my_object = cache.load(paths[0]) if cache else None
+            return blender_load_md2.blender_load_md2(paths[0], self.displayed_name, self.use_custom_skin, self.custom_skin_path,
+                                                     self.animation_mode, my_object=my_object, skin_resolver=skin_resolver,
+                                                     report=report, **self.import_options())
+
+        # parse on a process pool, then create the blender objects one after another on the main thread
+        parse_report = reports["batch"] = profiling.ImportReport()
+        with parse_report.stage("parse"):
+            results = batch.parse_files(paths, max_workers=self.parse_workers or None, cache=cache)
+        parse_report.count("files", len(results))
+        failed = [x for x in results if x.error]
+        for result in results:
+            if result.error:
+                continue
+            try:
+                blender_load_md2.blender_load_md2(result.path, "", self.use_custom_skin, self.custom_skin_path,
+                                                  self.animation_mode, my_object=result.model, skin_resolver=skin_resolver,
+                                                  report=reports.setdefault(result.path, profiling.ImportReport()),
+                                                  **self.import_options())
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+                failed.append(result)
+        parse_report.count("failed", len(failed))
+        for result in failed:
+            self.report({'WARNING'}, f"{result.path}: {result.error}")
+        self.report({'INFO'}, f"Imported {len(results) - len(failed)} of {len(results)} MD2 files")
+        if cache:
+            self.report({'INFO'}, f"MD2 cache: {cache.hits} hits, {cache.misses} misses, {cache.evictions} evictions")
+        return {'FINISHED'}
+
+
+# one cache per session, so its hit/miss counters cover all imports
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = md2_cache.MD2Cache()
+    return _cache
+
+
+def get_catalog():
+    """ model catalog in the cache directory, see util/catalog.py """
+    return catalog.MD2Catalog()
+
+
+# skin resolvers per list of search paths, refreshed incrementally on each import
+_skin_resolvers = dict()
+
+
+def get_skin_resolver(search_paths):
+    """
+    :param search_paths: os.pathsep separated directories
+    :return: SkinResolver indexing the directories, always created so batch imports don't stat every skin candidate
+    """
+    roots = tuple(x for x in search_paths.split(os.pathsep) if x.strip())
+    resolver = _skin_resolvers.get(roots)
+    if resolver is None:
+        resolver = _skin_resolvers[roots] = blender_load_md2.SkinResolver(roots)
+    else:
+        resolver.refresh()
+    return resolver
+
+
+class ClearMD2Cache(Operator):
+    """Removes all models from the MD2 parse cache"""
+    bl_idname = "import_md2.clear_cache"
+    bl_label = "Clear MD2 Parse Cache"
+
+    def execute(self, context):
+        cache = get_cache()
+        cache.clear()
+        self.report({'INFO'}, f"MD2 cache cleared ({cache.cache_dir})")
+        return {'FINISHED'}
+
+
+# polls the source files of imported objects while watching is enabled
+_source_watcher = None
+WATCH_INTERVAL = 1.0  # seconds
+
+
+def watch_sources():
+    """ timer function updating imported objects whose source file changed """
+    if _source_watcher is None:
+        return None  # unregisters the timer
+    objects = dict()  # source path -> objects imported from it
+    for obj in bpy.data.objects:
+        source = obj.get(blender_load_md2.SOURCE_PROPERTY)
+        if source and os.path.isfile(source):  # entries of .pak archives aren't watched
+            objects.setdefault(source, list()).append(obj)
+    _source_watcher.watch(objects)
+    for path in _source_watcher.changed():
+        for obj in objects[path]:
+            try:
+                blender_load_md2.update_imported_object(obj, get_skin_resolver(""))
+            except Exception:
+                logger.exception("updating %s from %s failed", obj.name, path)
+    return WATCH_INTERVAL
+
+
+class WatchMD2Sources(Operator):
+    """Toggles updating imported MD2 models in place whenever their source file changes"""
+    bl_idname = "import_md2.watch_sources"
+    bl_label = "Watch MD2 Source Files"
+
+    def execute(self, context):
+        global _source_watcher
+        if _source_watcher is not None:
+            _source_watcher = None
+            self.report({'INFO'}, "Stopped watching MD2 source files")
+            return {'FINISHED'}
+        _source_watcher = reimport.SourceWatcher()
+        bpy.app.timers.register(watch_sources, first_interval=WATCH_INTERVAL, persistent=True)
+        self.report({'INFO'}, "Watching MD2 source files, imported models are updated when they change")
+        return {'FINISHED'}
+
+
+class UpdateMD2Objects(Operator):
+    """Re-imports the selected MD2 models from their source files, rewriting only what changed"""
+    bl_idname = "import_md2.update_selected"
+    bl_label = "Update MD2 Models From Source"
+
+    def execute(self, context):
+        updated = [x for x in context.selected_objects
+                   if blender_load_md2.update_imported_object(x, get_skin_resolver(""))]
+        self.report({'INFO'}, f"Updated {len(updated)} MD2 models")
+        return {'FINISHED'}
+
+
+class BakeMD2Playback(Operator):
+    """Replaces the playback of the selected MD2 models imported without keys by keyed animations"""
+    bl_idname = "import_md2.bake_playback"
+    bl_label = "Bake MD2 Playback to Keys"
+
+    animation_mode: EnumProperty(
+        name="Animation",
+        items=(
+            ('SHAPE_KEYS', "Shape keys", "One shape key per frame, only the shape key values are keyed"),
+            ('VERTEX_KEYFRAMES', "Vertex keyframes", "Keyframe every vertex in every frame"),
+        ),
+        default='SHAPE_KEYS',
+    )
+
     def execute(self, context):
-        return blender_load_md2.blender_load_md2(self.filepath, self.displayed_name, self.use_custom_skin, self.custom_skin_path)
+        baked = [x for x in context.selected_objects if blender_load_md2.bake_playback(x, self.animation_mode)]
+        self.report({'INFO'}, f"Baked {len(baked)} MD2 models to keys")
+        return {'FINISHED'}
 
 
 # Only needed if you want to add into a dynamic menu
@@ -87,11 +637,26 @@ def menu_func_import(self, context):
 # called when addon is activated (adds script to File > Import
 def register():
     bpy.utils.register_class(ImportSomeData)
+    bpy.utils.register_class(ClearMD2Cache)
+    bpy.utils.register_class(WatchMD2Sources)
+    bpy.utils.register_class(UpdateMD2Objects)
+    bpy.utils.register_class(BakeMD2Playback)
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    # plays back objects imported without keys, also in .blend files opened later
+    blender_load_md2.register_playback_handler()
 
 
 # called when addon is deactivated (removed script from menu)
 def unregister():
+    global _source_watcher
+    _source_watcher = None
+    if bpy.app.timers.is_registered(watch_sources):
+        bpy.app.timers.unregister(watch_sources)
+    blender_load_md2.unregister_playback_handler()
+    bpy.utils.unregister_class(BakeMD2Playback)
+    bpy.utils.unregister_class(UpdateMD2Objects)
+    bpy.utils.unregister_class(WatchMD2Sources)
+    bpy.utils.unregister_class(ClearMD2Cache)
     bpy.utils.unregister_class(ImportSomeData)
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
 
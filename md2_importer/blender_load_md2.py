@@ -2,12 +2,58 @@ import bpy
 try:
     from . import MD2
 except ImportError:
-    import util.MD2
+    from util import MD2
+try:
+    from . import keyframes
+except ImportError:
+    from util import keyframes
+try:
+    from . import pcx
+except ImportError:
+    from util import pcx
+try:
+    from . import animations
+except ImportError:
+    from util import animations
+try:
+    from . import anorms
+except ImportError:
+    from util import anorms
+try:
+    from . import jobs
+except ImportError:
+    from util import jobs
+try:
+    from . import profiling
+except ImportError:
+    from util import profiling
+try:
+    from . import reimport
+except ImportError:
+    from util import reimport
+try:
+    from . import playback
+except ImportError:
+    from util import playback
+try:
+    from . import pak as pak_files
+except ImportError:
+    from util import pak as pak_files
 try:
     from .prepare_skin_paths import * #test
 except ModuleNotFoundError:
     from util.prepare_skin_paths import *
+from bpy.app.handlers import persistent
+import io
+import json
+import logging
 import os  # for checking if skin pathes exist
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# value of 'LINEAR' in the interpolation enum of keyframe points (BEZT_IPO_LIN), for keyframe_points.foreach_set
+KEYFRAME_INTERPOLATION_LINEAR = 1
 
 
 # from https://blender.stackexchange.com/a/110112
@@ -19,29 +65,312 @@ def ShowMessageBox(message = "", title = "Message Box", icon = 'INFO'):
     bpy.context.window_manager.popup_menu(draw, title = title, icon = icon)
 
 
-def blender_load_md2(md2_path, displayed_name, use_custom_md2_skin, custom_md2_skin_path):
+def load_pcx_image(skin_path, skin_bytes=None):
     """
-    This function uses the information from a md2 dataclass into a blender object.
-    This will consist of an animated mesh and its material (which is not much more than the texture.
-    For better understanding, steps are:
-        - Create the MD2 object containing all information that's inside the loaded md2
-        - Get the absolute path of the UV map / skin to load
-        - Get necessary information about the mesh (vertices, tris, uv coordinates)
-        - Create the scene structure and create the mesh for the first frame
-        - Assign UV coordinates to each triangle
-        - Create shape animation (Add keyframe to each vertex)
-        - Assign skin to mesh
+    Decodes a .pcx skin into a new blender image with a single pixels.foreach_set.
+    PCX variants the built-in reader doesn't support are decoded by PIL if it is installed.
+    :param skin_path: path to the .pcx file, or its name if skin_bytes is given
+    :param skin_bytes: optional content of the file, e.g. read from a .pak archive
     """
-    """ Create MD2 dataclass object """
-    print("md2_path, displayed_name, use_custom_md2_skin, custom_md2_skin_path")
-    print(md2_path, displayed_name, use_custom_md2_skin, custom_md2_skin_path)
-    print(locals())
-    # ImageFile.LOAD_TRUNCATED_IMAGES = True # Necessary for loading jpgs with PIL
+    try:
+        width, height, pixels = pcx.decode_pcx(skin_bytes) if skin_bytes is not None else pcx.load_pcx(skin_path)
+    except ValueError:
+        from PIL import Image
+        skin = Image.open(io.BytesIO(skin_bytes) if skin_bytes is not None else skin_path)
+        skin = skin.convert("RGBA").transpose(Image.FLIP_TOP_BOTTOM)
+        width, height = skin.size
+        pixels = np.frombuffer(skin.tobytes(), dtype=np.uint8).astype(np.float32) / 255
+    image = bpy.data.images.new(os.path.basename(skin_path), width=width, height=height, alpha=True)
+    image.pixels.foreach_set(pixels)
+    return image
 
-    object_path = md2_path  # Kept for testing purposes
-    # A dataclass containing all information stored in a .md2 file
-    my_object = MD2.load_file(object_path)
 
+def load_skin_image(skin_path, pak=None):
+    """
+    Loads a skin into a blender image. pcx skins are decoded by the built-in reader since blender can't load them,
+    otherwise the blender internal image loader is used (supporting .png, .jpg and .tga).
+    :param skin_path: path to the skin file or its entry name in pak
+    :param pak: optional PakFile the skin is read from
+    """
+    if pak is None:
+        if skin_path.lower().endswith(".pcx"):
+            return load_pcx_image(skin_path)
+        return bpy.data.images.load(skin_path)
+    skin_bytes = pak.read(skin_path)
+    if skin_path.lower().endswith(".pcx"):
+        return load_pcx_image(skin_path, skin_bytes)
+    # blender loads packed image data just like a file on disk
+    image = bpy.data.images.new(os.path.basename(skin_path), width=8, height=8)
+    image.pack(data=bytes(skin_bytes), data_len=len(skin_bytes))
+    image.source = 'FILE'
+    return image
+
+
+def create_mesh(name, positions, vertex_indices, normal_indices=None):
+    """
+    Builds a triangle mesh from flat arrays with foreach_set instead of from_pydata's lists of lists.
+    Triangles keep their order, so loop i * 3 + k is corner k of triangle i like in the MD2's texture indices.
+    :param name: mesh name
+    :param positions: float32 vertex positions of shape (num_xyz, 3)
+    :param vertex_indices: vertex indices of shape (num_tris, 3)
+    :param normal_indices: optional light normal indices of shape (num_xyz,) applied as custom normals
+    :return: the new mesh
+    """
+    num_tris = len(vertex_indices)
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+    mesh.loops.add(num_tris * 3)
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(vertex_indices, dtype=np.int32).ravel())
+    mesh.polygons.add(num_tris)
+    mesh.polygons.foreach_set("loop_start", np.arange(0, num_tris * 3, 3, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):  # read-only and derived from loop_start since 4.0
+        mesh.polygons.foreach_set("loop_total", np.full(num_tris, 3, dtype=np.int32))
+    mesh.update(calc_edges=True)
+
+    if normal_indices is not None:
+        mesh.polygons.foreach_set("use_smooth", np.ones(num_tris, dtype=bool))
+        if bpy.app.version < (4, 1, 0):  # custom normals are only used with auto smooth before 4.1
+            mesh.use_auto_smooth = True
+        mesh.normals_split_custom_set_from_vertices(anorms.vertex_normals(normal_indices))
+    return mesh
+
+
+# custom property identifying the skin file (see skin_source_key) images and materials were created from
+SKIN_KEY_PROPERTY = "md2_skin_key"
+
+# skin key -> name of the image / material, speeds up lookups. Entries are checked against bpy.data since datablocks
+# can be renamed, removed or come from a reopened .blend file
+_skin_images = dict()
+_skin_materials = dict()
+
+
+def find_skin_datablock(collection, names, key):
+    """
+    :param collection: bpy.data.images or bpy.data.materials
+    :param names: dict of skin key -> datablock name remembered for collection
+    :param key: skin key
+    :return: the datablock created for the skin key or None
+    """
+    datablock = collection.get(names.get(key, ""))
+    if datablock is None or datablock.get(SKIN_KEY_PROPERTY) != key:
+        datablock = next((x for x in collection if x.get(SKIN_KEY_PROPERTY) == key), None)
+    if datablock is not None:
+        names[key] = datablock.name
+    return datablock
+
+
+def remember_skin_datablock(collection, names, key, datablock):
+    """ stores key on the datablock, older datablocks of the same key are no longer reused """
+    for x in collection:
+        if x.get(SKIN_KEY_PROPERTY) == key:
+            del x[SKIN_KEY_PROPERTY]
+    datablock[SKIN_KEY_PROPERTY] = key
+    names[key] = datablock.name
+
+
+def get_skin_image(skin_path, pak=None, reload=False, report=None):
+    """
+    Returns the image of a skin, reusing the one of an earlier import if the skin file didn't change since.
+    :param skin_path: see load_skin_image
+    :param pak: see load_skin_image
+    :param reload: always load the skin again, the new image then replaces the old one for later imports
+    :param report: optional ImportReport counting reused and loaded images
+    :return: tuple of the image and the skin key it is cached with
+    """
+    key = skin_source_key(skin_path, pak.path if pak is not None else None)
+    image = None if reload else find_skin_datablock(bpy.data.images, _skin_images, key)
+    if image is not None:
+        if report is not None:
+            report.count("reused_images")
+        return image, key
+    image = load_skin_image(skin_path, pak)
+    remember_skin_datablock(bpy.data.images, _skin_images, key, image)
+    if report is not None:
+        report.count("loaded_images")
+    return image, key
+
+
+def get_skin_material(image, key, reload=False, report=None):
+    """
+    Returns the material showing image, reusing the one created for the same skin key by an earlier import
+    """
+    mat = None if reload else find_skin_datablock(bpy.data.materials, _skin_materials, key)
+    if mat is not None:
+        if report is not None:
+            report.count("reused_materials")
+        return mat
+    # Creating material and corresponding notes (see Shading tab)
+    mat = bpy.data.materials.new(name="md2_material")
+    mat.use_nodes = True
+    bsdf = mat.node_tree.nodes["Principled BSDF"]
+    texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
+    texImage.image = image
+
+    # again copy and paste
+    mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
+    remember_skin_datablock(bpy.data.materials, _skin_materials, key, mat)
+    return mat
+
+
+def frame_display_name(my_object, frame_index):
+    return animations.clean_frame_name(my_object.frame_info["name"][frame_index]) or f"frame_{frame_index}"
+
+
+def create_vertex_keyframe_animation(obj, my_object, selected_animations, frame_step, tolerance=None, report=None):
+    """
+    Legacy animation mode: keyframes the vertex positions. Creates up to three F-curves per vertex.
+    Each animation is keyed into its own action, looping back to its first frame.
+    With a tolerance, vertices which stay in place in all selected frames get no F-curves and keys which linear
+    interpolation between the remaining ones reproduces within tolerance are dropped. Kept keys are written per F-curve
+    with keyframe_points.add and foreach_set.
+    :param tolerance: None keys every vertex in every frame, otherwise the largest allowed difference in blender units
+    :param report: optional ImportReport counting the dropped keys as keyframes_saved
+    :return: generator yielding the progress from 0 to 1 after chunks of F-curves and returning the created actions.
+             Closing it early or an error removes the actions created so far.
+    """
+    mesh = obj.data
+    mesh.animation_data_create()
+    selected_frames = sorted({x for animation in selected_animations for x in animation.frames})
+    num_xyz = len(mesh.vertices)
+    moving = np.ones(num_xyz, dtype=bool)
+    if tolerance is not None:
+        # the mesh holds the first selected frame, static vertices keep it in every action
+        moving = ~keyframes.static_vertices(np.stack([my_object.positions[x] for x in selected_frames]), tolerance)
+
+    actions = list()
+    try:
+        yield from _vertex_keyframe_actions(obj, my_object, selected_animations, frame_step, tolerance, moving, actions)
+    except BaseException:
+        for action in actions:
+            bpy.data.actions.remove(action)
+        raise
+    saved = sum(len(animation.frames) + 1 for animation in selected_animations) * num_xyz * 3 - \
+        sum(len(fcurve.keyframe_points) for action in actions for fcurve in action.fcurves)
+    mesh.animation_data.action = actions[0]
+    if report is not None:
+        report.count("keyframes_saved", saved)
+    return actions
+
+
+def _vertex_keyframe_actions(obj, my_object, selected_animations, frame_step, tolerance, moving, actions):
+    """ creates the actions of create_vertex_keyframe_animation, appending them to actions """
+    moving_indices = np.flatnonzero(moving)
+    chunk_size = 256  # F-curves created between two progress updates
+    for animation_index, animation in enumerate(selected_animations):
+        action = bpy.data.actions.new(name=f"{obj.name}_{animation.name}")
+        action.use_fake_user = True  # keeps actions that aren't assigned
+        # insert first keyframe after last one to yield cyclic animation
+        frames = animation.frames + animation.frames[:1]
+        times = np.arange(len(frames), dtype=np.float32) * frame_step
+        # one curve per moving vertex and axis, (num_keys, num_moving * 3)
+        values = np.stack([my_object.positions[x][moving] for x in frames]).reshape(len(frames), -1)
+        linear = np.full(len(frames), KEYFRAME_INTERPOLATION_LINEAR, dtype=np.int32)
+        if tolerance is None:
+            keep = np.ones(values.shape, dtype=bool)
+        else:
+            keep = keyframes.reduce_linear_keys(times, values, tolerance)
+        actions.append(action)
+        for curve in range(values.shape[1]):
+            kept = keep[:, curve]
+            vertex_index, axis = divmod(curve, 3)
+            fcurve = action.fcurves.new(f"vertices[{moving_indices[vertex_index]}].co", index=axis,
+                                        action_group=f"vertex {moving_indices[vertex_index]}")
+            fcurve.keyframe_points.add(int(kept.sum()))
+            fcurve.keyframe_points.foreach_set("co", np.stack((times[kept], values[kept, curve]), axis=1).ravel())
+            fcurve.keyframe_points.foreach_set("interpolation", linear[:int(kept.sum())])
+            fcurve.update()
+            if curve % chunk_size == chunk_size - 1:
+                yield (animation_index + curve / values.shape[1]) / len(selected_animations)
+        yield (animation_index + 1) / len(selected_animations)
+
+
+def create_shape_key_animation(obj, my_object, selected_animations, frame_step):
+    """
+    Creates one shape key per selected MD2 frame, each filled with a single foreach_set from the frame's position
+    array. Only the shape key values are keyed, so the number of F-curves grows with the frame count instead of the
+    vertex count. Each animation is keyed into its own action, looping back to its first frame. Every action also holds
+    the shape keys of the other animations at 0, otherwise they would keep the value they had when the action was
+    switched and blend into the assigned animation.
+    :return: generator yielding the progress from 0 to 1 after each shape key and returning the created actions.
+             Closing it early or an error removes the shape keys and actions created so far.
+    """
+    obj.shape_key_add(name="Basis", from_mix=False)
+    shape_keys = obj.data.shape_keys
+    shape_keys.use_relative = True
+    shape_keys.animation_data_create()
+
+    actions = list()
+    data_paths = list()  # data paths of the shape key values of each animation
+    num_frames = sum(len(x.frames) for x in selected_animations)
+    done = 0
+    try:
+        for animation in selected_animations:
+            action = bpy.data.actions.new(name=f"{obj.name}_{animation.name}")
+            action.use_fake_user = True  # keeps actions that aren't assigned
+            actions.append(action)
+            data_paths.append(list())
+            for i, frame_index in enumerate(animation.frames):
+                key_block = obj.shape_key_add(name=frame_display_name(my_object, frame_index), from_mix=False)
+                key_block.data.foreach_set("co", my_object.positions[frame_index].ravel())
+                key_block.value = 0.0
+                data_paths[-1].append(key_block.path_from_id("value"))
+
+                keys = keyframes.shape_key_keyframes(i, len(animation.frames), frame_step)
+                fcurve = action.fcurves.new(key_block.path_from_id("value"))
+                fcurve.keyframe_points.add(len(keys) // 2)
+                fcurve.keyframe_points.foreach_set("co", keys)
+                fcurve.keyframe_points.foreach_set(
+                    "interpolation", np.full(len(keys) // 2, KEYFRAME_INTERPOLATION_LINEAR, dtype=np.int32))
+                fcurve.update()
+                done += 1
+                yield done / num_frames
+        # a single key holds a value for the whole action
+        hold = np.zeros(2, dtype=np.float32)
+        for action, own_paths in zip(actions, data_paths):
+            for other_paths in data_paths:
+                if other_paths is own_paths:
+                    continue
+                for data_path in other_paths:
+                    fcurve = action.fcurves.new(data_path)
+                    fcurve.keyframe_points.add(1)
+                    fcurve.keyframe_points.foreach_set("co", hold)
+                    fcurve.update()
+    except BaseException:
+        for action in actions:
+            bpy.data.actions.remove(action)
+        obj.shape_key_clear()
+        raise
+    shape_keys.animation_data.action = actions[0]
+    return actions
+
+
+# custom properties of imported objects: the source file, the fingerprint of the import (see util/reimport.py) and
+# the names of the created actions, used to update the object in place when the source changes
+SOURCE_PROPERTY = "md2_source"
+FINGERPRINT_PROPERTY = "md2_fingerprint"
+ACTIONS_PROPERTY = "md2_actions"
+CUSTOM_SKIN_PROPERTY = "md2_custom_skin"
+# objects played back by the frame change handler: their animations as JSON list of [name, MD2 frame indices], and the
+# name of the animation to play, which can be changed in the object's custom properties
+PLAYBACK_PROPERTY = "md2_playback"
+ANIMATION_PROPERTY = "md2_animation"
+
+
+def source_path(md2_path, pak=None):
+    """ identifies the imported file, entries of .pak archives as <archive path>:<entry name> """
+    return f"{os.path.abspath(pak.path)}:{md2_path}" if pak is not None else os.path.abspath(md2_path)
+
+
+def find_imported_object(source):
+    """
+    :param source: see source_path
+    :return: the object an earlier import of source created or None
+    """
+    return next((x for x in bpy.data.objects if x.get(SOURCE_PROPERTY) == source), None)
+
+
+def resolve_skin_path(my_object, md2_path, use_custom_md2_skin, custom_md2_skin_path, skin_resolver=None, pak=None):
     """ Create skin path. By default, the one stored inside of the MD2 is used. Some engines like the Digital Paintball 2 one
     check for any image file with that path disregarding the file extension. For a given custom path, it is checked
     whether it (apparently) is an absolute or relative (to the MD2) path.
@@ -56,120 +385,445 @@ def blender_load_md2(md2_path, displayed_name, use_custom_md2_skin, custom_md2_s
             # take everything before last '/' of MD2 path, add '/' and path of skin in same directory
             # custom_abs_path = "/".join(md2_path.split("/")[:-1]) + "/" + custom_md2_skin_path
             custom_abs_path = os.path.join(os.path.split(md2_path)[0], custom_md2_skin_path)
-            print(custom_abs_path)
             skin_path = custom_abs_path
-    else:
-        print("stored path:", my_object.skin_names)  # unchanged path or pathes stored in the MD2
+        return get_existing_skin_path(skin_path)
+    if pak is not None:
+        return pak.find_skin(my_object.skin_names[0]) if my_object.skin_names else None
+    if skin_resolver is not None:
+        # indexed lookup in the MD2's directory and the game search paths, no stat calls per extension
+        return skin_resolver.resolve(my_object.skin_names[0], md2_path) if my_object.skin_names else None
+    logger.debug("stored path: %s", my_object.skin_names)  # unchanged path or pathes stored in the MD2
 
-        skin_path = get_path_from_skin_name(object_path, my_object.skin_names[0])
+    skin_path = get_path_from_skin_name(md2_path, my_object.skin_names[0])
+    return get_existing_skin_path(skin_path)
 
-    skin_path = get_existing_skin_path(skin_path)
-    print("used skin path", skin_path)
+
+def blender_load_md2_steps(md2_path, displayed_name, use_custom_md2_skin, custom_md2_skin_path,
+                           animation_mode="SHAPE_KEYS", my_object=None, skin_resolver=None, pak=None,
+                           animation_names=None, frame_range=None, fps=10, report=None, reload_skin=False,
+                           use_md2_normals=True, keyframe_tolerance=None, update_existing=False, interpolate=True,
+                           existing=None):
+    """
+    This function uses the information from a md2 dataclass into a blender object.
+    This will consist of an animated mesh and its material (which is not much more than the texture.
+    For better understanding, steps are:
+        - Create the MD2 object containing all information that's inside the loaded md2 (unless given)
+          md2_path may name an entry of a .pak archive if pak is given, the skin is then looked up in the archive too
+        - Get the absolute path of the UV map / skin to load
+        - Get necessary information about the mesh (vertices, tris, uv coordinates)
+        - Create the scene structure and create the mesh for the first frame, with the MD2's vertex normals as custom
+          normals if use_md2_normals
+        - Assign UV coordinates to each triangle
+        - Create shape animation (one keyed shape key per frame or a keyframe for each vertex) for the selected
+          animations (frames grouped by their names) and/or MD2 frame range, played back with fps MD2 frames per second.
+          Vertex keyframes are reduced within keyframe_tolerance MD2 quantization steps unless it is None.
+          The "PLAYBACK" animation_mode creates no keys at all, a frame change handler writes the current frame into
+          the mesh instead, interpolating between frames if interpolate (see start_playback)
+        - Assign skin to mesh. Images and materials of unchanged skins are reused across imports unless reload_skin
+    With update_existing, an object imported from the same file before is updated in place instead: only the frames,
+    UVs, skin or mesh which changed since are rewritten (see update_md2_steps). existing names the object to update,
+    otherwise the first object imported from the same file is looked up.
+    The time of each step and the number of created vertices, frames and keyframes are added to report
+    (an ImportReport) if given.
+    This is a generator yielding the import's progress from 0 to 1 after each chunk of work, so a modal operator can
+    spread the import over several timer events (see blender_load_md2 for running it at once). Closing it before it
+    finished or an error in any step removes the partially imported object.
+    """
+    """ Create MD2 dataclass object """
+    report = report if report is not None else profiling.ImportReport()
+    logger.debug("importing %s as %r, custom skin: %s %r", md2_path, displayed_name, use_custom_md2_skin,
+                 custom_md2_skin_path)
+    # ImageFile.LOAD_TRUNCATED_IMAGES = True # Necessary for loading jpgs with PIL
+
+    object_path = md2_path  # Kept for testing purposes
+    # A dataclass containing all information stored in a .md2 file, batch imports pass the already parsed one
+    # gl commands aren't used by blender, so decoding them is skipped
+    # frames are decoded lazily one after another while the animation is created instead of all at once up front
+    with report.stage("parse"):
+        if my_object is None and pak is not None:
+            my_object = MD2.load_buffer(pak.read(object_path), decode_gl_commands=False, lazy=True, report=report)
+        elif my_object is None:
+            my_object = MD2.load_file(object_path, decode_gl_commands=False, lazy=True, report=report)
+
+    with report.stage("skin_path"):
+        skin_path = resolve_skin_path(my_object, object_path, use_custom_md2_skin, custom_md2_skin_path,
+                                      skin_resolver, pak)
+    logger.info("used skin path %s", skin_path)
+    yield 0.05
+
+    # Only the selected frames are decoded (lazily loaded models decode frames when they are indexed) and keyed
+    selected_animations = animations.select_animations(animations.group_animations(my_object.frame_info["name"]),
+                                                       animation_names, frame_range)
+    skin_pak = None if use_custom_md2_skin else pak  # custom skins are always loaded from disk
+    settings = {"mode": animation_mode, "fps": fps, "keyframe_tolerance": keyframe_tolerance,
+                "use_md2_normals": use_md2_normals, "animation_names": animation_names,
+                "frame_range": list(frame_range) if frame_range else None, "interpolate": interpolate}
+    skin_key = skin_source_key(skin_path, skin_pak.path if skin_pak is not None else None) if skin_path else None
+    source = source_path(object_path, pak)
+    if existing is None and update_existing:
+        existing = find_imported_object(source)
+    if existing is not None:
+        # the fingerprint is only needed to compare it to the previous import and to store it afterwards
+        with report.stage("fingerprint"):
+            fingerprint = reimport.model_fingerprint(my_object, [x for a in selected_animations for x in a.frames],
+                                                     settings, skin_key)
+        yield from update_md2_steps(existing, my_object, selected_animations, fingerprint, skin_path, skin_pak,
+                                    reload_skin, report)
+        return
 
     """ Loads required information for mesh generation and UV mapping from the .md2 file"""
     # Gets name to give to the object and mesh in the outliner
     if not displayed_name:
         object_name = "/".join(object_path.split("/")[-2:]).split(".")[:-1]
-        print(object_name)
     else:
-        print(displayed_name)
         object_name = [displayed_name]
 
-    # List of vertices [x,y,z] for all frames extracted from the md2 object
-    all_verts = [[x.v for x in my_object.frames[y].verts] for y in range(my_object.header.num_frames)]
-    # List of vertex indices forming a triangular face
-    tris = ([x.vertexIndices for x in my_object.triangles])
-    # uv coordinates (in q2 terms st coordinates) for projecting the skin on the model's faces
-    # blender flips images upside down when loading so v = 1-t for blender imported images
-    uvs_pcx = ([(x.s, x.t) for x in my_object.texture_coordinates])
-    uvs_others = ([(x.s, 1 - x.t) for x in my_object.texture_coordinates])
-    # blender uv coordinate system originates at lower left
-
-    """ Lots of code (copy and pasted) that creates a mesh and adds it to the scene collection/outlines """
-    mesh = bpy.data.meshes.new(*object_name)  # add the new mesh, * extracts string from list
-    obj = bpy.data.objects.new(mesh.name, mesh)
-    col = bpy.data.collections.get("Collection")
-    col.objects.link(obj)
-    bpy.context.view_layer.objects.active = obj
-
-    # Creates mesh by taking first frame's vertices and connects them via indices in tris
-    mesh.from_pydata(all_verts[0], [], tris)
-
-
-    """ Create animation for animated models: set keyframe for each vertex in each frame individually """
-    # Create keyframes from first to last frame
-    for i in range(my_object.header.num_frames):
-        for idx, v in enumerate(obj.data.vertices):
-            obj.data.vertices[idx].co = all_verts[i][idx]
-            v.keyframe_insert('co', frame=i * 10)  # parameter index=2 restricts keyframe to dimension
-
-    # insert first keyframe after last one to yield cyclic animation
-    for idx, v in enumerate(obj.data.vertices):
-        obj.data.vertices[idx].co = all_verts[0][idx]
-        v.keyframe_insert('co', frame=60)
-
-    if not skin_path:
-        ShowMessageBox("Defaulting to not assigning any material", "No skin found", "INFO")
-        return {'FINISHED'}  # no idea, seems to be necessary for the UI
-
-    if skin_path.endswith('.pcx'):
+    first_frame = selected_animations[0].frames[0] if selected_animations else 0
+    with report.stage("mesh"):
+        # Creates mesh from the first selected frame's vertices, connected by the triangles' vertex indices
+        # the vertex normals of the MD2 (light normal indices into the anorms table) become custom normals
+        mesh = create_mesh(*object_name, my_object.positions[first_frame], my_object.vertex_indices,
+                           my_object.normal_indices[first_frame] if use_md2_normals else None)
+        """ Lots of code (copy and pasted) that creates a mesh and adds it to the scene collection/outlines """
+        obj = bpy.data.objects.new(mesh.name, mesh)
+    # closing the steps early or any error removes the partially imported object, the animation steps remove the
+    # keys they created so far themselves
+    try:
+        with report.stage("mesh"):
+            col = bpy.data.collections.get("Collection")
+            col.objects.link(obj)
+            bpy.context.view_layer.objects.active = obj
+        report.count("mesh_vertices", len(mesh.vertices))
+        yield 0.1
+        yield from create_animation_steps(obj, my_object, selected_animations, settings, report)
+        if not skin_path:
+            ShowMessageBox("Defaulting to not assigning any material", "No skin found", "INFO")
+        elif assign_skin(obj, my_object, skin_path, skin_pak, reload_skin, report):
+            yield 0.96
+        obj[SOURCE_PROPERTY] = source
+        with report.stage("fingerprint"):
+            fingerprint = reimport.model_fingerprint(my_object, [x for a in selected_animations for x in a.frames],
+                                                     settings, skin_key)
+            obj[FINGERPRINT_PROPERTY] = reimport.dumps_fingerprint(fingerprint)
+        obj[CUSTOM_SKIN_PROPERTY] = custom_md2_skin_path if use_custom_md2_skin else ""
+    except BaseException:
+        # actions of a finished animation step, e.g. if the skin failed afterwards
+        stop_playback(obj)
+        remove_actions(obj)
+        bpy.data.objects.remove(obj)
+        bpy.data.meshes.remove(mesh)
+        raise
+    logger.info("imported %s: %s", md2_path, report.summary())
+
+
+def create_animation_steps(obj, my_object, selected_animations, settings, report):
+    """
+    Creates the animation of the selected frames, see blender_load_md2_steps. Generator yielding the progress from 0.1
+    to 0.9.
+    :param settings: dict of the import options the animation depends on, stored as "animation" in the fingerprint
+    """
+    """ Create animation for animated models """
+    render = bpy.context.scene.render
+    frame_step = render.fps / render.fps_base / settings["fps"]  # scene frames between two MD2 frames
+    if not selected_animations:
+        ShowMessageBox("No frames selected, only the mesh is imported", "No animation", "INFO")
+        actions = list()
+    elif settings["mode"] == "PLAYBACK":
+        with report.stage("animation"):
+            player = start_playback(obj, my_object, selected_animations, settings)
+        report.count("playback_bytes", player.nbytes)
+        actions = list()
+        yield 0.9
+    elif settings["mode"] == "VERTEX_KEYFRAMES":
+        tolerance = None
+        if settings["keyframe_tolerance"] is not None:
+            # one quantization step is the largest per-axis scale of the selected frames
+            tolerance = settings["keyframe_tolerance"] * \
+                float(my_object.frame_info["scale"][[x for a in selected_animations for x in a.frames]].max())
+        steps = create_vertex_keyframe_animation(obj, my_object, selected_animations, frame_step, tolerance, report)
+        actions = yield from jobs.scaled_progress(steps, 0.1, 0.9, report, "animation")
+    else:
+        steps = create_shape_key_animation(obj, my_object, selected_animations, frame_step)
+        actions = yield from jobs.scaled_progress(steps, 0.1, 0.9, report, "animation")
+    obj[ACTIONS_PROPERTY] = [x.name for x in actions]
+    report.count("animations", len(actions))
+    report.count("keyed_frames", sum(len(x.frames) for x in selected_animations))
+    report.count("keyframes", sum(len(fcurve.keyframe_points) for action in actions for fcurve in action.fcurves))
+    if settings["mode"] != "VERTEX_KEYFRAMES" and obj.data.shape_keys:
+        report.count("shape_keys", len(obj.data.shape_keys.key_blocks))
+
+
+def remove_animation(obj):
+    """ removes the shape keys and the actions created by create_animation_steps and stops playing obj back """
+    stop_playback(obj)
+    remove_actions(obj)
+    if obj.data.shape_keys:
+        obj.shape_key_clear()
+    obj.data.animation_data_clear()
+
+
+def remove_actions(obj):
+    """ removes the actions created by create_animation_steps """
+    for name in obj.get(ACTIONS_PROPERTY, []):
+        action = bpy.data.actions.get(name)
+        if action is not None:
+            bpy.data.actions.remove(action)
+
+
+# object name -> playback.FramePlayer of the objects played back in the open .blend file, None if its source can't be
+# loaded. Cleared when another file is loaded, whose objects may reuse the names.
+_players = dict()
+
+
+def load_source(source):
+    """
+    Loads the model an object was imported from lazily, so its frames stay memory-mapped
+    :param source: see source_path
+    :return: md2_object
+    """
+    if os.path.isfile(source):
+        return MD2.load_file(source, decode_gl_commands=False, lazy=True)
+    archive_path, entry = source.rsplit(":", 1)  # entries of .pak archives never contain colons
+    with pak_files.PakFile(archive_path) as archive:
+        # the entry's view keeps the archive's mapping alive after closing it
+        return MD2.load_buffer(archive.read(entry), decode_gl_commands=False, lazy=True)
+
+
+def start_playback(obj, my_object, selected_animations, settings):
+    """
+    Animation mode without any keys: the frame change handler writes the frame of the current scene time into the mesh
+    from the model's compressed frames. The animations are stored on the object, so the player is recreated from the
+    source file after reopening the .blend file.
+    :return: playback.FramePlayer
+    """
+    played = {x.name: [int(frame) for frame in x.frames] for x in selected_animations}
+    obj[PLAYBACK_PROPERTY] = json.dumps(list(played.items()))
+    if obj.get(ANIMATION_PROPERTY) not in played:
+        obj[ANIMATION_PROPERTY] = selected_animations[0].name
+    player = playback.FramePlayer.from_model(my_object, played, settings["fps"], settings.get("interpolate", True))
+    _players[obj.name_full] = player
+    register_playback_handler()
+    return player
+
+
+def stop_playback(obj):
+    _players.pop(obj.name_full, None)
+    if obj.get(PLAYBACK_PROPERTY) is not None:
+        del obj[PLAYBACK_PROPERTY]
+
+
+def get_player(obj):
+    """
+    :return: the playback.FramePlayer of obj, loaded from its source file if this session didn't create it yet.
+             None if obj isn't played back or its source is missing or doesn't match the mesh anymore.
+    """
+    if obj.name_full in _players:
+        return _players[obj.name_full]
+    player = None
+    fingerprint = reimport.loads_fingerprint(obj.get(FINGERPRINT_PROPERTY))
+    if obj.get(PLAYBACK_PROPERTY) and fingerprint is not None:
         try:
-            from PIL import Image
-        except ModuleNotFoundError:
-            ShowMessageBox("To load .pcx skin files, see the add-on README for manual PIL installation", "Module PIL not found", "INFO")
-            return {'FINISHED'}  # no idea, seems to be necessary for the UI
+            model = load_source(obj.get(SOURCE_PROPERTY, ""))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("can't play back %s: %s", obj.name, e)
+        else:
+            if model.header.num_xyz == len(obj.data.vertices):
+                settings = fingerprint["animation"]
+                player = playback.FramePlayer.from_model(model, dict(json.loads(obj[PLAYBACK_PROPERTY])),
+                                                         settings["fps"], settings.get("interpolate", True))
+            else:
+                logger.warning("can't play back %s: its source doesn't match the mesh anymore", obj.name)
+    _players[obj.name_full] = player  # failures aren't retried on every frame
+    return player
+
+
+@persistent
+def playback_frame_change(scene, depsgraph=None):
+    """ frame_change_pre handler writing the current frame of every played back object into its mesh """
+    seconds = (scene.frame_current + scene.frame_subframe) * scene.render.fps_base / scene.render.fps
+    for obj in scene.objects:
+        if obj.type != 'MESH' or not obj.get(PLAYBACK_PROPERTY):
+            continue
+        player = get_player(obj)
+        if player is None:
+            continue
+        positions = player.at(seconds, obj.get(ANIMATION_PROPERTY))
+        obj.data.vertices.foreach_set("co", positions.ravel())
+        obj.data.update()
+
+
+@persistent
+def clear_players(*args):
+    """ load_post handler dropping the players of the previously open file, e.g. after File > Open or Revert """
+    _players.clear()
+
+
+def register_playback_handler():
+    if playback_frame_change not in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.append(playback_frame_change)
+    if clear_players not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(clear_players)
+
+
+def unregister_playback_handler():
+    if playback_frame_change in bpy.app.handlers.frame_change_pre:
+        bpy.app.handlers.frame_change_pre.remove(playback_frame_change)
+    if clear_players in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_players)
+    _players.clear()
+
 
+def bake_playback(obj, animation_mode="SHAPE_KEYS", report=None):
+    """
+    Replaces the playback of obj by keyed animations created from its source file like an import in animation_mode
+    does, e.g. for rendering on machines without the add-on
+    :return: False if obj isn't played back or its source can't be loaded
+    """
+    player = get_player(obj)
+    fingerprint = reimport.loads_fingerprint(obj.get(FINGERPRINT_PROPERTY))
+    if player is None or fingerprint is None:
+        return False
+    report = report if report is not None else profiling.ImportReport()
+    my_object = load_source(obj[SOURCE_PROPERTY])
+    selected_animations = [animations.animation_t(name, frames) for name, frames in player.animations.items()]
+    stop_playback(obj)
+    # the keys are relative to the mesh, which holds the first frame like after an import
+    first_frame = selected_animations[0].frames[0]
+    obj.data.vertices.foreach_set("co", np.ascontiguousarray(my_object.positions[first_frame]).ravel())
+    obj.data.update()
+    fingerprint["animation"]["mode"] = animation_mode
+    for _ in create_animation_steps(obj, my_object, selected_animations, fingerprint["animation"], report):
+        pass
+    obj[FINGERPRINT_PROPERTY] = reimport.dumps_fingerprint(fingerprint)
+    return True
+
+
+def assign_uvs(mesh, my_object):
     """ UV Mapping: Create UV Layer, assign UV coordinates from md2 files for each face to each face's vertices """
-    uv_layer = (mesh.uv_layers.new())
+    uv_layer = mesh.uv_layers.active or mesh.uv_layers.new()
     mesh.uv_layers.active = uv_layer
 
-    # add uv coordinates to each polygon (here: triangle since md2 only stores vertices and triangles)
-    # note: faces and vertices are stored exactly in the order they were added
-    for face_idx, face in enumerate(mesh.polygons):
-        for idx, (vert_idx, loop_idx) in enumerate(zip(face.vertices, face.loop_indices)):
-            if skin_path.endswith(".pcx"):
-                print("PCX LOADED")
-                uv_layer.data[loop_idx].uv = uvs_pcx[my_object.triangles[face_idx].textureIndices[idx]]
-            else:
-                uv_layer.data[loop_idx].uv = uvs_others[my_object.triangles[face_idx].textureIndices[idx]]
+    # add uv coordinates to each triangle corner at once (md2 only stores vertices and triangles)
+    # note: create_mesh keeps the triangle order, so loops are stored exactly in the order of my_object.texture_indices
+    # blender uv coordinate system originates at lower left, so v = 1-t (pcx pixels are flipped the same way)
+    uvs = MD2.loop_uvs(my_object.st, my_object.texture_indices)
+    uv_layer.data.foreach_set("uv", uvs)
 
-    """ Assign skin to mesh: Create material (barely understood copy and paste again) and set the image. 
-    Might work by manually setting the textures pixels to the pixels of a PIL.Image if it would actually
-    load non-empty .pcx files
-    idea/TODO: Write an own pcx loader from scratch ... """
-    # Creating material and corresponding notes (see Shading tab)
-    mat = bpy.data.materials.new(name="md2_material")
-    mat.use_nodes = True
-    bsdf = mat.node_tree.nodes["Principled BSDF"]
-    texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
 
-    # if only a pcx version of the desired skin exists, load it via PIL
-    # and copy pixels into the materials texture
-    # otherwise use blender internal image loader (supporting .png, .jpg and .tga)
-    print(f'skin_path: {skin_path}')
-    if skin_path.endswith(".pcx"):
-        skin = Image.open(skin_path)
-        skin.load()
-        skin = skin.convert("RGBA")
-        skin_rgba = list(skin.getdata())
-        print("important", skin_rgba[:40])
-        print("path:", skin_path)
-        texImage.image = bpy.data.images.new("MyImage", width=skin.size[0], height=skin.size[1])
-        tmp = [y for x in skin_rgba for y in x]
-        max_val = max(tmp)
-        texImage.image.pixels = [x / max_val for x in tmp]
-    else:
-        texImage.image = bpy.data.images.load(skin_path)
+def assign_skin(obj, my_object, skin_path, pak, reload_skin, report, uvs=True):
+    """
+    Loads the skin (or reuses the image of an earlier import), sets the UVs and assigns the material
+    :param uvs: whether the UV layer is written too
+    :return: False if the skin couldn't be loaded
+    """
+    try:
+        with report.stage("skin_image"):
+            skin_image, skin_key = get_skin_image(skin_path, pak, reload_skin, report)
+    except ModuleNotFoundError:
+        ShowMessageBox("This .pcx variant needs PIL, see the add-on README for manual PIL installation", "Module PIL not found", "INFO")
+        return False
 
-        # again copy and paste
-    mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
+    if uvs:
+        with report.stage("uv_layer"):
+            assign_uvs(obj.data, my_object)
 
-    # Assign it to object
-    if obj.data.materials:
-        obj.data.materials[0] = mat
-    else:
-        obj.data.materials.append(mat)
-    print("YAY NO ERRORS!!")
-    return {'FINISHED'}  # no idea, seems to be necessary for the UI
+    """ Assign skin to mesh: Create material (barely understood copy and paste again) and set the image. """
+    with report.stage("material"):
+        mat = get_skin_material(skin_image, skin_key, reload_skin, report)
 
+        # Assign it to object
+        if obj.data.materials:
+            obj.data.materials[0] = mat
+        else:
+            obj.data.materials.append(mat)
+    return True
+
+
+def update_md2_steps(obj, my_object, selected_animations, fingerprint, skin_path, pak, reload_skin, report):
+    """
+    Updates an object imported before from the same file in place, comparing fingerprint to the one stored on the
+    object. Only changed frames are written into their shape keys (vertex keyframes, which may be reduced, are rebuilt
+    if any frame changed), changed UVs into the UV layer and a changed skin into the material. The mesh is replaced
+    if its topology changed. Generator like blender_load_md2_steps.
+    """
+    plan = reimport.plan_reimport(reimport.loads_fingerprint(obj.get(FINGERPRINT_PROPERTY)), fingerprint)
+    settings = fingerprint["animation"]
+    if plan.frames and settings["mode"] in ("VERTEX_KEYFRAMES", "PLAYBACK"):
+        plan.animation = True
+    report.count("updated_frames", len(fingerprint["selected_frames"]) if plan.animation else len(plan.frames))
+    if plan.unchanged:
+        logger.info("%s is up to date", obj.name)
+        return
+    selected_frames = fingerprint["selected_frames"]
+    first_frame = selected_frames[0] if selected_frames else 0
+    normal_indices = my_object.normal_indices[first_frame] if settings["use_md2_normals"] else None
+    mesh = obj.data
+    with report.stage("mesh"):
+        if plan.topology:
+            old_mesh = mesh
+            remove_animation(obj)
+            mesh = create_mesh(old_mesh.name, my_object.positions[first_frame], my_object.vertex_indices,
+                               normal_indices)
+            obj.data = mesh
+            if old_mesh.users == 0:
+                bpy.data.meshes.remove(old_mesh)
+        elif plan.animation or first_frame in plan.frames:
+            # the mesh holds the first selected frame
+            if plan.animation:
+                remove_animation(obj)
+            mesh.vertices.foreach_set("co", np.ascontiguousarray(my_object.positions[first_frame]).ravel())
+            if normal_indices is not None:
+                mesh.normals_split_custom_set_from_vertices(anorms.vertex_normals(normal_indices))
+            mesh.update()
+    yield 0.1
 
+    if plan.animation:
+        yield from create_animation_steps(obj, my_object, selected_animations, settings, report)
+    elif plan.frames:
+        with report.stage("animation"):
+            key_blocks = mesh.shape_keys.key_blocks
+            if first_frame in plan.frames:
+                key_blocks[0].data.foreach_set("co", my_object.positions[first_frame].ravel())  # Basis
+        for i, frame_index in enumerate(plan.frames):
+            with report.stage("animation"):
+                # shape keys follow Basis in the order of the selected frames
+                key_block = key_blocks[1 + selected_frames.index(frame_index)]
+                key_block.data.foreach_set("co", my_object.positions[frame_index].ravel())
+            yield 0.1 + 0.8 * (i + 1) / len(plan.frames)
+
+    if skin_path and (plan.skin or reload_skin):
+        assign_skin(obj, my_object, skin_path, pak, reload_skin, report, uvs=plan.uvs)
+    elif plan.uvs:
+        with report.stage("uv_layer"):
+            assign_uvs(mesh, my_object)
+    obj[FINGERPRINT_PROPERTY] = reimport.dumps_fingerprint(fingerprint)
+    logger.info("updated %s: %s", obj.name, report.summary())
+
+
+def update_imported_object(obj, skin_resolver=None):
+    """
+    Re-imports the file obj was imported from with the settings of that import, updating obj in place.
+    Objects imported from .pak archives are skipped.
+    :return: False if obj wasn't imported from a .md2 file
+    """
+    source = obj.get(SOURCE_PROPERTY)
+    fingerprint = reimport.loads_fingerprint(obj.get(FINGERPRINT_PROPERTY))
+    if not source or fingerprint is None or not os.path.isfile(source):
+        return False
+    settings = fingerprint["animation"]
+    custom_skin_path = obj.get(CUSTOM_SKIN_PROPERTY, "")
+    blender_load_md2(source, "", bool(custom_skin_path), custom_skin_path, settings["mode"],
+                     skin_resolver=skin_resolver, animation_names=settings["animation_names"], frame_range=settings["frame_range"],
+                     fps=settings["fps"], use_md2_normals=settings["use_md2_normals"],
+                     keyframe_tolerance=settings["keyframe_tolerance"], interpolate=settings.get("interpolate", True),
+                     existing=obj)
+    return True
+
+
+def blender_load_md2(*args, **kwargs):
+    """
+    Imports an MD2 at once, see blender_load_md2_steps for the arguments
+    """
+    for _ in blender_load_md2_steps(*args, **kwargs):
+        pass
+    return {'FINISHED'}  # no idea, seems to be necessary for the UI
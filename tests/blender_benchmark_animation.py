@@ -0,0 +1,26 @@
+"""
+Timing comparison of the animation modes on the bundled models. Needs Blender, run from the repository root with
+    blender --background --factory-startup --python tests/blender_benchmark_animation.py
+"""
+import os
+import sys
+import time
+
+import bpy
+
+sys.path.append(os.getcwd())
+from md2_importer import blender_load_md2  # noqa: E402
+
+data_dir = "tests/data"
+models = [x for x in sorted(os.listdir(data_dir)) if x.lower().endswith(".md2")]
+
+for model in models:
+    for animation_mode in ("VERTEX_KEYFRAMES", "SHAPE_KEYS"):
+        bpy.ops.wm.read_factory_settings(use_empty=False)
+        start = time.perf_counter()
+        blender_load_md2.blender_load_md2(os.path.join(data_dir, model), "", False, "", animation_mode)
+        duration = time.perf_counter() - start
+        obj = bpy.context.view_layer.objects.active
+        anim_data = obj.data.shape_keys.animation_data if obj.data.shape_keys else obj.data.animation_data
+        num_fcurves = len(anim_data.action.fcurves) if anim_data and anim_data.action else 0
+        print(f"{model:16} {animation_mode:16} {duration:8.3f} s {num_fcurves:8} F-curves")
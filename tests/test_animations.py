@@ -0,0 +1,39 @@
+from util import MD2
+from util.animations import animation_t, group_animations, run_animation_names, select_animations
+
+
+def test_group_animations():
+    names = [b"stand01\x00\x00", "stand02", "run1", "run2\x00junk", "death101", "death102", "death201", "stand03", "", ""]
+    assert group_animations(names) == [
+        animation_t("stand", [0, 1]),
+        animation_t("run", [2, 3]),
+        animation_t("death1", [4, 5]),
+        animation_t("death2", [6]),
+        animation_t("stand.001", [7]),
+        animation_t("frames", [8, 9]),
+    ]
+
+
+def test_zero_padded_frame_numbers():
+    names = [f"run{x:03}" for x in range(1, 7)] + [f"jump{x:03}" for x in range(1, 4)]
+    assert group_animations(names) == [animation_t("run", [0, 1, 2, 3, 4, 5]), animation_t("jump", [6, 7, 8])]
+    assert select_animations(group_animations(names), names=["run"])[0].frames == [0, 1, 2, 3, 4, 5]
+    assert group_animations([f"frame{x:03}" for x in range(150)]) == [animation_t("frame", list(range(150)))]
+    # a gap in the numbers doesn't split when the leading digits are the same
+    assert run_animation_names("pain", ["001", "002", "004"]) == ["pain"] * 3
+    assert run_animation_names("death", ["101", "102", "201"]) == ["death1", "death1", "death2"]
+    assert run_animation_names("", ["", ""]) == ["frames", "frames"]
+
+
+def test_select_animations():
+    animations = [animation_t("stand", [0, 1, 2]), animation_t("run", [3, 4]), animation_t("jump", [5, 6])]
+    assert select_animations(animations) == animations
+    assert select_animations(animations, names=["RUN", "jump"]) == animations[1:]
+    assert select_animations(animations, frame_range=(2, 3)) == [animation_t("stand", [2]), animation_t("run", [3])]
+    assert select_animations(animations, names=["stand"], frame_range=(4, 6)) == []
+
+
+def test_model_animations():
+    model = MD2.load_file("tests/data/car.md2", lazy=True)
+    animations = group_animations(model.frame_info["name"])
+    assert sum(len(x.frames) for x in animations) == model.header.num_frames
@@ -0,0 +1,17 @@
+import numpy as np
+from util import MD2
+from util import anorms
+
+
+def test_table():
+    assert anorms.ANORMS.shape == (162, 3)
+    np.testing.assert_allclose(np.linalg.norm(anorms.ANORMS, axis=1), 1, atol=1e-5)
+
+
+def test_vertex_normals():
+    model = MD2.load_file("tests/data/car.md2")
+    normals = anorms.vertex_normals(model.normal_indices[0])
+    assert normals.shape == (model.header.num_xyz, 3) and normals.dtype == np.float32
+    np.testing.assert_array_equal(normals[0], anorms.ANORMS[model.normal_indices[0, 0]])
+    np.testing.assert_array_equal(anorms.vertex_normals(np.array([5, 255], dtype=np.uint8)),
+                                  [anorms.ANORMS[5], (0, 0, 0)])
@@ -0,0 +1,37 @@
+from util import MD2, batch
+
+
+def test_find_md2_files():
+    assert batch.find_md2_files("tests/data") == ["tests/data/bigleaf2.md2", "tests/data/car.md2"]
+
+
+def test_parse_files_reports_failures():
+    paths = ["tests/data/car.md2", "tests/data/car.jpg", "tests/data/bigleaf2.md2", "tests/data/missing.md2"]
+    for max_workers in (1, 2):
+        results = batch.parse_files(paths, max_workers=max_workers)
+        assert [x.path for x in results] == paths
+        assert [x.error is None for x in results] == [True, False, True, False]
+        assert results[0].model.header.num_xyz > 0
+        assert results[1].model is None and "ValueError" in results[1].error
+        assert "FileNotFoundError" in results[3].error
+
+
+def test_workers_send_arrays_only():
+    path, arrays, error = batch._parse_arrays("tests/data/car.md2")
+    assert error is None and "frames" not in arrays
+    model = MD2.model_from_arrays(**arrays)
+    expected = MD2.load_file(path)
+    assert model.frames[3] == expected.frames[3]
+    assert model.gl_commands == expected.gl_commands
+
+
+def test_map_processes_keeps_order():
+    for max_workers in (1, 2):
+        assert batch.map_processes(abs, [-3, 2, -1], max_workers) == [3, 2, 1]
+
+
+def test_parse_files_lazily():
+    paths = ["tests/data/car.md2", "tests/data/missing.md2"]
+    results = batch.parse_files(paths, max_workers=2, lazy=True)
+    assert isinstance(results[0].model.positions, MD2.LazyFramePositions)
+    assert "FileNotFoundError" in results[1].error
@@ -0,0 +1,24 @@
+import numpy as np
+from util import MD2
+from benchmarks import run_benchmarks
+from benchmarks.synthetic_md2 import synthetic_md2_bytes
+
+
+def test_synthetic_md2_is_valid():
+    model = MD2.load_buffer(synthetic_md2_bytes(3, 50, 40, gl_command_length=6))
+    assert model.positions.shape == (3, 50, 3)
+    assert model.vertex_indices.shape == (40, 3)
+    assert model.frames[2].name.rstrip("\x00") == "frame002"
+    assert len(model.gl_commands) == 10
+    assert np.all(model.gl_command_arrays.counts == 6)
+
+
+def test_run_and_regressions():
+    grid = {"frames": [2], "vertices": [20], "triangles": [10], "gl_command_length": [4]}
+    results = run_benchmarks.run(grid, repeat=1)
+    assert {x["stage"] for x in results} >= {"header", "frames", "load_buffer"}
+    assert all(x["seconds"] >= 0 and x["peak_bytes"] >= 0 for x in results)
+
+    slower = [dict(x, seconds=x["seconds"] * 3 + 1) for x in results]
+    assert run_benchmarks.regressions(results, results, 1.5) == []
+    assert len(run_benchmarks.regressions(results, slower, 1.5)) == len(results)
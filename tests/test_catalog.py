@@ -0,0 +1,61 @@
+import os
+import shutil
+from util import MD2
+from util import catalog
+
+
+def test_probe_matches_full_parse():
+    model = MD2.load_file("tests/data/car.md2")
+    info = catalog.probe_file("tests/data/car.md2")
+    assert info.error is None
+    assert (info.num_xyz, info.num_tris, info.num_frames) == \
+        (model.header.num_xyz, model.header.num_tris, model.header.num_frames)
+    assert info.skin_names == [x.split("\x00")[0] for x in model.skin_names]
+    assert info.frame_names == [x.name.split("\x00")[0].strip() for x in model.frames]
+    assert info.animations
+
+
+def test_probe_invalid_file(tmp_path):
+    (tmp_path / "empty.md2").write_bytes(b"")
+    assert catalog.probe_file(str(tmp_path / "empty.md2")).error
+    with open("tests/data/car.md2", "rb") as f:
+        (tmp_path / "truncated.md2").write_bytes(f.read()[:200])
+    assert "exceed" in catalog.probe_file(str(tmp_path / "truncated.md2")).error
+
+
+def test_incremental_scan_and_filter(tmp_path):
+    library = tmp_path / "library"
+    (library / "vehicles").mkdir(parents=True)
+    shutil.copy("tests/data/car.md2", library / "vehicles" / "car.md2")
+    shutil.copy("tests/data/bigleaf2.md2", library / "bigleaf2.md2")
+    (library / "broken.md2").write_bytes(b"IDP2")
+    index_path = str(tmp_path / "catalog.json")
+
+    first = catalog.MD2Catalog(index_path)
+    first.scan([str(library)])
+    first.save()
+    assert (first.probed, first.reused, first.removed) == (3, 0, 0)
+
+    second = catalog.MD2Catalog(index_path)
+    assert second.entries.keys() == first.entries.keys()
+    os.remove(library / "bigleaf2.md2")
+    with open(library / "broken.md2", "ab") as f:
+        f.write(b"\x00")
+    second.scan([str(library)])
+    assert (second.probed, second.reused, second.removed) == (1, 1, 1)
+
+    car = second.entries[str(library / "vehicles" / "car.md2")]
+    assert [x.path for x in second.filter()] == [car.path]  # broken.md2 is left out
+    assert second.filter(text="VEHICLES") == [car]
+    assert second.filter(animation=car.animations[0]) == [car]
+    assert second.filter(min_frames=car.num_frames + 1) == []
+    assert second.filter(max_vertices=car.num_xyz, root=str(library / "vehicles")) == [car]
+    assert second.filter(skin="no such skin") == []
+
+
+def test_main(tmp_path, capsys):
+    index_path = str(tmp_path / "catalog.json")
+    assert catalog.main(["--index", index_path, "scan", "tests/data"]) == 0
+    assert "2 probed" in capsys.readouterr().out
+    assert catalog.main(["--index", index_path, "query", "--text", "car"]) == 0
+    assert "car.md2" in capsys.readouterr().out
@@ -0,0 +1,83 @@
+import json
+import os
+import numpy as np
+from util import MD2, convert, pak
+
+
+def read_accessor(gltf, buffer, index):
+    accessor = gltf["accessors"][index]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    dtype = {5126: np.float32, 5123: np.uint16, 5125: np.uint32}[accessor["componentType"]]
+    width = {"SCALAR": 1, "VEC2": 2, "VEC3": 3}[accessor["type"]]
+    values = np.frombuffer(buffer, dtype=dtype, count=accessor["count"] * width, offset=view["byteOffset"])
+    return values.reshape(-1, width) if width > 1 else values
+
+
+def test_gltf_morph_targets(tmp_path):
+    model = MD2.load_file("tests/data/car.md2")
+    path = str(tmp_path / "car.gltf")
+    written = convert.write_gltf(model, path)
+    with open(path) as f:
+        gltf = json.load(f)
+    with open(tmp_path / "car.bin", "rb") as f:
+        buffer = f.read()
+    assert written == len(buffer) + os.path.getsize(path)
+    assert gltf["buffers"][0]["byteLength"] == len(buffer)
+
+    primitive = gltf["meshes"][0]["primitives"][0]
+    assert len(primitive["targets"]) == model.header.num_frames - 1
+    vertex_ids, st_ids, triangles = convert.gltf_vertices(model)
+    indices = read_accessor(gltf, buffer, primitive["indices"]).reshape(-1, 3)
+    np.testing.assert_array_equal(vertex_ids[indices][:, ::-1], model.vertex_indices)
+    np.testing.assert_array_equal(st_ids[indices][:, ::-1], model.texture_indices)
+
+    base = read_accessor(gltf, buffer, primitive["attributes"]["POSITION"])
+    delta = read_accessor(gltf, buffer, primitive["targets"][4]["POSITION"])
+    expected = convert.y_up(model.positions[5])[vertex_ids]
+    np.testing.assert_allclose(base + delta, expected, atol=1e-4)
+    assert gltf["accessors"][primitive["targets"][4]["POSITION"]]["max"] == delta.max(axis=0).tolist()
+
+    sampler = gltf["animations"][0]["samplers"][0]
+    weights = read_accessor(gltf, buffer, sampler["output"]).reshape(model.header.num_frames, -1)
+    np.testing.assert_array_equal(weights, np.eye(model.header.num_frames, model.header.num_frames - 1, -1))
+
+
+def test_gltf_single_frame(tmp_path):
+    model = MD2.load_file("tests/data/bigleaf2.md2")
+    convert.write_gltf(model, str(tmp_path / "leaf.gltf"))
+    with open(tmp_path / "leaf.gltf") as f:
+        gltf = json.load(f)
+    assert "targets" not in gltf["meshes"][0]["primitives"][0] and "animations" not in gltf
+
+
+def test_obj_sequence(tmp_path):
+    model = MD2.load_file("tests/data/car.md2", lazy=True)
+    convert.write_obj_sequence(model, str(tmp_path / "car"), frames=[0, 3])
+    assert sorted(os.listdir(tmp_path)) == ["car_000.obj", "car_003.obj"]
+    with open(tmp_path / "car_003.obj") as f:
+        lines = f.read().splitlines()
+    positions = np.array([x.split()[1:] for x in lines if x.startswith("v ")], dtype=np.float32)
+    np.testing.assert_allclose(positions, convert.y_up(model.positions[3]), atol=1e-5)
+    faces = [x.split()[1:] for x in lines if x.startswith("f ")]
+    assert len(faces) == model.header.num_tris
+    assert [int(x.split("/")[0]) - 1 for x in faces[0]] == model.vertex_indices[0, ::-1].tolist()
+
+
+def test_main_converts_directories_and_paks(tmp_path, capsys):
+    files = dict()
+    for name in ("car.md2", "bigleaf2.md2", "car.jpg"):
+        with open(f"tests/data/{name}", "rb") as f:
+            files[f"models/{name}"] = f.read()
+    files["models/broken.md2"] = files["models/car.jpg"]
+    pak.write_pak(str(tmp_path / "pak0.pak"), files)
+    out = tmp_path / "out"
+
+    assert convert.main(["tests/data", str(tmp_path / "pak0.pak"), "--out", str(out), "--workers", "2"]) == 1
+    for name in ("car", "bigleaf2", "pak0/models/car", "pak0/models/bigleaf2"):
+        assert (out / f"{name}.gltf").exists() and (out / f"{name}.bin").exists()
+    captured = capsys.readouterr()
+    assert "4 models" in captured.out and "1 failed" in captured.out and "models/s" in captured.out
+    assert "pak0/models/broken: ValueError" in captured.err
+
+    assert convert.main(["tests/data/car.md2", "--out", str(out), "--format", "obj", "--workers", "1"]) == 0
+    assert len(list(out.glob("car_*.obj"))) == 30
@@ -0,0 +1,58 @@
+import struct
+import numpy as np
+from util import MD2
+
+
+def reference_gl_commands(gl_command_bytes):
+    """ Per vertex struct based decoding the array path has to match """
+    offset = 0
+    gl_commands = list()
+    while True:
+        (mode,) = struct.unpack("<i", gl_command_bytes[offset:offset + 4])
+        offset += 4
+        if mode == 0:
+            break
+        gl_vertices = list()
+        for i in range(abs(mode)):
+            s, t, index = struct.unpack("<ffi", gl_command_bytes[offset + 12 * i:offset + 12 * i + 12])
+            gl_vertices.append(MD2.glCommandVertex_t(s, t, index))
+        offset += 12 * abs(mode)
+        gl_commands.append(MD2.glCommand_t("GL_TRIANGLE_STRIP" if mode > 0 else "GL_TRIANGLE_FAN", gl_vertices))
+    return gl_commands
+
+
+def gl_command_lump(commands):
+    """ commands: list of (mode, [(s, t, index), ...]) """
+    lump = b""
+    for mode, vertices in commands:
+        lump += struct.pack("<i", mode) + b"".join(struct.pack("<ffi", *x) for x in vertices)
+    return lump + struct.pack("<i", 0)
+
+
+def test_gl_commands_match_reference():
+    for path in ("tests/data/car.md2", "tests/data/bigleaf2.md2"):
+        with open(path, "rb") as f:
+            byte_list = f.read()
+        header = MD2.load_header(byte_list)
+        lump = byte_list[header.ofs_glcmds:header.ofs_end]
+        assert MD2.load_gl_commands(lump) == reference_gl_commands(lump)
+
+
+def test_gl_command_triangles():
+    vertices = [(0.1 * i, 0.2 * i, i) for i in range(5)]
+    arrays = MD2.load_gl_command_arrays(gl_command_lump([(5, vertices), (-4, vertices[:4]), (2, vertices[:2])]))
+    indices, uvs = MD2.gl_command_triangles(arrays)
+    np.testing.assert_array_equal(indices, [[0, 1, 2], [2, 1, 3], [2, 3, 4],  # strip, odd triangle swapped
+                                            [0, 1, 2], [0, 2, 3]])  # fan, the 2 vertex strip yields nothing
+    np.testing.assert_allclose(uvs[1], [[0.2, 0.4], [0.1, 0.2], [0.3, 0.6]], rtol=1e-6)
+
+
+def test_gl_command_triangles_cover_model():
+    model = MD2.load_file("tests/data/car.md2")
+    indices, uvs = MD2.gl_command_triangles(model.gl_command_arrays)
+    assert sorted(map(frozenset, indices.tolist())) == sorted(map(frozenset, model.vertex_indices.tolist()))
+
+
+def test_skip_gl_commands():
+    model = MD2.load_file("tests/data/car.md2", decode_gl_commands=False)
+    assert model.gl_commands is None and model.gl_command_arrays is None
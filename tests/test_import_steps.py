@@ -0,0 +1,239 @@
+"""
+Runs the time-sliced import against a stubbed bpy, checking the parse/apply split without Blender
+"""
+import importlib
+import shutil
+import sys
+import types
+from unittest import mock
+import pytest
+import numpy as np
+from util import MD2
+from util import animations
+from util import jobs
+
+
+@pytest.fixture
+def blender_load_md2(monkeypatch):
+    bpy = mock.MagicMock(name="bpy")
+    bpy.app.version = (4, 2, 0)
+    bpy.context.scene.render.fps = 24
+    bpy.context.scene.render.fps_base = 1.0
+    bpy.data.objects.new.return_value.data = bpy.data.meshes.new.return_value
+    bpy.data.meshes.new.return_value.uv_layers.active = None  # new meshes have no UV layer
+    # custom properties of the imported object and bpy.data.objects listing it
+    obj = bpy.data.objects.new.return_value
+    properties = dict()
+    obj.__setitem__.side_effect = properties.__setitem__
+    obj.__getitem__.side_effect = properties.__getitem__
+    obj.__delitem__.side_effect = properties.__delitem__
+    obj.get.side_effect = properties.get
+    obj.name_full = "car"
+    obj.type = 'MESH'
+    handlers = types.ModuleType("bpy.app.handlers")
+    handlers.persistent = lambda function: function
+    handlers.frame_change_pre = list()
+    handlers.load_post = list()
+    bpy.app.handlers = handlers
+    bpy.data.objects.__iter__.side_effect = lambda: iter([obj] if properties else [])
+    bpy_types = types.ModuleType("bpy.types")
+    bpy_types.Operator = type("Operator", (), {})
+    bpy_types.OperatorFileListElement = type("OperatorFileListElement", (), {})
+    bpy.types = bpy_types
+    io_utils = types.ModuleType("bpy_extras.io_utils")
+    io_utils.ImportHelper = type("ImportHelper", (), {})
+    monkeypatch.setitem(sys.modules, "bpy", bpy)
+    monkeypatch.setitem(sys.modules, "bpy.props", bpy.props)
+    monkeypatch.setitem(sys.modules, "bpy.app", bpy.app)
+    monkeypatch.setitem(sys.modules, "bpy.app.handlers", handlers)
+    monkeypatch.setitem(sys.modules, "bpy.types", bpy_types)
+    monkeypatch.setitem(sys.modules, "bpy_extras", types.ModuleType("bpy_extras"))
+    monkeypatch.setitem(sys.modules, "bpy_extras.io_utils", io_utils)
+    for name in [x for x in sys.modules if x.startswith("md2_importer")]:
+        monkeypatch.delitem(sys.modules, name)
+    module = importlib.import_module("md2_importer.blender_load_md2")
+    yield module, bpy
+    for name in [x for x in sys.modules if x.startswith("md2_importer")]:
+        del sys.modules[name]
+
+
+def import_job(module, path="tests/data/car.md2"):
+    def parse():
+        return MD2.load_file(path, decode_gl_commands=False)
+
+    def apply(model):
+        return module.blender_load_md2_steps(path, "", False, "", my_object=model,
+                                             skin_resolver=module.SkinResolver([]))
+    return jobs.ImportJob(parse, apply)
+
+
+def test_steps_apply_in_slices(blender_load_md2):
+    module, bpy = blender_load_md2
+    job = import_job(module)
+    progress = list()
+    while not job.done:
+        job.step(time_budget=0)
+        progress.append(job.progress)
+    assert job.state == jobs.FINISHED, job.error
+    num_frames = MD2.load_file("tests/data/car.md2").header.num_frames
+    obj = bpy.data.objects.new.return_value
+    # Basis and one shape key per frame, each applied in its own slice
+    assert obj.shape_key_add.call_count == num_frames + 1
+    assert len(progress) > num_frames
+    assert progress == sorted(progress) and progress[-1] == 1.0
+    mesh = bpy.data.meshes.new.return_value
+    mesh.vertices.foreach_set.assert_called_once()
+    mesh.uv_layers.new.return_value.data.foreach_set.assert_called_once()
+    bpy.data.objects.remove.assert_not_called()
+
+
+def test_cancel_removes_partial_import(blender_load_md2):
+    module, bpy = blender_load_md2
+    job = import_job(module)
+    while job.progress < 0.5:
+        job.step(time_budget=0)
+    job.cancel()
+    assert job.state == jobs.CANCELLED
+    obj = bpy.data.objects.new.return_value
+    obj.shape_key_clear.assert_called_once()
+    assert bpy.data.actions.remove.call_count == 1
+    bpy.data.objects.remove.assert_called_once_with(obj)
+    bpy.data.meshes.remove.assert_called_once_with(bpy.data.meshes.new.return_value)
+
+
+def test_error_removes_partial_import(blender_load_md2):
+    module, bpy = blender_load_md2
+    obj = bpy.data.objects.new.return_value
+    mesh = bpy.data.meshes.new.return_value
+    # the skin fails after the animation was created
+    bpy.data.materials.new.side_effect = RuntimeError("material")
+    with pytest.raises(RuntimeError):
+        module.blender_load_md2("tests/data/car.md2", "car", False, "", skin_resolver=module.SkinResolver([]))
+    bpy.data.actions.remove.assert_called_once_with(bpy.data.actions.get.return_value)
+    bpy.data.objects.remove.assert_called_once_with(obj)
+    bpy.data.meshes.remove.assert_called_once_with(mesh)
+
+    # an error while keying removes the keys created so far
+    bpy.reset_mock()
+    del obj[module.ACTIONS_PROPERTY]  # the custom properties went with the removed object
+    obj.shape_key_add.side_effect = [mock.MagicMock()] * 3 + [RuntimeError("shape key")]
+    with pytest.raises(RuntimeError):
+        module.blender_load_md2("tests/data/car.md2", "car", False, "", skin_resolver=module.SkinResolver([]))
+    obj.shape_key_clear.assert_called_once()
+    bpy.data.actions.remove.assert_called_once_with(bpy.data.actions.new.return_value)
+    bpy.data.objects.remove.assert_called_once_with(obj)
+
+
+def test_blender_load_md2_runs_all_steps(blender_load_md2):
+    module, bpy = blender_load_md2
+    assert module.blender_load_md2("tests/data/car.md2", "car", False, "",
+                                   skin_resolver=module.SkinResolver([])) == {'FINISHED'}
+    bpy.data.materials.new.assert_called_once()
+
+
+def test_actions_hold_other_shape_keys(blender_load_md2):
+    module, bpy = blender_load_md2
+    obj = bpy.data.objects.new.return_value
+    obj.shape_key_add.side_effect = lambda name, from_mix: mock.MagicMock(**{"path_from_id.return_value": name})
+    bpy.data.actions.new.side_effect = lambda name: mock.MagicMock(name=name)
+    model = MD2.load_file("tests/data/car.md2")
+    selected = [animations.animation_t("first", [0, 1, 2]), animations.animation_t("second", [3, 4])]
+    steps = module.create_shape_key_animation(obj, model, selected, 2.4)
+    with pytest.raises(StopIteration) as stop:
+        while True:
+            next(steps)
+    first, second = stop.value.value
+    # each action keys its own shape keys and holds the other animation's ones at 0
+    assert [x[0][0] for x in first.fcurves.new.call_args_list] == ["frame01", "frame02", "frame03", "frame04", "frame05"]
+    assert [x[0][0] for x in second.fcurves.new.call_args_list] == ["frame04", "frame05", "frame01", "frame02", "frame03"]
+    hold = second.fcurves.new.return_value.keyframe_points
+    np.testing.assert_array_equal(hold.foreach_set.call_args_list[-1][0][1], [0, 0])
+
+
+def test_update_existing_rewrites_changed_frames(blender_load_md2, tmp_path):
+    module, bpy = blender_load_md2
+    path = str(tmp_path / "car.md2")
+    shutil.copy("tests/data/car.md2", path)
+    module.blender_load_md2(path, "", False, "")
+    obj = bpy.data.objects.new.return_value
+    assert obj.get(module.SOURCE_PROPERTY) == path
+    key_blocks = bpy.data.meshes.new.return_value.shape_keys.key_blocks
+
+    # unchanged file: nothing is rewritten
+    key_blocks.reset_mock()
+    module.blender_load_md2(path, "", False, "", update_existing=True)
+    assert bpy.data.objects.new.call_count == 1
+    key_blocks.__getitem__.assert_not_called()
+
+    # one changed vertex of frame 3: only its shape key is written
+    with open(path, "r+b") as f:
+        header = MD2.load_header(f.read(68))
+        f.seek(header.ofs_frames + 3 * header.framesize + 40)
+        f.write(b"\xff")
+    assert module.update_imported_object(obj)
+    assert bpy.data.objects.new.call_count == 1 and bpy.data.meshes.new.call_count == 1
+    key_blocks.__getitem__.assert_called_once_with(1 + 3)
+    bpy.data.actions.new.assert_called_once()
+
+
+def test_update_targets_the_given_object(blender_load_md2, tmp_path):
+    module, bpy = blender_load_md2
+    path = str(tmp_path / "car.md2")
+    shutil.copy("tests/data/car.md2", path)
+    module.blender_load_md2(path, "", False, "")
+    first = bpy.data.objects.new.return_value
+    # a duplicate (Shift+D) copies the custom properties, so both objects name the same source
+    second = mock.MagicMock(name="duplicate")
+    properties = {x: first[x] for x in (module.SOURCE_PROPERTY, module.FINGERPRINT_PROPERTY,
+                                         module.CUSTOM_SKIN_PROPERTY)}
+    second.__setitem__.side_effect = properties.__setitem__
+    second.__getitem__.side_effect = properties.__getitem__
+    second.get.side_effect = properties.get
+    bpy.data.objects.__iter__.side_effect = lambda: iter([first, second])
+    first_keys = first.data.shape_keys.key_blocks
+    first_keys.reset_mock()
+
+    with open(path, "r+b") as f:
+        header = MD2.load_header(f.read(68))
+        f.seek(header.ofs_frames + 3 * header.framesize + 40)
+        f.write(b"\xff")
+    assert module.update_imported_object(second)
+    second.data.shape_keys.key_blocks.__getitem__.assert_called_once_with(1 + 3)
+    first_keys.__getitem__.assert_not_called()
+    assert properties[module.FINGERPRINT_PROPERTY] != first[module.FINGERPRINT_PROPERTY]
+
+
+def test_playback_without_keys(blender_load_md2):
+    module, bpy = blender_load_md2
+    path = "tests/data/car.md2"
+    module.blender_load_md2(path, "", False, "", "PLAYBACK")
+    obj = bpy.data.objects.new.return_value
+    mesh = bpy.data.meshes.new.return_value
+    obj.shape_key_add.assert_not_called()
+    bpy.data.actions.new.assert_not_called()
+    assert bpy.app.handlers.frame_change_pre == [module.playback_frame_change]
+
+    model = MD2.load_file(path)
+    first = animations.group_animations(model.frame_info["name"])[0]
+    assert obj.get(module.ANIMATION_PROPERTY) == first.name
+    scene = mock.MagicMock(frame_current=6, frame_subframe=0.0, objects=[obj])
+    scene.render.fps, scene.render.fps_base = 24, 1.0
+    # 0.25 s at 10 MD2 frames per second: halfway between the animation's frames 2 and 3
+    expected = (model.positions[first.frames[2]] + model.positions[first.frames[3]]) / 2
+    module.playback_frame_change(scene)
+    np.testing.assert_allclose(mesh.vertices.foreach_set.call_args[0][1], expected.ravel(), atol=1e-4)
+
+    # after reopening the .blend file the frames are loaded from the source file again
+    assert bpy.app.handlers.load_post == [module.clear_players]
+    module.clear_players(None)
+    assert not module._players
+    mesh.vertices.__len__.return_value = model.header.num_xyz
+    mesh.vertices.foreach_set.reset_mock()
+    module.playback_frame_change(scene)
+    np.testing.assert_allclose(mesh.vertices.foreach_set.call_args[0][1], expected.ravel(), atol=1e-4)
+
+    assert module.bake_playback(obj)
+    assert obj.get(module.PLAYBACK_PROPERTY) is None and "car" not in module._players
+    assert obj.shape_key_add.call_count == sum(len(x.frames) for x in animations.group_animations(
+        model.frame_info["name"])) + 1
+    assert module.reimport.loads_fingerprint(obj.get(module.FINGERPRINT_PROPERTY))["animation"]["mode"] == "SHAPE_KEYS"
@@ -0,0 +1,117 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from util import MD2
+from util import jobs
+from util.profiling import ImportReport
+
+
+class FakeClock:
+    """ advances by one second per call, so each time slice applies a fixed number of chunks """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class StubWindowManager:
+    def __init__(self):
+        self.progress = list()
+
+    def progress_update(self, value):
+        self.progress.append(value)
+
+
+def mesh_and_frames(created, cleaned_up):
+    """ apply function standing in for the blender import: one chunk for the mesh, one per frame """
+    def apply(model):
+        try:
+            created.append("mesh")
+            yield 0.1
+            for i in range(model.header.num_frames):
+                created.append(i)
+                yield 0.1 + 0.9 * (i + 1) / model.header.num_frames
+        except GeneratorExit:
+            cleaned_up.append(True)
+            raise
+    return apply
+
+
+def test_parse_on_worker_then_apply_in_slices():
+    created = list()
+    parse_thread = list()
+
+    def parse():
+        parse_thread.append(threading.current_thread())
+        return MD2.load_file("tests/data/car.md2")
+
+    job = jobs.ImportJob(parse, mesh_and_frames(created, list()))
+    job._future.result()
+    assert parse_thread[0] is not threading.main_thread()
+    clock = FakeClock()
+    window_manager = StubWindowManager()
+    states = list()
+    while not job.done:
+        states.append(job.step(time_budget=2.5, clock=clock))
+        window_manager.progress_update(int(job.progress * 100))
+    num_frames = len(created) - 1
+    assert created == ["mesh"] + list(range(num_frames))
+    # the deadline is checked after each chunk: three chunks per slice (and the StopIteration of the last one)
+    assert len(states) == -(-(num_frames + 2) // 3)
+    assert states[-1] == jobs.FINISHED and job.progress == 1.0
+    assert window_manager.progress == sorted(window_manager.progress) and window_manager.progress[-1] == 100
+
+
+def test_update_progress():
+    job = jobs.ImportJob(lambda: MD2.load_file("tests/data/car.md2"), mesh_and_frames(list(), list()))
+    window_manager = StubWindowManager()
+    while jobs.update_progress(job, window_manager, time_budget=0) != jobs.FINISHED:
+        pass
+    assert window_manager.progress[-1] == 100
+
+
+def test_cancel_closes_apply():
+    created = list()
+    cleaned_up = list()
+    job = jobs.ImportJob(lambda: MD2.load_file("tests/data/car.md2"), mesh_and_frames(created, cleaned_up))
+    job._future.result()
+    job.step(time_budget=0)
+    assert job.state == jobs.APPLYING and 0 < job.progress < 1
+    job.cancel()
+    assert job.state == jobs.CANCELLED and cleaned_up == [True]
+    assert job.step() == jobs.CANCELLED
+    assert created == ["mesh"]
+
+
+def test_failures():
+    job = jobs.ImportJob(lambda: MD2.load_file("tests/data/car.jpg"), mesh_and_frames(list(), list()))
+    assert job.run() == jobs.FAILED
+    assert job.error.startswith("ValueError")
+
+    def apply(model):
+        yield 0.5
+        raise RuntimeError("broken")
+
+    job = jobs.ImportJob(lambda: None, apply)
+    assert job.run() == jobs.FAILED and job.error == "RuntimeError: broken"
+
+
+def test_scaled_progress():
+    report = ImportReport()
+
+    def steps():
+        yield 0.0
+        yield 0.5
+        yield 1.0
+        return "actions"
+
+    def outer():
+        result = yield from jobs.scaled_progress(steps(), 0.2, 0.6, report, "animation")
+        assert result == "actions"
+        yield 1.0
+
+    assert list(outer()) == pytest.approx([0.2, 0.4, 0.6, 1.0])
+    assert "animation" in report.stages
@@ -0,0 +1,42 @@
+from util import keyframes
+import numpy as np
+
+
+def test_shape_key_keyframes():
+    np.testing.assert_array_equal(keyframes.shape_key_keyframes(2, 5, 10), [10, 0, 20, 1, 30, 0])
+    # first frame is shown again after the last one
+    np.testing.assert_array_equal(keyframes.shape_key_keyframes(0, 5, 10), [0, 1, 10, 0, 40, 0, 50, 1])
+    np.testing.assert_array_equal(keyframes.shape_key_keyframes(4, 5, 10), [30, 0, 40, 1, 50, 0])
+
+
+def test_shape_key_keyframes_single_frame():
+    np.testing.assert_array_equal(keyframes.shape_key_keyframes(0, 1, 10), [0, 1, 10, 0])
+    np.testing.assert_array_equal(keyframes.shape_key_keyframes(0, 2, 10), [0, 1, 10, 0, 20, 1])
+
+
+def test_static_vertices():
+    positions = np.zeros((4, 3, 3), dtype=np.float32)
+    positions[2, 1, 2] = 0.5
+    positions[3, 2, 0] = 0.01
+    np.testing.assert_array_equal(keyframes.static_vertices(positions), [True, False, False])
+    np.testing.assert_array_equal(keyframes.static_vertices(positions, 0.1), [True, False, True])
+
+
+def test_reduce_linear_keys():
+    times = np.arange(7, dtype=np.float32)
+    values = np.stack([
+        [0, 1, 2, 3, 4, 5, 6],  # straight line: only the ends are kept
+        [0, 0, 0, 5, 0, 0, 0],  # spike
+        [0, 1, 2, 3, 2, 1, 0],  # corner at key 3
+        [0, 0.05, 0, 0.05, 0, 0.05, 0],  # noise below the tolerance
+    ], axis=1)
+    keep = keyframes.reduce_linear_keys(times, values, tolerance=0.1)
+    np.testing.assert_array_equal(keep[:, 0], [1, 0, 0, 0, 0, 0, 1])
+    np.testing.assert_array_equal(keep[:, 1], [1, 0, 1, 1, 1, 0, 1])
+    np.testing.assert_array_equal(keep[:, 2], [1, 0, 0, 1, 0, 0, 1])
+    np.testing.assert_array_equal(keep[:, 3], [1, 0, 0, 0, 0, 0, 1])
+    # every original key is reproduced within the tolerance
+    for curve in range(values.shape[1]):
+        kept = keep[:, curve]
+        np.testing.assert_allclose(np.interp(times, times[kept], values[kept, curve]), values[:, curve], atol=0.1)
+    assert keyframes.reduce_linear_keys(times, values).sum() == 2 + 5 + 3 + 7
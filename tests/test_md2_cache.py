@@ -0,0 +1,56 @@
+import os
+import numpy as np
+from util import MD2, batch
+from util.md2_cache import MD2Cache
+
+
+def test_hit_after_miss(tmp_path):
+    cache = MD2Cache(str(tmp_path))
+    first = cache.load("tests/data/car.md2")
+    second = cache.load("tests/data/car.md2")
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert isinstance(second.positions, np.memmap)
+    np.testing.assert_array_equal(first.positions, second.positions)
+    np.testing.assert_array_equal(first.st, second.st)
+    assert first.header == second.header
+    assert first.skin_names == second.skin_names
+    assert first.frames[3] == second.frames[3]
+    assert first.gl_commands == second.gl_commands
+
+
+def test_bypass_and_clear(tmp_path):
+    cache = MD2Cache(str(tmp_path))
+    cache.load("tests/data/car.md2", bypass=True)
+    assert cache.stats()["entries"] == 0
+    cache.load("tests/data/car.md2")
+    cache.load("tests/data/bigleaf2.md2")
+    assert cache.stats()["entries"] == 2
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction(tmp_path):
+    cache = MD2Cache(str(tmp_path))
+    cache.load("tests/data/car.md2")
+    cache.load("tests/data/bigleaf2.md2")
+    cache.load("tests/data/car.md2")  # hit, bigleaf2 becomes the least recently used entry
+    entries = sorted(cache.entries())
+    assert cache.stats()["entries"] == 2
+    # spread last use times beyond the file system's timestamp resolution
+    os.utime(os.path.join(entries[0][2], "meta.json"), (1, 1))
+
+    cache.max_bytes = cache.stats()["bytes"] - 1
+    cache.evict()
+    assert cache.evictions == 1
+    remaining = cache.entries()
+    assert len(remaining) == 1 and remaining[0][2] != entries[0][2]
+
+
+def test_batch_with_cache(tmp_path):
+    cache = MD2Cache(str(tmp_path))
+    paths = ["tests/data/car.md2", "tests/data/car.jpg"]
+    batch.parse_files(paths, max_workers=1, cache=cache)
+    results = batch.parse_files(paths, max_workers=1, cache=cache)
+    assert cache.hits == 1
+    assert results[0].model.header == MD2.load_file(paths[0]).header
+    assert results[1].error
@@ -0,0 +1,76 @@
+import os
+import struct
+from util import MD2
+import numpy as np
+import pytest
+
+
+def reference_positions(path):
+    """ Per vertex struct based decoding the array path has to match """
+    with open(path, "rb") as f:
+        byte_list = f.read()
+    header = MD2.load_header(byte_list)
+    frame_size = 40 + 4 * header.num_xyz
+    positions = list()
+    normals = list()
+    for current_frame in range(header.num_frames):
+        start = header.ofs_frames + frame_size * current_frame
+        scale = struct.unpack("<fff", byte_list[start:start + 12])
+        translate = struct.unpack("<fff", byte_list[start + 12:start + 24])
+        for v in range(header.num_xyz):
+            x, y, z, n = struct.unpack("<BBBB", byte_list[start + 40 + 4 * v:start + 44 + 4 * v])
+            positions.append([x * scale[0] + translate[0], y * scale[1] + translate[1], z * scale[2] + translate[2]])
+            normals.append(n)
+    return header, np.array(positions).reshape(header.num_frames, header.num_xyz, 3), np.array(normals).reshape(header.num_frames, header.num_xyz)
+
+
+def test_frame_arrays_match_reference():
+    data_dir = "tests/data"
+    for model_name in [x for x in os.listdir(data_dir) if x.lower().endswith(".md2")]:
+        path = os.path.join(data_dir, model_name)
+        header, expected_positions, expected_normals = reference_positions(path)
+        model = MD2.load_file(path)
+        assert model.positions.shape == (header.num_frames, header.num_xyz, 3)
+        assert model.positions.dtype == np.float32
+        assert model.normal_indices.dtype == np.uint8
+        np.testing.assert_allclose(model.positions, expected_positions, rtol=1e-5, atol=1e-4)
+        np.testing.assert_array_equal(model.normal_indices, expected_normals)
+
+
+def test_dataclass_view():
+    model = MD2.load_file("tests/data/car.md2")
+    assert len(model.frames) == model.header.num_frames
+    assert len(model.frames[0].verts) == model.header.num_xyz
+    np.testing.assert_allclose(model.frames[-1].verts[-1].v, model.positions[-1, -1], rtol=1e-6)
+    assert model.frames[0].verts[0].lightnormalindex == model.normal_indices[0, 0]
+
+
+def test_loop_uvs_match_dataclasses():
+    model = MD2.load_file("tests/data/car.md2")
+    expected = [(model.texture_coordinates[i].s, 1 - model.texture_coordinates[i].t)
+                for triangle in model.triangles for i in triangle.textureIndices]
+    np.testing.assert_allclose(MD2.loop_uvs(model.st, model.texture_indices).reshape(-1, 2), expected, rtol=1e-6)
+    expected_pcx = [(model.texture_coordinates[i].s, model.texture_coordinates[i].t)
+                    for triangle in model.triangles for i in triangle.textureIndices]
+    np.testing.assert_allclose(MD2.loop_uvs(model.st, model.texture_indices, flip_t=False).reshape(-1, 2), expected_pcx)
+
+
+def test_columnar_containers():
+    model = MD2.load_file("tests/data/car.md2")
+    assert isinstance(model.triangles, MD2.TriangleArray)
+    assert model.triangles[-1] == MD2.triangle_t(model.vertex_indices[-1].tolist(), model.texture_indices[-1].tolist())
+    assert model.triangles[:2] == [model.triangles[0], model.triangles[1]]
+    assert model.texture_coordinates[0].s == model.st[0, 0]
+    assert model.frames[0].verts == list(model.frames[0].verts)
+    assert not hasattr(model.frames[0].verts[0], "__dict__")
+    with pytest.raises(IndexError):
+        model.triangles[len(model.triangles)]
+
+
+def test_record_array_requires_record():
+    class Incomplete(MD2.RecordArray):
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from util import MD2
+
+
+def test_lazy_matches_eager():
+    eager = MD2.load_file("tests/data/car.md2")
+    lazy = MD2.load_file("tests/data/car.md2", lazy=True)
+    assert isinstance(lazy.positions, MD2.LazyFramePositions)
+    assert lazy.positions.shape == eager.positions.shape
+    assert len(lazy.frames) == len(eager.frames)
+    np.testing.assert_array_equal(lazy.positions[-1], eager.positions[-1])
+    np.testing.assert_array_equal(np.asarray(lazy.positions), eager.positions)
+    np.testing.assert_array_equal(lazy.normal_indices, eager.normal_indices)
+    np.testing.assert_array_equal(lazy.st, eager.st)
+    assert lazy.frames[1] == eager.frames[1]
+    assert lazy.frames[-1] == eager.frames[-1]
+    with pytest.raises(IndexError):
+        lazy.positions[len(eager.frames)]
+
+
+def test_lru_cache():
+    model = MD2.load_file("tests/data/car.md2", lazy=True)
+    positions = model.positions
+    positions.cache_size = 2
+    first = positions[0]
+    assert positions[0] is first
+    positions[1]
+    positions[2]  # evicts frame 0
+    assert positions[0] is not first
+    assert len(positions._cache) == 2
+    assert not first.flags.writeable
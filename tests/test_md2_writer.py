@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from util import MD2, anorms, md2_writer
+
+
+def rotated(triangles):
+    # triangles with the same corners in the same winding compare equal
+    return sorted(min(tuple(np.roll(x, -i).tolist()) for i in range(3)) for x in triangles)
+
+
+@pytest.mark.parametrize("name", ["car.md2", "bigleaf2.md2"])
+def test_round_trip(tmp_path, name):
+    model = MD2.load_file(f"tests/data/{name}")
+    path = str(tmp_path / name)
+    md2_writer.save_model(path, model)
+    written = MD2.load_file(path)
+
+    for field in ("skinwidth", "skinheight", "framesize", "num_skins", "num_xyz", "num_st", "num_tris", "num_frames"):
+        assert getattr(written.header, field) == getattr(model.header, field)
+    assert written.skin_names == model.skin_names
+    np.testing.assert_array_equal(written.frame_info["name"], model.frame_info["name"])
+    np.testing.assert_array_equal(written.vertex_indices, model.vertex_indices)
+    np.testing.assert_array_equal(written.texture_indices, model.texture_indices)
+    np.testing.assert_array_equal(written.st, model.st)
+    np.testing.assert_array_equal(written.normal_indices, model.normal_indices)
+    # within half a quantization step of the written frames
+    error = np.abs(written.positions - model.positions)
+    assert np.all(error <= written.frame_info["scale"][:, np.newaxis, :] / 2 + 1e-5)
+
+    triangles, uvs = MD2.gl_command_triangles(written.gl_command_arrays)
+    assert rotated(triangles) == rotated(model.vertex_indices)
+    assert len(written.gl_command_arrays.counts) <= len(model.gl_command_arrays.counts)
+
+
+def test_lumps_before_gl_commands_are_unchanged():
+    # the leaf's frame was quantized over its full extent, so re-quantizing gives the same bytes
+    with open("tests/data/bigleaf2.md2", "rb") as f:
+        original = f.read()
+    model = MD2.load_buffer(original)
+    written = md2_writer.encode_model(
+        model.positions, model.vertex_indices, model.texture_indices, model.st, model.header.skinwidth,
+        model.header.skinheight, model.skin_names, model.frame_info["name"].tolist(), model.normal_indices)
+    assert bytes(written[68:model.header.ofs_glcmds]) == original[68:model.header.ofs_glcmds]
+
+
+def test_gl_commands_keep_texture_seams():
+    model = MD2.load_file("tests/data/car.md2")
+    arrays = md2_writer.build_gl_command_arrays(model.vertex_indices, model.texture_indices, model.st)
+    decoded = MD2.load_gl_command_arrays(md2_writer.gl_command_words(arrays).tobytes())
+    np.testing.assert_array_equal(decoded.vertices, arrays.vertices)
+    triangles, uvs = MD2.gl_command_triangles(decoded)
+    expected = {tuple(x) for x in np.concatenate((model.vertex_indices[:, :, np.newaxis],
+                                                   model.st[model.texture_indices]), axis=2).reshape(-1, 9).tolist()}
+    corners = np.concatenate((triangles[:, :, np.newaxis], uvs), axis=2)
+    for triangle in corners:
+        assert any(tuple(np.roll(triangle, -i, axis=0).ravel().tolist()) in expected for i in range(3))
+
+
+def test_edited_positions_and_uvs(tmp_path):
+    model = MD2.load_file("tests/data/car.md2")
+    positions = np.asarray(model.positions) * 2
+    positions[:, :, 2] = 5  # a flat axis comes back exactly
+    st = model.st[::-1].copy()
+    md2_writer.save_model(str(tmp_path / "edited.md2"), model, positions, st, rebuild_normals=True)
+    written = MD2.load_file(str(tmp_path / "edited.md2"))
+    np.testing.assert_allclose(written.positions, positions, atol=float(written.frame_info["scale"].max()) / 2 + 1e-5)
+    assert np.all(written.positions[:, :, 2] == 5)
+    np.testing.assert_array_equal(written.st, st)
+
+
+def test_rebuilt_normals(tmp_path):
+    model = MD2.load_file("tests/data/car.md2")
+    md2_writer.save_model(str(tmp_path / "car.md2"), model, rebuild_normals=True)
+    written = MD2.load_file(str(tmp_path / "car.md2"))
+    # recomputed normals point roughly the same way as the ones of the original model
+    agreement = np.einsum("...i,...i", anorms.vertex_normals(written.normal_indices),
+                          anorms.vertex_normals(model.normal_indices))
+    assert np.mean(agreement > 0.7) > 0.9
+
+
+def test_nearest_normal_indices():
+    np.testing.assert_array_equal(md2_writer.nearest_normal_indices(anorms.ANORMS * 3), np.arange(anorms.NUM_NORMALS))
+    assert md2_writer.nearest_normal_indices(np.zeros((2, 5, 3))).shape == (2, 5)
+
+
+def test_invalid_input():
+    positions = np.zeros((1, 3, 3))
+    with pytest.raises(ValueError):
+        md2_writer.encode_model(positions, [[0, 1, 3]], [[0, 0, 0]], [[0, 0]], 8, 8)
+    with pytest.raises(ValueError):
+        md2_writer.encode_model(positions, [[0, 1, 2]], [[0, 0, 0]], [[0, 0]], 8, 8, frame_names=["a" * 17])
+    with pytest.raises(ValueError):
+        md2_writer.encode_model(np.zeros((1, 0, 3)), [], [], [], 8, 8)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from util import MD2, pak
+
+
+@pytest.fixture
+def pak_path(tmp_path):
+    files = dict()
+    for name in ("car.md2", "car.jpg", "bigleaf2.md2"):
+        with open(f"tests/data/{name}", "rb") as f:
+            files[f"models/{name}"] = f.read()
+    files["models/Car.pcx"] = b"not read"
+    path = str(tmp_path / "pak0.pak")
+    pak.write_pak(path, files)
+    return path
+
+
+def test_load_md2_from_pak(pak_path):
+    with pak.PakFile(pak_path) as archive:
+        assert archive.names(".md2") == ["models/bigleaf2.md2", "models/car.md2"]
+        data = archive.read("models/car.md2")
+        assert isinstance(data, memoryview)
+        model = MD2.load_buffer(data)
+        del data
+    expected = MD2.load_file("tests/data/car.md2")
+    assert model.header == expected.header
+    np.testing.assert_array_equal(model.positions, expected.positions)
+    assert model.skin_names == expected.skin_names
+
+
+def test_find_skin(pak_path):
+    with pak.PakFile(pak_path) as archive:
+        # .jpg ranks before .pcx, case and stored extension are ignored
+        assert archive.find_skin("MODELS/car.tga\x00garbage") == "models/car.jpg"
+        assert archive.find_skin("models/missing.pcx") is None
+
+
+def test_not_a_pak():
+    with pytest.raises(ValueError):
+        pak.PakFile("tests/data/car.md2")
@@ -0,0 +1,64 @@
+import struct
+import numpy as np
+import pytest
+from util import pcx
+
+
+def encode_rle(scanline_bytes):
+    """ Straightforward PCX RLE encoder, runs never cross the given bytes """
+    out = bytearray()
+    i = 0
+    while i < len(scanline_bytes):
+        value = scanline_bytes[i]
+        run = 1
+        while i + run < len(scanline_bytes) and scanline_bytes[i + run] == value and run < 63:
+            run += 1
+        if run > 1 or value >= 0xC0:
+            out += bytes((0xC0 | run, value))
+        else:
+            out.append(value)
+        i += run
+    return bytes(out)
+
+
+def make_pcx(planes, width, bytes_per_line, palette=None):
+    """ planes: uint8 array (height, num_planes, bytes_per_line) """
+    height, num_planes, _ = planes.shape
+    header = struct.pack("<BBBBHHHHHH", 0x0A, 5, 1, 8, 0, 0, width - 1, height - 1, 72, 72)
+    header += bytes(48) + struct.pack("<BBHH", 0, num_planes, bytes_per_line, 1)
+    header += bytes(128 - len(header))
+    data = b"".join(encode_rle(row.tobytes()) for row in planes.reshape(height, -1))
+    if palette is not None:
+        data += b"\x0c" + palette.tobytes()
+    return header + data
+
+
+def test_palettized():
+    rng = np.random.default_rng(0)
+    width, height, bytes_per_line = 5, 4, 6
+    indices = rng.integers(190, 256, size=(height, 1, bytes_per_line), dtype=np.uint8)
+    indices[1, 0, :] = 200  # one long run
+    palette = rng.integers(0, 256, size=(256, 3), dtype=np.uint8)
+
+    w, h, pixels = pcx.decode_pcx(make_pcx(indices, width, bytes_per_line, palette))
+    assert (w, h) == (width, height)
+    assert pixels.dtype == np.float32
+    rgba = pixels.reshape(height, width, 4)
+    # Blender images start at the bottom row
+    np.testing.assert_allclose(rgba[::-1, :, :3] * 255, palette[indices[:, 0, :width]], atol=1e-3)
+    np.testing.assert_array_equal(rgba[:, :, 3], 1)
+
+
+def test_true_color():
+    rng = np.random.default_rng(1)
+    width, height = 3, 2
+    planes = rng.integers(0, 256, size=(height, 3, width), dtype=np.uint8)
+    w, h, pixels = pcx.decode_pcx(make_pcx(planes, width, width))
+    rgba = pixels.reshape(height, width, 4)
+    np.testing.assert_allclose(rgba[::-1, :, :3] * 255, planes.transpose(0, 2, 1), atol=1e-3)
+
+
+def test_not_pcx():
+    with open("tests/data/car.jpg", "rb") as f:
+        with pytest.raises(ValueError):
+            pcx.decode_pcx(f.read())
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from util import MD2, playback
+
+
+def test_frame_blend():
+    assert playback.frame_blend(0, 4) == (0, 1, 0)
+    assert playback.frame_blend(2.5, 4) == (2, 3, 0.5)
+    # loops from the last frame back into the first one
+    assert playback.frame_blend(3.25, 4) == (3, 0, 0.25)
+    assert playback.frame_blend(9, 4) == (1, 2, 0)
+    assert playback.frame_blend(-0.5, 4) == (3, 0, 0.5)
+    # holds the first and last frame without looping
+    assert playback.frame_blend(-1, 4, loop=False) == (0, 1, 0)
+    assert playback.frame_blend(7, 4, loop=False)[:1] == (3,)
+    assert playback.frame_blend(7, 4, loop=False)[2] == 0
+    assert playback.frame_blend(5, 1) == (0, 0, 0)
+    with pytest.raises(ValueError):
+        playback.frame_blend(0, 0)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_player_decodes_frames(lazy):
+    model = MD2.load_file("tests/data/car.md2", lazy=lazy)
+    expected = np.asarray(model.positions)
+    player = playback.FramePlayer.from_model(model, {"all": list(range(model.header.num_frames))})
+    for frame in (0, 7, 29):
+        np.testing.assert_allclose(player.frame(frame), expected[frame], atol=1e-5)
+    np.testing.assert_allclose(player.frame(3, 4, 0.25), expected[3] * 0.75 + expected[4] * 0.25, atol=1e-4)
+    if lazy:
+        # the frames stay in the memory-mapped file
+        assert player.nbytes == 2 * expected[0].nbytes
+    else:
+        assert player.nbytes == 2 * expected[0].nbytes + expected.size
+
+
+def test_player_plays_animations():
+    model = MD2.load_file("tests/data/car.md2", lazy=True)
+    expected = np.asarray(model.positions)
+    animations = {"first": [0, 1, 2], "second": [10, 12]}
+    player = playback.FramePlayer.from_model(model, animations, fps=10)
+    # 0.25 s at 10 fps is halfway between the animation's frames 2 and 3, which loops back to its first frame
+    np.testing.assert_allclose(player.at(0.25, "first"), (expected[2] + expected[0]) / 2, atol=1e-4)
+    np.testing.assert_allclose(player.at(0.1, "second"), expected[12], atol=1e-5)
+    np.testing.assert_allclose(player.at(0.1, "unknown"), expected[1], atol=1e-5)
+    player.interpolate = False
+    np.testing.assert_allclose(player.at(0.25, "first"), expected[2], atol=1e-5)
@@ -20,3 +20,54 @@ def test_get_existing_skin_path():
         'skin_path': 'tests/data/car.bmp'}
     out = get_existing_skin_path(**args)
     assert out == "tests/data/car.jpg"
+
+
+def make_files(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+
+def test_skin_resolver(tmp_path):
+    baseq2 = tmp_path / "baseq2"
+    mod = tmp_path / "mod"
+    make_files(baseq2, ["models/sk89q/w_sitters/car.pcx", "models/sk89q/w_sitters/Car.JPG", "models/other/car.png",
+                        "models/items/ammo.tga", "readme.txt"])
+    make_files(mod, ["models/items/ammo.png"])
+    resolver = SkinResolver([str(mod), str(baseq2)])
+
+    # case-insensitive, best-ranked extension wins
+    assert resolver.resolve("models/sk89q/w_sitters/car.jpg\x00ght.jpg") == str(baseq2 / "models/sk89q/w_sitters/Car.JPG")
+    # earlier roots take precedence
+    assert resolver.resolve("models/items/ammo.pcx") == str(mod / "models/items/ammo.png")
+    # file name only as last resort
+    assert resolver.resolve("players/ammo.pcx") == str(mod / "models/items/ammo.png")
+    assert resolver.resolve("models/missing.pcx") is None
+
+
+def test_skin_resolver_md2_directory_and_refresh(tmp_path):
+    make_files(tmp_path, ["game/models/car.pcx", "models/car.md2"])
+    resolver = SkinResolver([str(tmp_path / "game")])
+    md2_path = str(tmp_path / "models/car.md2")
+    assert resolver.resolve("models/car.pcx", md2_path) == str(tmp_path / "game/models/car.pcx")
+
+    # the MD2's own directory is checked first, new files are picked up through the directory mtime
+    make_files(tmp_path, ["models/car.jpg", "game/models/new/truck.pcx"])
+    assert resolver.resolve("models/car.pcx", md2_path) == str(tmp_path / "models/car.jpg")
+    assert resolver.resolve("models/new/truck.pcx") is None
+    resolver.refresh()
+    assert resolver.resolve("models/new/truck.pcx") == str(tmp_path / "game/models/new/truck.pcx")
+
+
+def test_skin_source_key(tmp_path):
+    make_files(tmp_path, ["skin.pcx", "pak0.pak"])
+    key = skin_source_key(str(tmp_path / "skin.pcx"))
+    assert key == skin_source_key(str(tmp_path / "skin.pcx"))
+    assert key.startswith(str(tmp_path / "skin.pcx") + "|")
+    (tmp_path / "skin.pcx").write_bytes(b"changed")
+    assert skin_source_key(str(tmp_path / "skin.pcx")) != key
+
+    pak_key = skin_source_key("players/male/grunt.pcx", str(tmp_path / "pak0.pak"))
+    assert pak_key.startswith(f"{tmp_path / 'pak0.pak'}:players/male/grunt.pcx|")
+    assert pak_key != skin_source_key("players/male/cipher.pcx", str(tmp_path / "pak0.pak"))
@@ -0,0 +1,40 @@
+import json
+from util import MD2
+from util.profiling import ImportReport, profiled
+
+
+def test_parser_report(tmp_path):
+    report = ImportReport()
+    with report.stage("parse"):
+        model = MD2.load_file("tests/data/car.md2", report=report)
+    assert {"parse", "parse/read", "parse/header", "parse/frames", "parse/dequantize", "parse/gl_commands"} <= set(report.stages)
+    assert report.total_seconds == report.stages["parse"]
+    assert report.counters["vertices"] == model.header.num_xyz
+    assert report.counters["frames"] == model.header.num_frames
+    assert report.counters["triangles"] == model.header.num_tris
+
+    report.dump_json(tmp_path / "report.json")
+    with open(tmp_path / "report.json") as f:
+        data = json.load(f)
+    assert data["counters"]["frames"] == model.header.num_frames
+    assert data["stages"].keys() == report.stages.keys()
+
+
+def test_stage_accumulates_and_count():
+    report = ImportReport()
+    for _ in range(2):
+        with report.stage("mesh"):
+            pass
+    report.count("keyframes", 3)
+    report.count("keyframes", 4)
+    assert list(report.stages) == ["mesh"]
+    assert report.counters["keyframes"] == 7
+    assert "keyframes 7" in report.summary()
+
+
+def test_profiled(tmp_path):
+    with profiled(tmp_path / "import.prof"):
+        MD2.load_file("tests/data/car.md2")
+    assert (tmp_path / "import.prof").stat().st_size > 0
+    with profiled(None):
+        pass
@@ -0,0 +1,77 @@
+import os
+import shutil
+import numpy as np
+from util import MD2
+from util import reimport
+
+
+def modified_copy(tmp_path, frame_index=None, uv=False):
+    """ copy of car.md2 with one vertex of a frame or one texture coordinate changed """
+    with open("tests/data/car.md2", "rb") as f:
+        data = bytearray(f.read())
+    header = MD2.load_header(data)
+    if frame_index is not None:
+        offset = header.ofs_frames + frame_index * header.framesize + 40
+        data[offset] = (data[offset] + 1) % 256
+    if uv:
+        data[header.ofs_st] = (data[header.ofs_st] + 1) % 256
+    path = tmp_path / "car.md2"
+    path.write_bytes(data)
+    return MD2.load_file(str(path))
+
+
+def test_plan_reimport(tmp_path):
+    model = MD2.load_file("tests/data/car.md2")
+    frames = list(range(model.header.num_frames))
+    old = reimport.model_fingerprint(model, frames, {"mode": "SHAPE_KEYS"}, "skin|1|2")
+    assert reimport.loads_fingerprint(reimport.dumps_fingerprint(old)) == old
+    assert reimport.plan_reimport(old, old).unchanged
+
+    new = reimport.model_fingerprint(modified_copy(tmp_path, frame_index=3), frames, {"mode": "SHAPE_KEYS"}, "skin|1|2")
+    plan = reimport.plan_reimport(old, new)
+    assert plan.frames == [3] and not (plan.topology or plan.animation or plan.uvs or plan.skin)
+
+    new = reimport.model_fingerprint(modified_copy(tmp_path, uv=True), frames, {"mode": "SHAPE_KEYS"}, "skin|3|2")
+    plan = reimport.plan_reimport(old, new)
+    assert plan.uvs and plan.skin and not plan.frames
+
+    new = reimport.model_fingerprint(model, frames[:2], {"mode": "SHAPE_KEYS"}, "skin|1|2")
+    assert reimport.plan_reimport(old, new).animation
+    new = reimport.model_fingerprint(model, frames, {"mode": "VERTEX_KEYFRAMES"}, "skin|1|2")
+    assert reimport.plan_reimport(old, new).animation
+
+    bigleaf = MD2.load_file("tests/data/bigleaf2.md2")
+    new = reimport.model_fingerprint(bigleaf, [0], {"mode": "SHAPE_KEYS"}, "skin|1|2")
+    plan = reimport.plan_reimport(old, new)
+    assert plan.topology and plan.animation and plan.uvs and plan.skin
+    assert reimport.plan_reimport(None, old).topology
+    assert reimport.loads_fingerprint("not json") is None
+    assert reimport.loads_fingerprint('{"version": 0}') is None
+
+
+def test_fingerprint_keeps_frames_compressed():
+    lazy = MD2.load_file("tests/data/car.md2", lazy=True)
+    eager = MD2.load_file("tests/data/car.md2")
+    fingerprint = reimport.model_fingerprint(lazy, [5, 2, 7], {"mode": "SHAPE_KEYS"})
+    assert len(lazy.positions._cache) == 0  # hashed without dequantizing a frame
+    assert len(fingerprint["frames"]) == 3
+    assert reimport.model_fingerprint(eager, [5, 2, 7], {"mode": "SHAPE_KEYS"}) == fingerprint
+    compressed, scale, translate = MD2.compressed_frames(eager, np.array([5]))
+    np.testing.assert_array_equal(compressed, lazy.positions.raw_frames["verts"][5:6, :, :3])
+
+
+def test_source_watcher(tmp_path):
+    shutil.copy("tests/data/car.md2", tmp_path / "car.md2")
+    path = str(tmp_path / "car.md2")
+    watcher = reimport.SourceWatcher()
+    watcher.watch([path, str(tmp_path / "missing.md2")])
+    assert watcher.changed() == []
+    with open(path, "ab") as f:
+        f.write(b"\x00")
+    assert watcher.changed() == [path]
+    assert watcher.changed() == []
+    os.remove(path)
+    assert watcher.changed() == []
+    shutil.copy("tests/data/car.md2", path)
+    watcher.watch([path])
+    assert watcher.changed() == [path]
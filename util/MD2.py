@@ -1,35 +1,44 @@
+import abc
+from collections import OrderedDict
+from collections.abc import Sequence
 from dataclasses import dataclass
+import mmap
+import operator
 import struct
-from typing import List
+from typing import List, Sequence as SequenceType
+import numpy as np
+from .profiling import ImportReport
 """
 This part is used to load an md2 file into a MD2 dataclass object
 """
 """ 
-Dataclasses resembling structs in C. Used for storing MD2 information, being nested and forming one big dataclass
+Dataclasses resembling structs in C. Used for storing MD2 information, being nested and forming one big dataclass.
+Per record types use __slots__. The bulk data (vertices, triangles, texture coordinates, gl commands) is held in
+numpy arrays by columnar containers, which build a record object whenever one of their elements is accessed.
 """
 
-@dataclass
+@dataclass(slots=True)
 class vec3_t:
     x: float
     y: float
     z: float
 
 
-@dataclass
+@dataclass(slots=True)
 class vertex_t:  # 4 bytes in total
     v: list  # unsigned char (in python 1 byte int), list of len 3, compressed vertex
     lightnormalindex: int  # unsigned char, index to a normal vector for the lighting
 
 
-@dataclass
+@dataclass(slots=True)
 class frame_t:  # 40 + num_xyz*4 bytes
     scale: vec3_t  # scale values, 3 elements
     translate: vec3_t  # translation vector, 3 elements
     name: str  # frame name, 16 characters aka bytes at most
-    verts: List[vertex_t]  # list of num_xyz vertex_t's
+    verts: SequenceType[vertex_t]  # num_xyz vertex_t's, usually a VertexArray
 
 
-@dataclass
+@dataclass(slots=True)
 class md2_t:
     ident: int              # magic number. must be equal to "IDP2" or 844121161 as int
     version: int            # md2 version. must be equal to 8
@@ -53,72 +62,249 @@ class md2_t:
     ofs_end: int            # offset to end of file
 
 
-@dataclass
+@dataclass(slots=True)
 class triangle_t:  # 12 bytes each
     vertexIndices: List[int]  # short, 3 values
     textureIndices: List[int]  # short, 3 values
 
 
-@dataclass
+@dataclass(slots=True)
 class textureCoordinate_t: # 4 bytes each
     s: int  # short
     t: int  # short
 
 
-@dataclass
+@dataclass(slots=True)
 class glCommandVertex_t:
     s: float
     t: float
     vertexIndex: int
 
 
-@dataclass
+@dataclass(slots=True)
 class glCommand_t:
     mode: str  # string saying GL_TRIANGLE_STRIP or GL_TRIANGLE_FAN
-    vertices: List[glCommandVertex_t]  # all vertices rendered with said mode
+    vertices: SequenceType[glCommandVertex_t]  # all vertices rendered with said mode, usually a GlCommandVertexArray
+
+
+@dataclass
+class glCommandArrays_t:
+    strip: np.ndarray  # bool, (num_commands,), True for GL_TRIANGLE_STRIP, False for GL_TRIANGLE_FAN
+    starts: np.ndarray  # int32, (num_commands,), index of each command's first vertex in vertices
+    counts: np.ndarray  # int32, (num_commands,), number of vertices of each command
+    vertices: np.ndarray  # structured (total vertices,) array of s, t and vertex index, see gl_vertex_dtype
+
+
+class RecordArray(Sequence, abc.ABC):
+    """
+    Base of the columnar containers. Elements are built on access, so changing a returned record doesn't change the
+    container.
+    """
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def _record(self, index):
+        """ builds the record at a non-negative index """
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"index {index} out of range for {len(self)} elements")
+        return self._record(index)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({len(self)} elements)"
+
+
+class VertexArray(RecordArray):
+    """ vertex_t's of one frame """
+    __slots__ = ("values", "normal_indices")
+
+    def __init__(self, values, normal_indices):
+        self.values = values  # (num_xyz, 3) compressed or dequantized positions
+        self.normal_indices = normal_indices  # (num_xyz,) light normal indices
+
+    def __len__(self):
+        return len(self.values)
+
+    def _record(self, index):
+        return vertex_t(self.values[index].tolist(), int(self.normal_indices[index]))
+
+
+class TriangleArray(RecordArray):
+    """ triangle_t's of a model """
+    __slots__ = ("vertex_indices", "texture_indices")
+
+    def __init__(self, vertex_indices, texture_indices):
+        self.vertex_indices = vertex_indices  # (num_tris, 3)
+        self.texture_indices = texture_indices  # (num_tris, 3)
+
+    def __len__(self):
+        return len(self.vertex_indices)
+
+    def _record(self, index):
+        return triangle_t(self.vertex_indices[index].tolist(), self.texture_indices[index].tolist())
+
+
+class TextureCoordinateArray(RecordArray):
+    """ textureCoordinate_t's of a model """
+    __slots__ = ("st",)
+
+    def __init__(self, st):
+        self.st = st  # (num_st, 2)
+
+    def __len__(self):
+        return len(self.st)
+
+    def _record(self, index):
+        return textureCoordinate_t(*self.st[index].tolist())
+
+
+class GlCommandVertexArray(RecordArray):
+    """ glCommandVertex_t's of one gl command """
+    __slots__ = ("vertices",)
+
+    def __init__(self, vertices):
+        self.vertices = vertices  # structured array, see gl_vertex_dtype
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def _record(self, index):
+        return glCommandVertex_t(*self.vertices[index].tolist())
+
+
+class GlCommandArray(RecordArray):
+    """ glCommand_t's of a model """
+    __slots__ = ("gl_command_arrays",)
+
+    def __init__(self, gl_command_arrays):
+        self.gl_command_arrays = gl_command_arrays
+
+    def __len__(self):
+        return len(self.gl_command_arrays.starts)
+
+    def _record(self, index):
+        arrays = self.gl_command_arrays
+        start = int(arrays.starts[index])
+        mode = "GL_TRIANGLE_STRIP" if arrays.strip[index] else "GL_TRIANGLE_FAN"
+        return glCommand_t(mode, GlCommandVertexArray(arrays.vertices[start:start + int(arrays.counts[index])]))
 
 
 @dataclass
 class md2_object:
     header: md2_t
     skin_names: List[str]
-    triangles: List[triangle_t]
-    frames: List[frame_t]
-    texture_coordinates: List[textureCoordinate_t]
-    gl_commands: List[glCommand_t]
+    triangles: SequenceType[triangle_t]  # usually a TriangleArray
+    frames: SequenceType[frame_t]  # list of frames, LazyFrames if lazy
+    texture_coordinates: SequenceType[textureCoordinate_t]  # usually a TextureCoordinateArray
+    gl_commands: SequenceType[glCommand_t]  # usually a GlCommandArray, None if gl commands weren't decoded
+    frame_info: np.ndarray = None  # structured (num_frames,) array of the scale, translate and name of each frame
+    positions: np.ndarray = None  # float32, (num_frames, num_xyz, 3), dequantized vertex positions, LazyFramePositions if lazy
+    normal_indices: np.ndarray = None  # uint8, (num_frames, num_xyz), lightnormalindex of each vertex
+    vertex_indices: np.ndarray = None  # int32, (num_tris, 3), triangle_t.vertexIndices of each triangle
+    texture_indices: np.ndarray = None  # int32, (num_tris, 3), triangle_t.textureIndices of each triangle
+    st: np.ndarray = None  # float32, (num_st, 2), texture coordinates normalized by the skin size
+    gl_command_arrays: glCommandArrays_t = None  # None if gl commands weren't decoded
 
 """
 Functions used to create an MD2 Object
 """
+gl_vertex_dtype = np.dtype([("s", "<f4"), ("t", "<f4"), ("index", "<i4")])
+
+
+def load_gl_command_arrays(gl_command_bytes):
+    """
+    Loads gl_commands which are a list of GL_TRIANGLE_STRIP and GL_TRIANGLE_FAN calls that reduce fps.
+    Only the command headers are walked one by one, all (s, t, index) records are gathered into one structured array.
+    :param gl_command_bytes: bytes belonging to gl_commands lump from md2 file
+    :return: glCommandArrays_t
+    """
+    words = np.frombuffer(gl_command_bytes, dtype="<i4", count=len(gl_command_bytes) // 4)
+    modes = list()
+    header_positions = list()
+    position = 0
+    while position < len(words):  # ends when mode is 0
+        mode = int(words[position])
+        if mode == 0:
+            break
+        modes.append(mode)
+        header_positions.append(position)
+        position += 1 + 3 * abs(mode)
+    modes = np.array(modes, dtype=np.int32)
+    counts = np.abs(modes)
+    starts = np.zeros(len(counts), dtype=np.int32)
+    np.cumsum(counts[:-1], out=starts[1:])
+    # word position of each vertex record: after its command's header, 3 words per record
+    record_positions = np.repeat(np.array(header_positions, dtype=np.int64) + 1 - 3 * starts, counts)
+    record_positions += 3 * np.arange(len(record_positions))
+    records = words[record_positions[:, np.newaxis] + np.arange(3)]
+    vertices = np.ascontiguousarray(records).view(gl_vertex_dtype).reshape(-1)
+    return glCommandArrays_t(modes > 0, starts, counts.astype(np.int32), vertices)
+
+
+def gl_commands_from_arrays(gl_command_arrays):
+    """
+    Builds the gl command dataclass view on top of the decoded arrays
+    :param gl_command_arrays: glCommandArrays_t
+    :return: GlCommandArray
+    """
+    return GlCommandArray(gl_command_arrays)
+
+
 def load_gl_commands(gl_command_bytes):
     """
     Loads gl_commands which are a list of GL_TRIANGLE_STRIP and GL_TRIANGLE_FAN calls that reduce fps
-    Code differs much from original loading code in C
     :param gl_command_bytes: bytes belonging to gl_commands lump from md2 file
-    :return: list of dataclasses storing gl commands
-    """
-    offset = 0
-    gl_commands = list()
-    while True:  # ends when mode is 0
-        (mode,) = struct.unpack("<i", gl_command_bytes[offset:offset+4])
-        num_verts = abs(mode)
-        if mode > 0:
-            mode = "GL_TRIANGLE_STRIP"
-        elif mode == 0:
-            offset += 4
-            break
-        else:
-            mode = "GL_TRIANGLE_FAN"
-        offset += 4
-        gl_vertices = list()
-        for i in range(num_verts):
-            s_and_t = struct.unpack("<ff", gl_command_bytes[offset+12*i:offset+12*i+8])
-            vertex_index = struct.unpack("<i", gl_command_bytes[offset+12*i+8:offset+12*i+12])
-            gl_vertices.append(glCommandVertex_t(*s_and_t, *vertex_index))
-        # print(gl_vertices)
-        offset += 12*num_verts
-        gl_commands.append(glCommand_t(mode, gl_vertices))
-    return gl_commands
+    :return: sequence of dataclasses storing gl commands
+    """
+    return gl_commands_from_arrays(load_gl_command_arrays(gl_command_bytes))
+
+
+def gl_command_triangles(gl_command_arrays):
+    """
+    Converts all strips and fans into triangles at once. Strip triangle k uses the command's vertices (k, k+1, k+2),
+    with the first two swapped for odd k to keep the winding, fan triangle k uses (0, k+1, k+2).
+    :param gl_command_arrays: glCommandArrays_t
+    :return: tuple of int32 vertex indices (num_triangles, 3) and float32 per corner UVs (num_triangles, 3, 2)
+    """
+    triangle_counts = np.maximum(gl_command_arrays.counts - 2, 0)
+    command = np.repeat(np.arange(len(triangle_counts)), triangle_counts)
+    first_triangle = np.cumsum(triangle_counts) - triangle_counts
+    k = np.arange(len(command)) - first_triangle[command]
+
+    corners = k[:, np.newaxis] + np.arange(3)
+    strip = gl_command_arrays.strip[command]
+    odd = strip & (k % 2 == 1)
+    corners[odd, :2] = corners[odd, 1::-1]
+    corners[~strip, 0] = 0
+    corners += gl_command_arrays.starts[command][:, np.newaxis]
+
+    corner_vertices = gl_command_arrays.vertices[corners]
+    uvs = np.stack((corner_vertices["s"], corner_vertices["t"]), axis=-1)
+    return corner_vertices["index"].astype(np.int32), uvs.astype(np.float32)
+
+
+def load_triangle_arrays(triangle_bytes, header):
+    """
+    Decodes the whole triangles lump at once
+    :param triangle_bytes: bytes from md2 file belonging to triangles lump
+    :param header: dataclass containing header information
+    :return: tuple of int32 vertex indices and int32 texture indices, both of shape (num_tris, 3)
+    """
+    indices = np.frombuffer(triangle_bytes, dtype="<i2", count=header.num_tris * 6).reshape(header.num_tris, 2, 3)
+    return indices[:, 0].astype(np.int32), indices[:, 1].astype(np.int32)
 
 
 def load_triangles(triangle_bytes, header):
@@ -126,14 +312,152 @@ def load_triangles(triangle_bytes, header):
     Creates basic list of triangle dataclasses which contain indices to vertices
     :param triangle_bytes: bytes from md2 file belonging to triangles lump
     :param header: dataclass containing header information
-    :return: list of triangles
+    :return: sequence of triangles
+    """
+    return TriangleArray(*load_triangle_arrays(triangle_bytes, header))
+
+
+PARSER_VERSION = 2  # increase whenever the decoded representation changes, invalidates cached models
+
+# per frame values besides the vertices
+frame_info_dtype = np.dtype([("scale", "<f4", (3,)), ("translate", "<f4", (3,)), ("name", "S16")])
+
+
+def frame_dtype(num_xyz):
+    """
+    Structured numpy dtype matching one frame_t as stored in the frames lump
+    :param num_xyz: number of vertices per frame
+    :return: numpy dtype of 40 + num_xyz*4 bytes
+    """
+    return np.dtype([
+        ("scale", "<f4", (3,)),
+        ("translate", "<f4", (3,)),
+        ("name", "S16"),
+        ("verts", "u1", (num_xyz, 4)),  # compressed x, y, z and lightnormalindex
+    ])
+
+
+def load_frame_arrays(frames_bytes, header):
+    """
+    Decodes the whole frames lump at once and dequantizes all vertices by broadcasting scale and translate
+    :param frames_bytes: bytes from md2 file belonging to frames lump
+    :param header: header dataclass
+    :return: tuple of the raw structured frame array (see frame_dtype), float32 vertex positions
+             (num_frames, num_xyz, 3) and uint8 light normal indices (num_frames, num_xyz)
+    """
+    raw_frames = np.frombuffer(frames_bytes, dtype=frame_dtype(header.num_xyz), count=header.num_frames)
+    return (raw_frames, *dequantize_frames(raw_frames))
+
+
+def dequantize_frames(raw_frames):
+    """
+    :param raw_frames: structured frame array (see frame_dtype)
+    :return: tuple of float32 vertex positions (num_frames, num_xyz, 3) and uint8 light normal indices
+             (num_frames, num_xyz)
     """
-    triangles = list()
-    for i in range(header.num_tris):
-        triangle = triangle_t(list(struct.unpack("<hhh", triangle_bytes[12*i:12*i+6])), list(struct.unpack("<hhh", triangle_bytes[12*i+6:12*i+12])))
-        # print(triangle)
-        triangles.append(triangle)
-    return triangles
+    compressed = raw_frames["verts"]
+    positions = compressed[:, :, :3] * raw_frames["scale"][:, np.newaxis, :] + raw_frames["translate"][:, np.newaxis, :]
+    normal_indices = np.ascontiguousarray(compressed[:, :, 3])
+    return positions.astype(np.float32, copy=False), normal_indices
+
+
+def frame_from_arrays(info, vertex_values, normal_indices):
+    """
+    Builds one frame dataclass on top of decoded frame arrays
+    :param info: element of a structured array with scale, translate and name fields
+    :param vertex_values: (num_xyz, 3) array of compressed or dequantized vertex positions
+    :param normal_indices: (num_xyz,) array of light normal indices
+    :return: frame dataclass object
+    """
+    scale = vec3_t(*info["scale"].tolist())
+    translate = vec3_t(*info["translate"].tolist())
+    name = info["name"].decode("ascii", "ignore")
+    return frame_t(scale, translate, name, VertexArray(vertex_values, normal_indices))
+
+
+def frames_from_arrays(raw_frames, vertex_values, normal_indices):
+    """
+    Builds the list of frame dataclasses on top of decoded frame arrays, without copying the vertices
+    :param raw_frames: structured array with scale, translate and name fields, e.g. from load_frame_arrays
+    :param vertex_values: (num_frames, num_xyz, 3) array of compressed or dequantized vertex positions
+    :param normal_indices: (num_frames, num_xyz) array of light normal indices
+    :return: list of frame dataclass objects
+    """
+    return [frame_from_arrays(raw_frames[i], vertex_values[i], normal_indices[i]) for i in range(len(raw_frames))]
+
+
+DEFAULT_FRAME_CACHE_SIZE = 32  # number of decoded frames kept by LazyFramePositions
+
+
+class LazyFramePositions:
+    """
+    Stands in for the (num_frames, num_xyz, 3) positions array of lazily loaded models. A frame is only dequantized
+    when it is indexed, decoded frames are kept in a bounded LRU cache. np.asarray() decodes all frames at once.
+    """
+
+    def __init__(self, raw_frames, cache_size=DEFAULT_FRAME_CACHE_SIZE):
+        """
+        :param raw_frames: structured frame array (see frame_dtype), usually a zero-copy view of a memory-mapped file
+        :param cache_size: maximum number of decoded frames kept
+        """
+        self.raw_frames = raw_frames
+        self.cache_size = cache_size
+        self.shape = (len(raw_frames), raw_frames.dtype["verts"].shape[0], 3)
+        self.dtype = np.dtype(np.float32)
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return np.stack([self[i] for i in range(*index.indices(len(self)))])
+        index = operator.index(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"frame index {index} out of range for {len(self)} frames")
+        positions = self._cache.get(index)
+        if positions is not None:
+            self._cache.move_to_end(index)
+            return positions
+        frame = self.raw_frames[index]
+        positions = (frame["verts"][:, :3] * frame["scale"] + frame["translate"]).astype(np.float32)
+        positions.flags.writeable = False
+        self._cache[index] = positions
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return positions
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None, copy=None):
+        compressed = self.raw_frames["verts"]
+        positions = compressed[:, :, :3] * self.raw_frames["scale"][:, np.newaxis, :] \
+            + self.raw_frames["translate"][:, np.newaxis, :]
+        return positions.astype(dtype or np.float32, copy=False)
+
+
+class LazyFrames(Sequence):
+    """
+    List of frame dataclasses of lazily loaded models, each built from LazyFramePositions when it is indexed
+    """
+
+    def __init__(self, frame_info, positions, normal_indices):
+        self.frame_info = frame_info
+        self.positions = positions
+        self.normal_indices = normal_indices
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        positions = self.positions[index]  # validates the index
+        return frame_from_arrays(self.frame_info[index], positions, self.normal_indices[index])
 
 
 def load_frames(frames_bytes, header):
@@ -141,27 +465,10 @@ def load_frames(frames_bytes, header):
     Loads frames
     :param frames_bytes: bytes from md2 file belonging to frames lump
     :param header: header dataclass
-    :return: list of frame dataclass objects
+    :return: list of frame dataclass objects holding the compressed vertices
     """
-    # # check if header.ofs_glcmds - header.ofs_frames == header.num_frames*(40+4*header.num_xyz) # #
-    # print("len", len(frames_bytes))
-    # print("frames", header.num_frames)
-    # print("check", header.num_frames*(40+4*header.num_xyz))
-
-    frames = list()
-    for current_frame in range(header.num_frames):
-        scale = vec3_t(*struct.unpack("<fff", frames_bytes[(40+4*header.num_xyz)*current_frame:(40+4*header.num_xyz)*current_frame+12]))
-        translate = vec3_t(*struct.unpack("<fff", frames_bytes[(40+4*header.num_xyz)*current_frame+12:(40+4*header.num_xyz)*current_frame+24]))
-        name = frames_bytes[(40+4*header.num_xyz)*current_frame+24:(40+4*header.num_xyz)*current_frame+40].decode("ascii", "ignore")
-        verts = list()
-        for v in range(header.num_xyz):
-            # print(v)
-            verts.append(vertex_t(list(struct.unpack("<BBB", frames_bytes[(40+4*header.num_xyz)*current_frame+40+v*4:(40+4*header.num_xyz)*current_frame+40+v*4+3])), *struct.unpack("<B", frames_bytes[(40+4*header.num_xyz)*current_frame+43+v*4:(40+4*header.num_xyz)*current_frame+44+v*4])))  # list() only for matching expected type
-        # print(scale, translate, name, verts)
-        frame = frame_t(scale, translate, name, verts)
-        # print(frame)
-        frames.append(frame)
-    return frames
+    raw_frames, _, normal_indices = load_frame_arrays(frames_bytes, header)
+    return frames_from_arrays(raw_frames, raw_frames["verts"][:, :, :3], normal_indices)
 
 
 def load_header(file_bytes):
@@ -177,53 +484,158 @@ def load_header(file_bytes):
     if not header.ident == 844121161 or not header.version == 8:
         raise ValueError(
             f"Error: File type is not MD2. Ident or version not matching. "
-            f'Ident: {file_bytes[:4].decode("ascii", "ignore")} should be "IDP2". '
+            f'Ident: {bytes(file_bytes[:4]).decode("ascii", "ignore")} should be "IDP2". '
             f"Version: {header.version} should be 8"
         )
     return header
 
 
+def load_texture_coordinate_array(texture_coordinate_bytes, header):
+    """
+    Decodes the whole UV (in Q2 term ST) lump at once
+    :param texture_coordinate_bytes: bytes from md2 file belonging to st lump
+    :param header: header dataclass
+    :return: int16 array of shape (num_st, 2) holding the s and t coordinates in pixels
+    """
+    return np.frombuffer(texture_coordinate_bytes, dtype="<i2", count=header.num_st * 2).reshape(header.num_st, 2)
+
+
 def load_texture_coordinates(texture_coordinate_bytes, header):
     """
     Loads UV (in Q2 term ST) coordinates
     :param texture_coordinate_bytes:
     :param header:
-    :return: list of texture coordinate dataclass objects
+    :return: sequence of texture coordinate dataclass objects
+    """
+    return TextureCoordinateArray(load_texture_coordinate_array(texture_coordinate_bytes, header))
+
+
+def loop_uvs(st, texture_indices, flip_t=True):
+    """
+    Builds the UV coordinate of every triangle corner in the order Blender stores mesh loops, given that the triangles
+    are added in file order
+    :param st: (num_st, 2) array of normalized texture coordinates
+    :param texture_indices: (num_tris, 3) array of texture coordinate indices per triangle corner
+    :param flip_t: blender flips images upside down when loading, so v = 1 - t for blender imported images
+    :return: flat float32 array of num_tris * 3 (u, v) pairs for uv_layer.data.foreach_set("uv", ...)
     """
-    texture_coordinates = list()
-    for i in range(header.num_st):
-        texture_coordinates.append(textureCoordinate_t(*struct.unpack("<hh", texture_coordinate_bytes[4*i:4*i+4])))
-    return texture_coordinates
+    uvs = st[texture_indices.ravel()].astype(np.float32)
+    if flip_t:
+        uvs[:, 1] = 1 - uvs[:, 1]
+    return uvs.ravel()
 
 
-def load_file(path):
+def load_file(path, decode_gl_commands=True, lazy=False, report=None):
     """
     Master function returning one dataclass object containing all the MD2 information
     :param path:
+    :param decode_gl_commands: see load_buffer
+    :param lazy: memory-map the file and decode frames on demand, see load_buffer
+    :param report: optional ImportReport collecting the time of each stage
     :return:
     """
-    with open(path, "rb") as f:  # bsps are binary files
-        byte_list = f.read()  # stores all bytes in bytes1 variable (named like that to not interfere with builtin names
-    header = load_header(byte_list)
-    skin_names = [byte_list[header.ofs_skins + 64 * x:header.ofs_skins + 64 * x + 64].decode("ascii", "ignore") for x in range(header.num_skins)]
-    triangles = load_triangles(byte_list[header.ofs_tris:header.ofs_frames], header)
-    frames = load_frames(byte_list[header.ofs_frames:header.ofs_glcmds], header)
-    texture_coordinates = load_texture_coordinates(byte_list[header.ofs_st:header.ofs_tris], header)
-    gl_commands = load_gl_commands(byte_list[header.ofs_glcmds:header.ofs_end])
-    # print(header)
-    # print(skin_names)
-    # print(triangles)
-    # print(frames)
-    # print(texture_coordinates)
-    for i in range(len(texture_coordinates)):
-        texture_coordinates[i].s = texture_coordinates[i].s/header.skinwidth
-        texture_coordinates[i].t = texture_coordinates[i].t / header.skinheight
-    # print(texture_coordinates)
-    # print(header.num_xyz)
-    for i_frame in range(len(frames)):
-        for i_vert in range((header.num_xyz)):
-            frames[i_frame].verts[i_vert].v[0] = frames[i_frame].verts[i_vert].v[0]*frames[i_frame].scale.x+frames[i_frame].translate.x
-            frames[i_frame].verts[i_vert].v[1] = frames[i_frame].verts[i_vert].v[1] * frames[i_frame].scale.y + frames[i_frame].translate.y
-            frames[i_frame].verts[i_vert].v[2] = frames[i_frame].verts[i_vert].v[2] * frames[i_frame].scale.z + frames[i_frame].translate.z
-    model = md2_object(header, skin_names, triangles, frames, texture_coordinates, gl_commands)
-    return model
+    report = report if report is not None else ImportReport()
+    with report.stage("read"), open(path, "rb") as f:  # bsps are binary files
+        if lazy:
+            # the mapping stays open as long as the model's frame arrays reference it
+            byte_list = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            byte_list = f.read()  # stores all bytes in bytes1 variable (named like that to not interfere with builtin names
+    return load_buffer(byte_list, decode_gl_commands, lazy, report=report)
+
+
+def load_buffer(byte_list, decode_gl_commands=True, lazy=False, frame_cache_size=DEFAULT_FRAME_CACHE_SIZE, report=None):
+    """
+    Creates the MD2 dataclass object from an in-memory .md2 file
+    :param byte_list: bytes-like object like bytes, an mmap or a memoryview slice of a .pak archive. Not copied.
+    :param decode_gl_commands: False skips the gl commands lump, leaving gl_commands and gl_command_arrays None
+    :param lazy: only decode header, skins, triangles, UVs and gl commands up front. positions then is a
+                 LazyFramePositions and frames a LazyFrames, both referencing byte_list and decoding frames on demand.
+    :param frame_cache_size: maximum number of decoded frames kept by lazily loaded models
+    :param report: optional ImportReport collecting the time of each stage and the model's counts
+    :return: md2_object
+    """
+    report = report if report is not None else ImportReport()
+    byte_list = memoryview(byte_list)
+    with report.stage("header"):
+        header = load_header(byte_list)
+    with report.stage("skins"):
+        skin_names = [bytes(byte_list[header.ofs_skins + 64 * x:header.ofs_skins + 64 * x + 64]).decode("ascii", "ignore") for x in range(header.num_skins)]
+    with report.stage("triangles"):
+        vertex_indices, texture_indices = load_triangle_arrays(byte_list[header.ofs_tris:header.ofs_frames], header)
+    with report.stage("frames"):
+        raw_frames = np.frombuffer(byte_list[header.ofs_frames:header.ofs_glcmds], dtype=frame_dtype(header.num_xyz),
+                                   count=header.num_frames)
+        frame_info = np.empty(header.num_frames, dtype=frame_info_dtype)
+        for field in frame_info_dtype.names:
+            frame_info[field] = raw_frames[field]
+    with report.stage("dequantize"):
+        if lazy:
+            positions = LazyFramePositions(raw_frames, frame_cache_size)
+            normal_indices = raw_frames["verts"][:, :, 3]  # strided view, nothing is decoded
+        else:
+            positions, normal_indices = dequantize_frames(raw_frames)
+    with report.stage("uvs"):
+        st = load_texture_coordinate_array(byte_list[header.ofs_st:header.ofs_tris], header)
+        st = st / np.array([header.skinwidth, header.skinheight], dtype=np.float32)
+    gl_command_arrays = None
+    if decode_gl_commands:
+        with report.stage("gl_commands"):
+            gl_command_arrays = load_gl_command_arrays(byte_list[header.ofs_glcmds:header.ofs_end])
+            report.count("gl_commands", len(gl_command_arrays.starts))
+    report.count("vertices", header.num_xyz)
+    report.count("frames", header.num_frames)
+    report.count("triangles", header.num_tris)
+    with report.stage("views"):
+        frames = LazyFrames(frame_info, positions, normal_indices) if lazy else None
+        return model_from_arrays(header, skin_names, frame_info, positions, normal_indices, vertex_indices,
+                                 texture_indices, st, gl_command_arrays, frames)
+
+
+def model_from_arrays(header, skin_names, frame_info, positions, normal_indices, vertex_indices, texture_indices, st,
+                      gl_command_arrays, frames=None):
+    """
+    Creates the MD2 dataclass object with its dataclass views from decoded arrays, e.g. ones loaded from a cache
+    :param frames: optional frame dataclass view, built from the frame arrays if not given
+    :return: md2_object
+    """
+    triangles = TriangleArray(vertex_indices, texture_indices)
+    if frames is None:
+        frames = frames_from_arrays(frame_info, positions, normal_indices)
+    texture_coordinates = TextureCoordinateArray(st)
+    gl_commands = gl_commands_from_arrays(gl_command_arrays) if gl_command_arrays is not None else None
+    return md2_object(header, skin_names, triangles, frames, texture_coordinates, gl_commands,
+                      frame_info, positions, normal_indices, vertex_indices, texture_indices, st, gl_command_arrays)
+
+
+def model_arrays(model):
+    """
+    The plain values and arrays of a model without its dataclass views, e.g. to send it to another process
+    :param model: md2_object, lazily loaded models are decoded
+    :return: dict of the keyword arguments of model_from_arrays rebuilding the model
+    """
+    return {"header": model.header, "skin_names": model.skin_names, "frame_info": model.frame_info,
+            "positions": np.asarray(model.positions), "normal_indices": np.ascontiguousarray(model.normal_indices),
+            "vertex_indices": model.vertex_indices, "texture_indices": model.texture_indices, "st": model.st,
+            "gl_command_arrays": model.gl_command_arrays}
+
+
+def compressed_frames(model, indices=slice(None)):
+    """
+    The vertices of frames compressed like in the file, one byte per coordinate with per frame scale and translate
+    :param model: md2_object. The frames of lazily loaded models are read without decoding them, the dequantized
+                  positions of other models are compressed again with their frames' scale and translate, which gives
+                  back the bytes of the file on every axis with a non-zero scale.
+    :param indices: integer array or slice of the frames to return
+    :return: tuple of the uint8 vertices (num_frames, num_xyz, 3), extra columns like the light normal index may
+             follow, and the float32 scale (num_frames, 3) and translate (num_frames, 3) of the frames
+    """
+    if isinstance(model.positions, LazyFramePositions):
+        raw_frames = model.positions.raw_frames[indices]
+        return raw_frames["verts"], raw_frames["scale"], raw_frames["translate"]
+    scale = model.frame_info["scale"][indices]
+    translate = model.frame_info["translate"][indices]
+    positions = np.asarray(model.positions)[indices]
+    steps = np.where(scale > 0, scale, np.float32(1))[:, np.newaxis]
+    compressed = np.rint((positions - translate[:, np.newaxis]) / steps)
+    return np.clip(compressed, 0, 255).astype(np.uint8), scale, translate
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+import re
+from typing import List
+"""
+Groups MD2 frames into named animations by their frame names, e.g. stand01..stand40 and run1..run6
+"""
+
+# frame name = animation name followed by the frame number
+frame_name_pattern = re.compile(r"^(.*?)(\d*)$")
+
+
+@dataclass(slots=True)
+class animation_t:
+    name: str
+    frames: List[int]  # indices of the animation's MD2 frames
+
+
+def clean_frame_name(name):
+    """
+    :param name: frame name as stored in the MD2, str or bytes of 16 characters at most
+    :return: name up to the first null byte
+    """
+    if isinstance(name, bytes):
+        name = name.decode("ascii", "ignore")
+    return name.split("\x00")[0].strip()
+
+
+def run_animation_names(name, numbers):
+    """
+    Names the animations of a run of consecutive frames sharing the name before their frame numbers. Numbers of more
+    than two digits are split into an animation number and the frame number, following the Quake 2 convention of
+    death101..death106, death201..death206, but only if the leading digits vary and the numbers don't simply count
+    up, so zero-padded names like run001..run006 or frame000..frame149 stay one animation.
+    :param name: frame name without its number
+    :param numbers: frame number of each frame of the run as str of digits, may be empty
+    :return: list of the animation name of each frame
+    """
+    name = name or "frames"
+    if not all(len(x) > 2 for x in numbers) or len({x[:-2] for x in numbers}) < 2:
+        return [name] * len(numbers)
+    values = [int(x) for x in numbers]
+    if all(b == a + 1 for a, b in zip(values, values[1:])):
+        return [name] * len(numbers)
+    return [name + x[:-2] for x in numbers]
+
+
+def group_animations(frame_names):
+    """
+    Groups consecutive frames with the same animation name. Names of animations appearing more than once get a suffix.
+    :param frame_names: frame names in file order
+    :return: list of animation_t in file order
+    """
+    # runs of consecutive frames with the same name before the frame number
+    runs = list()
+    for frame_name in frame_names:
+        name, number = frame_name_pattern.match(clean_frame_name(frame_name)).groups()
+        if runs and runs[-1][0] == name:
+            runs[-1][1].append(number)
+        else:
+            runs.append((name, [number]))
+    animations = list()
+    name_counts = dict()
+    last_name = None
+    index = 0
+    for run_name, numbers in runs:
+        for name in run_animation_names(run_name, numbers):
+            if name == last_name:
+                animations[-1].frames.append(index)
+            else:
+                count = name_counts.get(name, 0)
+                name_counts[name] = count + 1
+                animations.append(animation_t(name if count == 0 else f"{name}.{count:03}", [index]))
+                last_name = name
+            index += 1
+    return animations
+
+
+def select_animations(animations, names=None, frame_range=None):
+    """
+    Restricts animations to the ones with the given names and/or to a range of MD2 frames
+    :param animations: list of animation_t
+    :param names: optional collection of animation names to keep, case-insensitive
+    :param frame_range: optional inclusive (first, last) MD2 frame indices to keep
+    :return: list of animation_t, animations without any selected frame are dropped
+    """
+    wanted = {x.lower() for x in names} if names else None
+    selected = list()
+    for animation in animations:
+        if wanted is not None and animation.name.lower() not in wanted:
+            continue
+        frames = animation.frames
+        if frame_range is not None:
+            frames = [x for x in frames if frame_range[0] <= x <= frame_range[1]]
+        if frames:
+            selected.append(animation_t(animation.name, frames))
+    return selected
@@ -0,0 +1,184 @@
+import numpy as np
+"""
+Quake 2's table of the 162 precomputed vertex normals (anorms.h). MD2 vertices store an index into it
+as their light normal index.
+"""
+
+ANORMS = np.array([
+    (-0.525731, 0.000000, 0.850651),
+    (-0.442863, 0.238856, 0.864188),
+    (-0.295242, 0.000000, 0.955423),
+    (-0.309017, 0.500000, 0.809017),
+    (-0.162460, 0.262866, 0.951056),
+    (0.000000, 0.000000, 1.000000),
+    (0.000000, 0.850651, 0.525731),
+    (-0.147621, 0.716567, 0.681718),
+    (0.147621, 0.716567, 0.681718),
+    (0.000000, 0.525731, 0.850651),
+    (0.309017, 0.500000, 0.809017),
+    (0.525731, 0.000000, 0.850651),
+    (0.295242, 0.000000, 0.955423),
+    (0.442863, 0.238856, 0.864188),
+    (0.162460, 0.262866, 0.951056),
+    (-0.681718, 0.147621, 0.716567),
+    (-0.809017, 0.309017, 0.500000),
+    (-0.587785, 0.425325, 0.688191),
+    (-0.850651, 0.525731, 0.000000),
+    (-0.864188, 0.442863, 0.238856),
+    (-0.716567, 0.681718, 0.147621),
+    (-0.688191, 0.587785, 0.425325),
+    (-0.500000, 0.809017, 0.309017),
+    (-0.238856, 0.864188, 0.442863),
+    (-0.425325, 0.688191, 0.587785),
+    (-0.716567, 0.681718, -0.147621),
+    (-0.500000, 0.809017, -0.309017),
+    (-0.525731, 0.850651, 0.000000),
+    (0.000000, 0.850651, -0.525731),
+    (-0.238856, 0.864188, -0.442863),
+    (0.000000, 0.955423, -0.295242),
+    (-0.262866, 0.951056, -0.162460),
+    (0.000000, 1.000000, 0.000000),
+    (0.000000, 0.955423, 0.295242),
+    (-0.262866, 0.951056, 0.162460),
+    (0.238856, 0.864188, 0.442863),
+    (0.262866, 0.951056, 0.162460),
+    (0.500000, 0.809017, 0.309017),
+    (0.238856, 0.864188, -0.442863),
+    (0.262866, 0.951056, -0.162460),
+    (0.500000, 0.809017, -0.309017),
+    (0.850651, 0.525731, 0.000000),
+    (0.716567, 0.681718, 0.147621),
+    (0.716567, 0.681718, -0.147621),
+    (0.525731, 0.850651, 0.000000),
+    (0.425325, 0.688191, 0.587785),
+    (0.864188, 0.442863, 0.238856),
+    (0.688191, 0.587785, 0.425325),
+    (0.809017, 0.309017, 0.500000),
+    (0.681718, 0.147621, 0.716567),
+    (0.587785, 0.425325, 0.688191),
+    (0.955423, 0.295242, 0.000000),
+    (1.000000, 0.000000, 0.000000),
+    (0.951056, 0.162460, 0.262866),
+    (0.850651, -0.525731, 0.000000),
+    (0.955423, -0.295242, 0.000000),
+    (0.864188, -0.442863, 0.238856),
+    (0.951056, -0.162460, 0.262866),
+    (0.809017, -0.309017, 0.500000),
+    (0.681718, -0.147621, 0.716567),
+    (0.850651, 0.000000, 0.525731),
+    (0.864188, 0.442863, -0.238856),
+    (0.809017, 0.309017, -0.500000),
+    (0.951056, 0.162460, -0.262866),
+    (0.525731, 0.000000, -0.850651),
+    (0.681718, 0.147621, -0.716567),
+    (0.681718, -0.147621, -0.716567),
+    (0.850651, 0.000000, -0.525731),
+    (0.809017, -0.309017, -0.500000),
+    (0.864188, -0.442863, -0.238856),
+    (0.951056, -0.162460, -0.262866),
+    (0.147621, 0.716567, -0.681718),
+    (0.309017, 0.500000, -0.809017),
+    (0.425325, 0.688191, -0.587785),
+    (0.442863, 0.238856, -0.864188),
+    (0.587785, 0.425325, -0.688191),
+    (0.688191, 0.587785, -0.425325),
+    (-0.147621, 0.716567, -0.681718),
+    (-0.309017, 0.500000, -0.809017),
+    (0.000000, 0.525731, -0.850651),
+    (-0.525731, 0.000000, -0.850651),
+    (-0.442863, 0.238856, -0.864188),
+    (-0.295242, 0.000000, -0.955423),
+    (-0.162460, 0.262866, -0.951056),
+    (0.000000, 0.000000, -1.000000),
+    (0.295242, 0.000000, -0.955423),
+    (0.162460, 0.262866, -0.951056),
+    (-0.442863, -0.238856, -0.864188),
+    (-0.309017, -0.500000, -0.809017),
+    (-0.162460, -0.262866, -0.951056),
+    (0.000000, -0.850651, -0.525731),
+    (-0.147621, -0.716567, -0.681718),
+    (0.147621, -0.716567, -0.681718),
+    (0.000000, -0.525731, -0.850651),
+    (0.309017, -0.500000, -0.809017),
+    (0.442863, -0.238856, -0.864188),
+    (0.162460, -0.262866, -0.951056),
+    (0.238856, -0.864188, -0.442863),
+    (0.500000, -0.809017, -0.309017),
+    (0.425325, -0.688191, -0.587785),
+    (0.716567, -0.681718, -0.147621),
+    (0.688191, -0.587785, -0.425325),
+    (0.587785, -0.425325, -0.688191),
+    (0.000000, -0.955423, -0.295242),
+    (0.000000, -1.000000, 0.000000),
+    (0.262866, -0.951056, -0.162460),
+    (0.000000, -0.850651, 0.525731),
+    (0.000000, -0.955423, 0.295242),
+    (0.238856, -0.864188, 0.442863),
+    (0.262866, -0.951056, 0.162460),
+    (0.500000, -0.809017, 0.309017),
+    (0.716567, -0.681718, 0.147621),
+    (0.525731, -0.850651, 0.000000),
+    (-0.238856, -0.864188, -0.442863),
+    (-0.500000, -0.809017, -0.309017),
+    (-0.262866, -0.951056, -0.162460),
+    (-0.850651, -0.525731, 0.000000),
+    (-0.716567, -0.681718, -0.147621),
+    (-0.716567, -0.681718, 0.147621),
+    (-0.525731, -0.850651, 0.000000),
+    (-0.500000, -0.809017, 0.309017),
+    (-0.238856, -0.864188, 0.442863),
+    (-0.262866, -0.951056, 0.162460),
+    (-0.864188, -0.442863, 0.238856),
+    (-0.809017, -0.309017, 0.500000),
+    (-0.688191, -0.587785, 0.425325),
+    (-0.681718, -0.147621, 0.716567),
+    (-0.442863, -0.238856, 0.864188),
+    (-0.587785, -0.425325, 0.688191),
+    (-0.309017, -0.500000, 0.809017),
+    (-0.147621, -0.716567, 0.681718),
+    (-0.425325, -0.688191, 0.587785),
+    (-0.162460, -0.262866, 0.951056),
+    (0.442863, -0.238856, 0.864188),
+    (0.162460, -0.262866, 0.951056),
+    (0.309017, -0.500000, 0.809017),
+    (0.147621, -0.716567, 0.681718),
+    (0.000000, -0.525731, 0.850651),
+    (0.425325, -0.688191, 0.587785),
+    (0.587785, -0.425325, 0.688191),
+    (0.688191, -0.587785, 0.425325),
+    (-0.955423, 0.295242, 0.000000),
+    (-0.951056, 0.162460, 0.262866),
+    (-1.000000, 0.000000, 0.000000),
+    (-0.850651, 0.000000, 0.525731),
+    (-0.955423, -0.295242, 0.000000),
+    (-0.951056, -0.162460, 0.262866),
+    (-0.864188, 0.442863, -0.238856),
+    (-0.951056, 0.162460, -0.262866),
+    (-0.809017, 0.309017, -0.500000),
+    (-0.864188, -0.442863, -0.238856),
+    (-0.951056, -0.162460, -0.262866),
+    (-0.809017, -0.309017, -0.500000),
+    (-0.681718, 0.147621, -0.716567),
+    (-0.681718, -0.147621, -0.716567),
+    (-0.850651, 0.000000, -0.525731),
+    (-0.688191, 0.587785, -0.425325),
+    (-0.587785, 0.425325, -0.688191),
+    (-0.425325, 0.688191, -0.587785),
+    (-0.425325, -0.688191, -0.587785),
+    (-0.587785, -0.425325, -0.688191),
+    (-0.688191, -0.587785, -0.425325),
+], dtype=np.float32)
+
+NUM_NORMALS = len(ANORMS)
+
+
+def vertex_normals(normal_indices):
+    """
+    :param normal_indices: uint8 light normal indices of any shape, e.g. (num_xyz,) of one frame
+    :return: float32 unit normals of shape normal_indices.shape + (3,). Invalid indices give zero vectors
+    """
+    normal_indices = np.asarray(normal_indices)
+    normals = np.zeros(normal_indices.shape + (3,), dtype=np.float32)
+    valid = normal_indices < NUM_NORMALS
+    normals[valid] = ANORMS[normal_indices[valid]]
+    return normals
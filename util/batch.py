@@ -0,0 +1,122 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+import multiprocessing
+from typing import List, Optional
+from . import MD2
+"""
+Parses many MD2 files on a process pool. Only the pure Python parsing runs in the workers, creating blender objects
+stays on the main thread.
+"""
+
+
+@dataclass
+class parse_result_t:
+    path: str
+    model: Optional[MD2.md2_object] = None  # None if parsing failed
+    error: Optional[str] = None  # error message if parsing failed
+
+
+def find_md2_files(directory, recursive=True):
+    """
+    Lists all .md2 files in a directory
+    :param directory: directory to search
+    :param recursive: whether subdirectories are searched as well
+    :return: sorted list of paths
+    """
+    paths = list()
+    for root, dirs, files in os.walk(directory):
+        paths.extend(os.path.join(root, x) for x in files if x.lower().endswith(".md2"))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def parse_file(path, lazy=False):
+    """
+    Parses one file, turning any error into a failure entry so one bad model doesn't stop a batch
+    :param path: path to the .md2 file
+    :param lazy: memory-map the file and decode frames on demand, see MD2.load_file
+    :return: parse_result_t
+    """
+    try:
+        return parse_result_t(path, MD2.load_file(path, lazy=lazy))
+    except Exception as e:
+        return parse_result_t(path, error=f"{type(e).__name__}: {e}")
+
+
+def map_processes(function, items, max_workers=None):
+    """
+    Calls function for every item on a process pool, falling back to the calling thread if the pool can't be started
+    :param function: module level function, its arguments and results are pickled
+    :param items: list of arguments
+    :param max_workers: number of worker processes, None for one per CPU core, 1 to run on the calling thread
+    :return: list of the results in the order of items
+    """
+    if max_workers == 1 or len(items) < 2:
+        return [function(x) for x in items]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_mp_context()) as executor:
+            chunksize = max(1, len(items) // (4 * (max_workers or os.cpu_count() or 1)))
+            return list(executor.map(function, items, chunksize=chunksize))
+    except (BrokenProcessPool, OSError):
+        return [function(x) for x in items]
+
+
+def _mp_context():
+    # blender can't be re-executed as a plain python interpreter, so spawned workers couldn't import the add-on.
+    # fork is used where available, elsewhere parse_files falls back to parsing sequentially if the pool breaks.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def _parse_arrays(path):
+    # runs in the workers: only the model's arrays are sent back, the parent rebuilds the dataclass views
+    result = parse_file(path)
+    if result.model is None:
+        return path, None, result.error
+    return path, MD2.model_arrays(result.model), None
+
+
+def _parse_files(paths, max_workers, lazy):
+    # lazily parsed models reference their memory-mapped file and can't be sent back from a worker
+    if lazy or max_workers == 1 or len(paths) < 2:
+        return [parse_file(x, lazy) for x in paths]
+    return [parse_result_t(path, MD2.model_from_arrays(**arrays) if arrays is not None else None, error)
+            for path, arrays, error in map_processes(_parse_arrays, paths, max_workers)]
+
+
+def parse_files(paths, max_workers=None, cache=None, lazy=False) -> List[parse_result_t]:
+    """
+    Parses files on a process pool
+    :param paths: paths to .md2 files
+    :param max_workers: number of worker processes, None for one per CPU core, 1 to parse on the calling thread
+    :param cache: optional MD2Cache, hits are loaded on the calling thread and only misses are parsed by the pool
+    :param lazy: parse on the calling thread without decoding the frames, see MD2.load_file. max_workers is ignored.
+                 Misses stored in the cache are decoded by it.
+    :return: one parse_result_t per path, in the order of paths
+    """
+    paths = list(paths)
+    if cache is None:
+        return _parse_files(paths, max_workers, lazy)
+
+    results = dict()
+    keys = dict()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                keys[path] = cache.key(f.read())
+        except OSError as e:
+            results[path] = parse_result_t(path, error=f"{type(e).__name__}: {e}")
+            continue
+        model = cache.get(keys[path])
+        if model is not None:
+            results[path] = parse_result_t(path, model)
+    misses = [x for x in paths if x not in results]
+    for result in _parse_files(misses, max_workers, lazy):
+        results[result.path] = result
+        if result.model is not None:
+            cache.put(keys[result.path], result.model)
+    return [results[x] for x in paths]
@@ -0,0 +1,224 @@
+import argparse
+from dataclasses import asdict, dataclass, field
+import json
+import mmap
+import os
+import sys
+import time
+from typing import List, Optional
+import numpy as np
+from . import MD2
+from .animations import clean_frame_name, group_animations
+from .batch import find_md2_files
+from .md2_cache import default_cache_dir
+"""
+Header-only probing of MD2 files and a persistent catalog of a model library. Probing reads the header, the skin
+names and the 16 byte name of each frame without decoding any vertices, so whole game directories are indexed in
+seconds. Run as
+    python -m util.catalog scan quake2/baseq2 --index catalog.json
+    python -m util.catalog query --index catalog.json --animation run --min-frames 40
+"""
+
+CATALOG_VERSION = 1
+# offset of the name inside a frame: scale and translate (3 floats each) come first
+FRAME_NAME_OFFSET = 24
+
+
+@dataclass(slots=True)
+class md2_info_t:
+    path: str
+    size: int                   # file size in bytes, together with mtime_ns used to detect changed files
+    mtime_ns: int
+    num_skins: int = 0
+    num_xyz: int = 0
+    num_tris: int = 0
+    num_frames: int = 0
+    skinwidth: int = 0
+    skinheight: int = 0
+    skin_names: List[str] = field(default_factory=list)
+    frame_names: List[str] = field(default_factory=list)
+    animations: List[str] = field(default_factory=list)  # frame names grouped like the importer does
+    error: Optional[str] = None  # set if the file isn't a valid MD2, so it isn't probed again until it changes
+
+
+def probe_buffer(byte_list):
+    """
+    Reads the header, skin names and frame names of an in-memory .md2 file
+    :param byte_list: bytes-like object, e.g. an mmap. Only the pages holding the read fields are touched.
+    :return: tuple of header dataclass, list of skin names and list of frame names
+    """
+    byte_list = memoryview(byte_list)
+    if len(byte_list) < 68:
+        raise ValueError(f"Error: File type is not MD2. {len(byte_list)} bytes are too short for the header")
+    header = MD2.load_header(byte_list)
+    skins_end = header.ofs_skins + 64 * header.num_skins
+    frames_end = header.ofs_frames + header.framesize * header.num_frames
+    if skins_end > len(byte_list) or frames_end > len(byte_list) or \
+            (header.num_frames and header.framesize < FRAME_NAME_OFFSET + 16):
+        raise ValueError(f"Error: MD2 lumps exceed the file size of {len(byte_list)} bytes")
+    skins = np.frombuffer(byte_list, dtype="S64", count=header.num_skins, offset=header.ofs_skins)
+    skin_names = [x.decode("ascii", "ignore") for x in skins.tolist()]
+    # one 16 byte field every framesize bytes, read through a strided view
+    frame_names = np.ndarray((header.num_frames,), dtype="S16", buffer=byte_list,
+                             offset=header.ofs_frames + FRAME_NAME_OFFSET, strides=(header.framesize,)).tolist()
+    return header, skin_names, [clean_frame_name(x) for x in frame_names]
+
+
+def probe_file(path):
+    """
+    Probes an .md2 file without decoding its triangles and frames
+    :param path: path to the .md2 file
+    :return: md2_info_t, with error set instead of raising if the file isn't a valid MD2
+    """
+    stat = os.stat(path)
+    info = md2_info_t(path, stat.st_size, stat.st_mtime_ns)
+    try:
+        with open(path, "rb") as f:
+            byte_list = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError) as e:  # empty or unreadable file
+        info.error = f"{type(e).__name__}: {e}"
+        return info
+    try:
+        header, skin_names, frame_names = probe_buffer(byte_list)
+    except ValueError as e:
+        info.error = f"{type(e).__name__}: {e}"
+    # closed after the except block, which releases the traceback still referencing views of the mapping
+    byte_list.close()
+    if info.error:
+        return info
+    info.num_skins, info.num_xyz, info.num_tris, info.num_frames = \
+        header.num_skins, header.num_xyz, header.num_tris, header.num_frames
+    info.skinwidth, info.skinheight = header.skinwidth, header.skinheight
+    info.skin_names = [x.split("\x00")[0] for x in skin_names]
+    info.frame_names = frame_names
+    info.animations = [x.name for x in group_animations(frame_names)]
+    return info
+
+
+def default_catalog_path():
+    return os.path.join(default_cache_dir(), "catalog.json")
+
+
+class MD2Catalog:
+    """
+    Persistent JSON index of probed models. scan() only probes files whose size or modification time changed.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or default_catalog_path()
+        self.entries = dict()  # absolute path -> md2_info_t
+        self.probed = 0
+        self.reused = 0
+        self.removed = 0
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CATALOG_VERSION:
+            self.entries = {x["path"]: md2_info_t(**x) for x in data["models"]}
+
+    def scan(self, roots, recursive=True):
+        """
+        Updates the index with the .md2 files in roots and drops indexed files of roots which no longer exist
+        :param roots: list of directories
+        :param recursive: whether subdirectories are scanned as well
+        """
+        self.probed = self.reused = self.removed = 0
+        roots = [os.path.abspath(x) for x in roots]
+        found = set()
+        for root in roots:
+            for path in find_md2_files(root, recursive):
+                found.add(path)
+                entry = self.entries.get(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                    self.reused += 1
+                    continue
+                self.entries[path] = probe_file(path)
+                self.probed += 1
+        for path in list(self.entries):
+            in_roots = any(path.startswith(os.path.join(x, "")) for x in roots)
+            if in_roots and path not in found:
+                del self.entries[path]
+                self.removed += 1
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": CATALOG_VERSION, "models": [asdict(x) for x in self.entries.values()]}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def filter(self, text=None, animation=None, skin=None, min_frames=None, max_frames=None, min_vertices=None,
+               max_vertices=None, root=None):
+        """
+        Finds indexed models, all given conditions must match. Text comparisons are case-insensitive.
+        :param text: substring of the path, a skin name or an animation name
+        :param animation: name of an animation the model has
+        :param skin: substring of a skin name
+        :param root: only models inside of this directory
+        :return: list of md2_info_t sorted by path, files that aren't valid MD2s are left out
+        """
+        text = text.lower() if text else None
+        animation = animation.lower() if animation else None
+        skin = skin.lower() if skin else None
+        root = os.path.join(os.path.abspath(root), "") if root else None
+        matches = list()
+        for info in self.entries.values():
+            if info.error or (root and not info.path.startswith(root)):
+                continue
+            if text and text not in info.path.lower() and not any(text in x.lower() for x in info.skin_names) \
+                    and not any(text in x.lower() for x in info.animations):
+                continue
+            if animation and animation not in (x.lower() for x in info.animations):
+                continue
+            if skin and not any(skin in x.lower() for x in info.skin_names):
+                continue
+            if min_frames is not None and info.num_frames < min_frames or \
+                    max_frames is not None and info.num_frames > max_frames:
+                continue
+            if min_vertices is not None and info.num_xyz < min_vertices or \
+                    max_vertices is not None and info.num_xyz > max_vertices:
+                continue
+            matches.append(info)
+        return sorted(matches, key=lambda x: x.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexes MD2 model libraries without decoding the models")
+    parser.add_argument("--index", help="catalog file, defaults to catalog.json in the MD2 cache directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan = commands.add_parser("scan", help="add or update the models of directories")
+    scan.add_argument("roots", nargs="+")
+    query = commands.add_parser("query", help="list indexed models")
+    query.add_argument("--text")
+    query.add_argument("--animation")
+    query.add_argument("--skin")
+    query.add_argument("--min-frames", type=int)
+    query.add_argument("--max-frames", type=int)
+    query.add_argument("--min-vertices", type=int)
+    query.add_argument("--max-vertices", type=int)
+    query.add_argument("--root")
+    args = parser.parse_args(argv)
+
+    catalog = MD2Catalog(args.index)
+    if args.command == "scan":
+        start = time.perf_counter()
+        catalog.scan(args.roots)
+        catalog.save()
+        print(f"{catalog.probed} probed, {catalog.reused} unchanged, {catalog.removed} removed "
+              f"in {time.perf_counter() - start:.2f} s, {len(catalog.entries)} models in {catalog.index_path}")
+        return 0
+    for info in catalog.filter(args.text, args.animation, args.skin, args.min_frames, args.max_frames,
+                               args.min_vertices, args.max_vertices, args.root):
+        print(f"{info.path}\t{info.num_xyz} verts\t{info.num_tris} tris\t{info.num_frames} frames\t"
+              f"{','.join(info.animations)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+import argparse
+from dataclasses import dataclass
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+import numpy as np
+from . import MD2
+from .animations import clean_frame_name
+from .batch import find_md2_files, map_processes
+from .pak import PakFile
+"""
+Headless conversion of MD2 models to OBJ sequences (one .obj per frame) or glTF files with one morph target per
+frame, for viewers outside of Blender. Models are decoded lazily and written frame by frame, so only a few frames of a
+model are held in memory at a time, and models are converted on a process pool. Run as
+    python -m util.convert quake2/baseq2 quake2/baseq2/pak0.pak --out converted --format gltf
+Positions are converted from Quake's Z-up to the Y-up axes of glTF and OBJ and triangles are flipped from Quake's
+clockwise to counter-clockwise winding, so faces point outwards.
+"""
+
+FORMATS = ("gltf", "obj")
+DEFAULT_FPS = 10  # Quake 2 plays 10 MD2 frames per second
+
+# glTF constants
+GL_FLOAT = 5126
+GL_UNSIGNED_SHORT = 5123
+GL_UNSIGNED_INT = 5125
+GL_ARRAY_BUFFER = 34962
+GL_ELEMENT_ARRAY_BUFFER = 34963
+WEIGHT_ROWS_PER_WRITE = 256  # rows of the morph weight animation generated per write
+
+
+@dataclass(slots=True)
+class source_t:
+    path: str  # .md2 file or .pak archive
+    entry: Optional[str]  # entry name inside the .pak archive, None for .md2 files
+    name: str  # output path relative to the output directory, without extension
+
+
+@dataclass(slots=True)
+class convert_result_t:
+    name: str
+    input_bytes: int = 0
+    output_bytes: int = 0
+    frames: int = 0
+    error: Optional[str] = None  # error message if the conversion failed
+
+
+def find_sources(inputs):
+    """
+    Lists the models to convert
+    :param inputs: .md2 files, .pak archives and directories, which are searched recursively for .md2 files
+    :return: list of source_t. Models of directories keep their relative path, models of archives their entry path
+             below a directory named like the archive.
+    """
+    sources = list()
+    for path in inputs:
+        if os.path.isdir(path):
+            for md2_path in find_md2_files(path):
+                sources.append(source_t(md2_path, None, os.path.splitext(os.path.relpath(md2_path, path))[0]))
+        elif path.lower().endswith(".pak"):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            with PakFile(path) as archive:
+                for entry in archive.names(".md2"):
+                    sources.append(source_t(path, entry, os.path.join(stem, os.path.splitext(entry)[0])))
+        else:
+            sources.append(source_t(path, None, os.path.splitext(os.path.basename(path))[0]))
+    return sources
+
+
+def y_up(positions):
+    """
+    :param positions: (..., 3) array of Quake Z-up positions
+    :return: float32 array of Y-up positions, (x, y, z) -> (x, z, -y)
+    """
+    converted = np.empty(positions.shape, dtype=np.float32)
+    converted[..., 0] = positions[..., 0]
+    converted[..., 1] = positions[..., 2]
+    converted[..., 2] = -positions[..., 1]
+    return converted
+
+
+def _frame_names(model, frames):
+    return [clean_frame_name(x) for x in model.frame_info["name"][frames].tolist()]
+
+
+def write_obj_sequence(model, base_path, frames=None):
+    """
+    Writes one .obj file per frame, named base_path_000.obj, base_path_001.obj and so on. The texture coordinates and
+    faces are formatted once and shared by all frames.
+    :param model: md2_object, may be lazily loaded
+    :param base_path: output path without the frame number and extension
+    :param frames: indices of the frames to write, all frames if None
+    :return: number of bytes written
+    """
+    frames = range(model.header.num_frames) if frames is None else frames
+    uvs = model.st.astype(np.float32)
+    uvs[:, 1] = 1 - uvs[:, 1]  # OBJ texture coordinates originate at the lower left
+    corners = np.stack((model.vertex_indices[:, ::-1], model.texture_indices[:, ::-1]), axis=-1) + 1
+    shared = ("vt %.6f %.6f\n" * len(uvs) % tuple(uvs.ravel().tolist()) +
+              "f %d/%d %d/%d %d/%d\n" * len(corners) % tuple(corners.ravel().tolist())).encode("ascii")
+    written = 0
+    for frame, name in zip(frames, _frame_names(model, frames)):
+        positions = y_up(model.positions[frame])
+        text = f"o {name}\n" + "v %.6f %.6f %.6f\n" * len(positions) % tuple(positions.ravel().tolist())
+        with open(f"{base_path}_{frame:03d}.obj", "wb") as f:
+            written += f.write(text.encode("ascii"))
+            written += f.write(shared)
+    return written
+
+
+def gltf_vertices(model):
+    """
+    glTF vertices have a single texture coordinate, so every distinct pair of MD2 vertex and texture coordinate
+    used by a triangle corner becomes one glTF vertex
+    :param model: md2_object
+    :return: tuple of MD2 vertex index (num_vertices,), texture coordinate index (num_vertices,) and the
+             counter-clockwise triangles (num_tris, 3) indexing the glTF vertices
+    """
+    num_st = max(model.header.num_st, 1)
+    keys = model.vertex_indices[:, ::-1].astype(np.int64) * num_st + model.texture_indices[:, ::-1]
+    unique, triangles = np.unique(keys.ravel(), return_inverse=True)
+    return unique // num_st, unique % num_st, triangles.reshape(-1, 3)
+
+
+class _BinaryWriter:
+    """ appends 4 byte aligned views to a glTF .bin file and collects their bufferViews and accessors """
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.buffer_views = list()
+        self.accessors = list()
+
+    def add(self, array, accessor_type, target=None, min_max=False):
+        """
+        :return: index of the new accessor
+        """
+        data = np.ascontiguousarray(array).tobytes()
+        view = {"buffer": 0, "byteOffset": self.offset, "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        self.buffer_views.append(view)
+        self.f.write(data)
+        self.offset += len(data)
+        self._pad()
+        component_type = {np.dtype(np.float32): GL_FLOAT, np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+                          np.dtype(np.uint32): GL_UNSIGNED_INT}[array.dtype]
+        accessor = {"bufferView": len(self.buffer_views) - 1, "componentType": component_type,
+                    "count": len(array), "type": accessor_type}
+        if min_max:
+            accessor["min"] = array.min(axis=0).tolist() if array.ndim > 1 else [float(array.min())]
+            accessor["max"] = array.max(axis=0).tolist() if array.ndim > 1 else [float(array.max())]
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def add_chunks(self, chunks, count, accessor_type):
+        """ adds one accessor whose float32 data is written chunk by chunk """
+        start = self.offset
+        for chunk in chunks:
+            self.offset += self.f.write(np.ascontiguousarray(chunk, dtype=np.float32).tobytes())
+        self.buffer_views.append({"buffer": 0, "byteOffset": start, "byteLength": self.offset - start})
+        self._pad()
+        self.accessors.append({"bufferView": len(self.buffer_views) - 1, "componentType": GL_FLOAT,
+                               "count": count, "type": accessor_type})
+        return len(self.accessors) - 1
+
+    def _pad(self):
+        padding = -self.offset % 4
+        self.offset += self.f.write(bytes(padding))
+
+
+def _weight_rows(num_frames):
+    # at key k the target of frame k has weight 1, frame 0 is the base mesh without a target
+    for start in range(0, num_frames, WEIGHT_ROWS_PER_WRITE):
+        rows = np.arange(start, min(start + WEIGHT_ROWS_PER_WRITE, num_frames))
+        weights = np.zeros((len(rows), num_frames - 1), dtype=np.float32)
+        keyed = rows > 0
+        weights[np.flatnonzero(keyed), rows[keyed] - 1] = 1
+        yield weights
+
+
+def write_gltf(model, path, fps=DEFAULT_FPS, frames=None):
+    """
+    Writes a .gltf file and its .bin buffer. The first frame is the base mesh and every further frame a morph target
+    holding its offsets from the base, animated by an animation switching linearly from one target to the next.
+    The buffer is written frame by frame, the JSON once all views are known.
+    :param model: md2_object, may be lazily loaded
+    :param path: output path ending in .gltf, the buffer is written next to it with the extension .bin
+    :param fps: MD2 frames played per second
+    :param frames: indices of the frames to write, all frames if None
+    :return: number of bytes written
+    """
+    frames = list(range(model.header.num_frames) if frames is None else frames)
+    if not frames:
+        raise ValueError(f"Error: {path} would have no frames")
+    vertex_ids, st_ids, triangles = gltf_vertices(model)
+    bin_path = os.path.splitext(path)[0] + ".bin"
+    with open(bin_path, "wb") as f:
+        writer = _BinaryWriter(f)
+        index_dtype = np.uint16 if len(vertex_ids) < 65535 else np.uint32
+        indices = writer.add(triangles.ravel().astype(index_dtype), "SCALAR", GL_ELEMENT_ARRAY_BUFFER)
+        uvs = writer.add(model.st[st_ids].astype(np.float32), "VEC2", GL_ARRAY_BUFFER)
+        base = y_up(model.positions[frames[0]])[vertex_ids]
+        positions = writer.add(base, "VEC3", GL_ARRAY_BUFFER, min_max=True)
+        targets = [{"POSITION": writer.add(y_up(model.positions[x])[vertex_ids] - base, "VEC3", GL_ARRAY_BUFFER,
+                                           min_max=True)} for x in frames[1:]]
+        if targets:
+            times = writer.add(np.arange(len(frames), dtype=np.float32) / fps, "SCALAR", min_max=True)
+            weights = writer.add_chunks(_weight_rows(len(frames)), len(frames) * len(targets), "SCALAR")
+    names = _frame_names(model, frames)
+    primitive = {"attributes": {"POSITION": positions, "TEXCOORD_0": uvs}, "indices": indices}
+    mesh = {"name": os.path.splitext(os.path.basename(path))[0], "primitives": [primitive],
+            "extras": {"skins": [x.split("\x00")[0] for x in model.skin_names]}}
+    gltf = {
+        "asset": {"version": "2.0", "generator": "md2 converter"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "name": mesh["name"]}],
+        "meshes": [mesh],
+        "buffers": [{"uri": os.path.basename(bin_path), "byteLength": writer.offset}],
+        "bufferViews": writer.buffer_views,
+        "accessors": writer.accessors,
+    }
+    if targets:
+        primitive["targets"] = targets
+        mesh["weights"] = [0.0] * len(targets)
+        mesh["extras"]["targetNames"] = names[1:]  # read by three.js as morph target names
+        gltf["animations"] = [{
+            "name": "frames",
+            "samplers": [{"input": times, "output": weights, "interpolation": "LINEAR"}],
+            "channels": [{"sampler": 0, "target": {"node": 0, "path": "weights"}}],
+        }]
+    text = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(text)
+    return writer.offset + len(text)
+
+
+def convert_source(source, out_dir, output_format="gltf", fps=DEFAULT_FPS):
+    """
+    Converts one model, turning any error into a failure entry so one bad model doesn't stop a batch
+    :param source: source_t
+    :param out_dir: output directory, the model is written to out_dir/source.name
+    :param output_format: "gltf" or "obj"
+    :return: convert_result_t
+    """
+    result = convert_result_t(source.name)
+    try:
+        if source.entry is None:
+            model = MD2.load_file(source.path, decode_gl_commands=False, lazy=True)
+            result.input_bytes = os.path.getsize(source.path)
+        else:
+            # closing the archive leaves its mapping alive while the model's frames reference it
+            with PakFile(source.path) as archive:
+                byte_list = archive.read(source.entry)
+                model = MD2.load_buffer(byte_list, decode_gl_commands=False, lazy=True)
+            result.input_bytes = len(byte_list)
+        base_path = os.path.join(out_dir, source.name)
+        os.makedirs(os.path.dirname(base_path) or ".", exist_ok=True)
+        if output_format == "obj":
+            result.output_bytes = write_obj_sequence(model, base_path)
+        else:
+            result.output_bytes = write_gltf(model, base_path + ".gltf", fps)
+        result.frames = model.header.num_frames
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _convert_task(task):
+    return convert_source(*task)
+
+
+def convert(sources, out_dir, output_format="gltf", fps=DEFAULT_FPS, max_workers=None) -> List[convert_result_t]:
+    """
+    Converts models in parallel, see batch.map_processes
+    :param sources: list of source_t, see find_sources
+    :param max_workers: see batch.map_processes
+    :return: one convert_result_t per source, in the order of sources
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Error: unknown output format {output_format}, expected one of {', '.join(FORMATS)}")
+    return map_processes(_convert_task, [(x, out_dir, output_format, fps) for x in sources], max_workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converts MD2 models to OBJ sequences or glTF with morph targets")
+    parser.add_argument("inputs", nargs="+", help=".md2 files, .pak archives or directories searched for .md2 files")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--format", choices=FORMATS, default="gltf")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS, help="MD2 frames per second of glTF animations")
+    parser.add_argument("--workers", type=int, help="number of worker processes, defaults to one per CPU core")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sources = find_sources(args.inputs)
+    results = convert(sources, args.out, args.format, args.fps, args.workers)
+    seconds = max(time.perf_counter() - start, 1e-9)
+    failed = [x for x in results if x.error]
+    for result in failed:
+        print(f"{result.name}: {result.error}", file=sys.stderr)
+    converted = len(results) - len(failed)
+    megabytes = sum(x.input_bytes for x in results) / 1e6
+    print(f"{converted} models ({sum(x.frames for x in results)} frames) converted, {len(failed)} failed "
+          f"in {seconds:.2f} s: {converted / seconds:.1f} models/s, {megabytes / seconds:.1f} MB/s read, "
+          f"{sum(x.output_bytes for x in results) / 1e6:.1f} MB written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
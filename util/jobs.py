@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+"""
+Scheduling of non-blocking imports. A job parses on a worker thread and then applies the result in time slices from
+the main thread, which blender drives by a modal operator's timer events. Creating blender data has to stay on the
+main thread.
+"""
+
+PARSING = "PARSING"
+APPLYING = "APPLYING"
+FINISHED = "FINISHED"
+CANCELLED = "CANCELLED"
+FAILED = "FAILED"
+
+# share of the progress bar given to parsing, the rest fills while the result is applied
+DEFAULT_PARSE_WEIGHT = 0.2
+# main thread time spent applying per timer event, short enough to keep the UI responsive
+DEFAULT_TIME_BUDGET = 0.05
+
+
+class ImportJob:
+    """
+    Runs parse() on a worker thread, then drives apply(result). apply returns a generator yielding its progress
+    from 0 to 1 after each chunk of work, e.g. after the mesh, after every few animation frames and after the material.
+    """
+
+    def __init__(self, parse, apply, parse_weight=DEFAULT_PARSE_WEIGHT):
+        self.parse = parse
+        self.apply = apply
+        self.parse_weight = parse_weight
+        self.state = PARSING
+        self.error = None  # "ExceptionName: message" if the job failed
+        self._apply_progress = 0.0
+        self._steps = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = self._executor.submit(parse)
+        self._executor.shutdown(wait=False)
+
+    @property
+    def done(self):
+        return self.state in (FINISHED, CANCELLED, FAILED)
+
+    @property
+    def progress(self):
+        """ progress of the whole job from 0 to 1 """
+        if self.state == PARSING:
+            return 0.0
+        if self.state == FINISHED:
+            return 1.0
+        return self.parse_weight + (1 - self.parse_weight) * self._apply_progress
+
+    def step(self, time_budget=DEFAULT_TIME_BUDGET, clock=time.perf_counter):
+        """
+        Advances the job, to be called from the main thread e.g. on each timer event.
+        Returns right away while parsing, otherwise applies chunks until time_budget seconds have passed.
+        At least one chunk is applied per call.
+        :return: state of the job
+        """
+        if self.state == PARSING:
+            if not self._future.done():
+                return self.state
+            try:
+                result = self._future.result()
+            except Exception as e:
+                return self._fail(e)
+            self._steps = self.apply(result)
+            self.state = APPLYING
+        if self.state != APPLYING:
+            return self.state
+        deadline = clock() + time_budget
+        while True:
+            try:
+                self._apply_progress = min(max(float(next(self._steps)), 0.0), 1.0)
+            except StopIteration:
+                self.state = FINISHED
+                break
+            except Exception as e:
+                return self._fail(e)
+            if clock() >= deadline:
+                break
+        return self.state
+
+    def cancel(self):
+        """
+        Stops the job. A running parse can't be interrupted, its result is discarded. A partially applied result is
+        closed, so apply's generator can clean up in a finally block.
+        """
+        if self.done:
+            return
+        self._future.cancel()
+        if self._steps is not None:
+            self._steps.close()
+        self.state = CANCELLED
+
+    def run(self):
+        """ blocks until the job is done, for scripts and tests """
+        while not self.done:
+            if self.state == PARSING:
+                self._future.exception()  # waits for the parse
+            self.step(time_budget=float("inf"))
+        return self.state
+
+    def _fail(self, exception):
+        self.error = f"{type(exception).__name__}: {exception}"
+        if self._steps is not None:
+            self._steps.close()
+        self.state = FAILED
+        return self.state
+
+
+def update_progress(job, window_manager, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Advances job by one time slice and shows its progress with the window manager's progress cursor
+    (between progress_begin(0, 100) and progress_end())
+    :return: state of the job
+    """
+    state = job.step(time_budget)
+    window_manager.progress_update(int(job.progress * 100))
+    return state
+
+
+def scaled_progress(steps, start, end, report=None, stage=None):
+    """
+    Maps the 0 to 1 progress yielded by the generator steps to start..end, so generators for parts of an import can be
+    chained with yield from. The generator's return value is passed on.
+    :param report: optional ImportReport the time spent in steps is added to as stage, excluding the time between
+                   time slices
+    """
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                progress = next(steps)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                if report is not None:
+                    report.stages[stage] = report.stages.get(stage, 0.0) + time.perf_counter() - started
+            yield start + (end - start) * progress
+    finally:
+        steps.close()
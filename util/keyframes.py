@@ -0,0 +1,71 @@
+import numpy as np
+"""
+Helpers building flat keyframe buffers for Blender's keyframe_points.foreach_set, and finding the vertices and keys a
+vertex keyframe animation can leave out because they don't move or lie on a straight line between their neighbours.
+"""
+
+
+def shape_key_keyframes(frame_index, num_frames, frame_step):
+    """
+    Keyframes for the value of the shape key holding one MD2 frame. The key is fully applied on its own frame and
+    fades in from / out to the neighbouring frames, so consecutive shape keys blend linearly into each other.
+    The first frame is applied again one step after the last one to yield a cyclic animation.
+    :param frame_index: index of the MD2 frame the shape key belongs to
+    :param num_frames: total number of MD2 frames
+    :param frame_step: number of scene frames between two MD2 frames
+    :return: float32 array of flat (frame, value) pairs
+    """
+    keys = list()
+    if frame_index > 0:
+        keys.append(((frame_index - 1) * frame_step, 0.0))
+    keys.append((frame_index * frame_step, 1.0))
+    keys.append(((frame_index + 1) * frame_step, 0.0))
+    if frame_index == 0 and num_frames > 1:
+        keys[-1] = (frame_step, 0.0)
+        if num_frames > 2:
+            keys.append(((num_frames - 1) * frame_step, 0.0))
+        keys.append((num_frames * frame_step, 1.0))
+    return np.array(keys, dtype=np.float32).ravel()
+
+
+def static_vertices(positions, tolerance=0.0):
+    """
+    Finds vertices which don't move, they need no F-curves at all
+    :param positions: float array of shape (num_frames, num_xyz, 3)
+    :param tolerance: largest per-axis movement still considered static
+    :return: bool array of shape (num_xyz,)
+    """
+    positions = np.asarray(positions)
+    movement = positions.max(axis=0) - positions.min(axis=0)
+    return (movement <= tolerance).all(axis=1)
+
+
+def reduce_linear_keys(times, values, tolerance=0.0):
+    """
+    Greedily drops keys which linear interpolation between the kept neighbours reproduces. Walking along the keys,
+    a key is dropped if the line from the last kept key to the key after it passes all keys in between (the dropped
+    ones included) within tolerance. First and last keys are always kept.
+    All curves share the key times and are processed at once.
+    :param times: float array of shape (num_keys,), increasing
+    :param values: float array of shape (num_keys, num_curves)
+    :param tolerance: largest allowed absolute difference between interpolated and original values
+    :return: bool array of shape (num_keys, num_curves), True for keys to keep
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    num_keys, num_curves = values.shape
+    keep = np.ones((num_keys, num_curves), dtype=bool)
+    curves = np.arange(num_curves)
+    anchor = np.zeros(num_curves, dtype=np.intp)  # last kept key of each curve
+    key_indices = np.arange(num_keys)[:, np.newaxis]
+    for j in range(1, num_keys - 1):
+        start_time = times[anchor]
+        start_value = values[anchor, curves]
+        weights = (times[:j + 1, np.newaxis] - start_time) / (times[j + 1] - start_time)
+        interpolated = start_value + weights * (values[j + 1] - start_value)
+        between = (key_indices[:j + 1] > anchor) & (key_indices[:j + 1] <= j)
+        error = np.where(between, np.abs(interpolated - values[:j + 1]), 0.0).max(axis=0)
+        drop = error <= tolerance
+        keep[j] = ~drop
+        anchor = np.where(drop, anchor, j)
+    return keep
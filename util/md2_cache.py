@@ -0,0 +1,150 @@
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from . import MD2
+"""
+Content addressed on-disk cache of parsed MD2 models. Entries are keyed by the hash of the file content and the parser
+version and store the decoded arrays as .npy files, which are memory-mapped when an entry is hit.
+Least recently used entries are evicted once the cache grows beyond its size cap.
+"""
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# arrays of md2_object stored as one .npy file each
+ARRAY_FIELDS = ("frame_info", "positions", "normal_indices", "vertex_indices", "texture_indices", "st")
+# arrays of glCommandArrays_t, stored as gl_<field>.npy
+GL_COMMAND_FIELDS = ("strip", "starts", "counts", "vertices")
+META_FILE = "meta.json"
+
+
+def default_cache_dir():
+    return os.environ.get("MD2_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "md2_importer"))
+
+
+class MD2Cache:
+    """
+    Loads MD2 models through the cache. Counts hits, misses and evictions so one can verify it is working.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(file_bytes):
+        """
+        :param file_bytes: content of the .md2 file
+        :return: cache key of the content decoded by the current parser version
+        """
+        return f"{hashlib.blake2b(file_bytes, digest_size=16).hexdigest()}-v{MD2.PARSER_VERSION}"
+
+    def load(self, path, bypass=False):
+        """
+        Loads a model from the cache, parsing and storing it on a miss
+        :param path: path to the .md2 file
+        :param bypass: parse the file without reading or writing the cache
+        :return: md2_object
+        """
+        if bypass:
+            return MD2.load_file(path)
+        with open(path, "rb") as f:
+            file_bytes = f.read()
+        key = self.key(file_bytes)
+        model = self.get(key)
+        if model is None:
+            model = MD2.load_file(path)
+            self.put(key, model)
+        return model
+
+    def get(self, key):
+        """
+        :param key: see key()
+        :return: memory-mapped md2_object or None on a miss
+        """
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            with open(os.path.join(entry, META_FILE)) as f:
+                meta = json.load(f)
+            arrays = {x: np.load(os.path.join(entry, x + ".npy"), mmap_mode="r") for x in ARRAY_FIELDS}
+            gl_command_arrays = None
+            if meta["gl_commands"]:
+                gl_command_arrays = MD2.glCommandArrays_t(
+                    **{x: np.load(os.path.join(entry, f"gl_{x}.npy"), mmap_mode="r") for x in GL_COMMAND_FIELDS})
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(os.path.join(entry, META_FILE))  # marks the entry as recently used
+        self.hits += 1
+        header = MD2.md2_t(*meta["header"])
+        return MD2.model_from_arrays(header, meta["skin_names"], gl_command_arrays=gl_command_arrays, **arrays)
+
+    def put(self, key, model):
+        """
+        Stores a parsed model and evicts least recently used entries beyond the size cap
+        :param key: see key()
+        :param model: md2_object, models parsed without gl commands are stored without them
+        """
+        entry = os.path.join(self.cache_dir, key)
+        tmp_entry = f"{entry}.tmp{os.getpid()}"
+        os.makedirs(tmp_entry, exist_ok=True)
+        try:
+            for field in ARRAY_FIELDS:
+                np.save(os.path.join(tmp_entry, field + ".npy"), getattr(model, field))
+            if model.gl_command_arrays is not None:
+                for field in GL_COMMAND_FIELDS:
+                    np.save(os.path.join(tmp_entry, f"gl_{field}.npy"), getattr(model.gl_command_arrays, field))
+            with open(os.path.join(tmp_entry, META_FILE), "w") as f:
+                json.dump({"header": dataclasses.astuple(model.header), "skin_names": model.skin_names,
+                           "gl_commands": model.gl_command_arrays is not None}, f)
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # another process stored the same entry in the meantime or the cache isn't writable
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        :return: list of (last use, size in bytes, path) of all cache entries
+        """
+        if not os.path.isdir(self.cache_dir):
+            return list()
+        entries = list()
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or ".tmp" in entry.name:
+                continue
+            files = list(os.scandir(entry.path))
+            size = sum(x.stat().st_size for x in files)
+            last_use = max((x.stat().st_mtime for x in files if x.name == META_FILE), default=0)
+            entries.append((last_use, size, entry.path))
+        return entries
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits into max_bytes
+        """
+        entries = sorted(self.entries())
+        total = sum(x[1] for x in entries)
+        for last_use, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all cache entries
+        """
+        for last_use, size, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self):
+        entries = self.entries()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(entries), "bytes": sum(x[1] for x in entries)}
@@ -0,0 +1,266 @@
+import struct
+import numpy as np
+from . import MD2
+from .anorms import ANORMS
+"""
+Writer for .md2 files, the counterpart of MD2.load_file. Frames are quantized with one min/max reduction and one
+vectorized rounding over all vertices of all frames, light normal indices are looked up against the anorms table and
+the gl commands lump is rebuilt from the triangles. The whole file is assembled in one buffer and written at once.
+"""
+
+HEADER_SIZE = 68
+IDENT = 844121161  # "IDP2"
+VERSION = 8
+# vertex normals compared to the 162 anorms at once, bounds the temporary (rows, 162) array to about 10 MB
+NORMAL_LOOKUP_ROWS = 16384
+
+
+def quantize_frames(positions):
+    """
+    Compresses vertex positions to one byte per coordinate. Each frame's translate is its minimum corner and its scale
+    maps the frame's extent to 0..255, so dequantized positions are within half a scale step of the input.
+    :param positions: (num_frames, num_xyz, 3) array of positions
+    :return: tuple of float32 scale (num_frames, 3), float32 translate (num_frames, 3) and uint8 compressed vertices
+             (num_frames, num_xyz, 3)
+    """
+    positions = np.asarray(positions, dtype=np.float32)
+    if positions.ndim != 3 or positions.shape[2] != 3 or not positions.shape[0] or not positions.shape[1]:
+        raise ValueError(f"Error: positions of shape {positions.shape} aren't (num_frames, num_xyz, 3) with at least "
+                         f"one frame and vertex")
+    translate = positions.min(axis=1)
+    scale = (positions.max(axis=1) - translate) / np.float32(255)
+    # flat axes quantize to 0, any scale dequantizes them to translate
+    steps = np.where(scale > 0, scale, np.float32(1))
+    compressed = np.rint((positions - translate[:, np.newaxis]) / steps[:, np.newaxis])
+    return scale, translate, np.clip(compressed, 0, 255).astype(np.uint8)
+
+
+def compute_vertex_normals(positions, vertex_indices):
+    """
+    Area weighted vertex normals of all frames
+    :param positions: (num_frames, num_xyz, 3) array of positions
+    :param vertex_indices: (num_tris, 3) vertex indices of the clockwise MD2 triangles
+    :return: float32 (num_frames, num_xyz, 3) normals, not normalized and zero for vertices without triangles
+    """
+    positions = np.asarray(positions, dtype=np.float32)
+    num_frames, num_xyz = positions.shape[:2]
+    corners = positions[:, vertex_indices]  # (num_frames, num_tris, 3, 3)
+    # MD2 triangles are clockwise, so this order of the edges points the face normals outwards
+    faces = np.cross(corners[:, :, 2] - corners[:, :, 0], corners[:, :, 1] - corners[:, :, 0])
+    bins = (np.arange(num_frames)[:, np.newaxis, np.newaxis] * num_xyz + vertex_indices).ravel()
+    normals = np.empty((num_frames * num_xyz, 3), dtype=np.float32)
+    for axis in range(3):
+        weights = np.repeat(faces[:, :, axis], 3, axis=1).ravel()
+        normals[:, axis] = np.bincount(bins, weights, minlength=num_frames * num_xyz)
+    return normals.reshape(num_frames, num_xyz, 3)
+
+
+def nearest_normal_indices(normals):
+    """
+    :param normals: float array of shape (..., 3), need not be normalized
+    :return: uint8 array of shape normals.shape[:-1] holding the index of the anorm pointing closest to each normal
+    """
+    normals = np.asarray(normals, dtype=np.float32)
+    flat = normals.reshape(-1, 3)
+    indices = np.empty(len(flat), dtype=np.uint8)
+    for start in range(0, len(flat), NORMAL_LOOKUP_ROWS):
+        indices[start:start + NORMAL_LOOKUP_ROWS] = np.argmax(flat[start:start + NORMAL_LOOKUP_ROWS] @ ANORMS.T, axis=1)
+    return indices.reshape(normals.shape[:-1])
+
+
+def _grow(triangle, corners, edges, used, fan):
+    # extends a strip or fan starting with triangle, whose corners are given in the rotation to start with
+    sequence = list(corners)
+    members = [triangle]
+    claimed = {triangle}
+    while True:
+        if fan:  # fan triangle k is (0, k+1, k+2)
+            edge = (sequence[0], sequence[-1])
+        elif len(members) % 2:  # odd strip triangle k is (k+1, k, k+2)
+            edge = (sequence[-1], sequence[-2])
+        else:  # even strip triangle k is (k, k+1, k+2)
+            edge = (sequence[-2], sequence[-1])
+        for other, third in edges.get(edge, ()):
+            if not used[other] and other not in claimed:
+                break
+        else:
+            return sequence, members
+        sequence.append(third)
+        members.append(other)
+        claimed.add(other)
+
+
+def build_gl_command_arrays(vertex_indices, texture_indices, st):
+    """
+    Covers the triangles with triangle strips and fans. Starting at each triangle not covered yet, the longest strip or
+    fan over triangles sharing both the vertex and the texture coordinate of their common corners is taken, like
+    Quake 2's model compiler does. The winding of the triangles is kept.
+    :param vertex_indices: (num_tris, 3) vertex indices
+    :param texture_indices: (num_tris, 3) texture coordinate indices
+    :param st: (num_st, 2) normalized texture coordinates
+    :return: MD2.glCommandArrays_t
+    """
+    vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+    texture_indices = np.asarray(texture_indices, dtype=np.int64)
+    # corners are distinct pairs of vertex and texture coordinate
+    num_st = int(texture_indices.max(initial=0)) + 1
+    unique, corner_ids = np.unique((vertex_indices * num_st + texture_indices).ravel(), return_inverse=True)
+    triangles = corner_ids.reshape(-1, 3).tolist()
+    corner_vertices, corner_texture = unique // num_st, unique % num_st
+
+    edges = dict()  # directed edge (a, b) -> list of (triangle, third corner)
+    for i, (a, b, c) in enumerate(triangles):
+        edges.setdefault((a, b), []).append((i, c))
+        edges.setdefault((b, c), []).append((i, a))
+        edges.setdefault((c, a), []).append((i, b))
+    used = [False] * len(triangles)
+    strip, sequences = list(), list()
+    for i, (a, b, c) in enumerate(triangles):
+        if used[i]:
+            continue
+        best = None
+        for fan in (False, True):
+            for corners in ((a, b, c), (b, c, a), (c, a, b)):
+                sequence, members = _grow(i, corners, edges, used, fan)
+                if best is None or len(members) > len(best[2]):
+                    best = (fan, sequence, members)
+        fan, sequence, members = best
+        for member in members:
+            used[member] = True
+        strip.append(not fan)
+        sequences.append(sequence)
+
+    counts = np.array([len(x) for x in sequences], dtype=np.int32)
+    starts = np.zeros(len(counts), dtype=np.int32)
+    np.cumsum(counts[:-1], out=starts[1:])
+    order = np.array([x for sequence in sequences for x in sequence], dtype=np.int64)
+    vertices = np.empty(len(order), dtype=MD2.gl_vertex_dtype)
+    st = np.asarray(st, dtype=np.float32)
+    vertices["s"] = st[corner_texture[order], 0]
+    vertices["t"] = st[corner_texture[order], 1]
+    vertices["index"] = corner_vertices[order]
+    return MD2.glCommandArrays_t(np.array(strip, dtype=bool), starts, counts, vertices)
+
+
+def gl_command_words(gl_command_arrays):
+    """
+    Encodes gl commands like they are stored in the gl commands lump: per command its vertex count (negative for
+    fans) followed by s, t and vertex index of each vertex, terminated by 0
+    :param gl_command_arrays: MD2.glCommandArrays_t
+    :return: int32 array
+    """
+    counts = gl_command_arrays.counts.astype(np.int64)
+    starts = gl_command_arrays.starts.astype(np.int64)
+    words = np.zeros(len(counts) + 3 * int(counts.sum()) + 1, dtype="<i4")
+    header_positions = np.arange(len(counts)) + 3 * starts
+    words[header_positions] = np.where(gl_command_arrays.strip, counts, -counts)
+    record_positions = np.repeat(header_positions + 1 - 3 * starts, counts) + 3 * np.arange(int(counts.sum()))
+    vertices = gl_command_arrays.vertices
+    words[record_positions] = vertices["s"].astype("<f4").view("<i4")
+    words[record_positions + 1] = vertices["t"].astype("<f4").view("<i4")
+    words[record_positions + 2] = vertices["index"]
+    return words
+
+
+def _names(names, size, kind):
+    encoded = [x if isinstance(x, bytes) else x.encode("ascii") for x in names]
+    for name in encoded:
+        if len(name.rstrip(b"\x00")) > size:
+            raise ValueError(f"Error: {kind} name {name!r} is longer than {size} bytes")
+    return np.array([x[:size] for x in encoded], dtype=f"S{size}")
+
+
+def encode_model(positions, vertex_indices, texture_indices, st, skinwidth, skinheight, skin_names=(),
+                 frame_names=None, normal_indices=None, normals=None, gl_command_arrays=None):
+    """
+    Assembles an .md2 file in memory
+    :param positions: (num_frames, num_xyz, 3) array of vertex positions
+    :param vertex_indices: (num_tris, 3) vertex indices of the clockwise triangles
+    :param texture_indices: (num_tris, 3) texture coordinate indices
+    :param st: (num_st, 2) texture coordinates normalized by the skin size, like md2_object.st
+    :param skinwidth: width of the skin in pixels
+    :param skinheight: height of the skin in pixels
+    :param skin_names: skin paths, 64 bytes at most
+    :param frame_names: one name of 16 bytes at most per frame, frame0, frame1 etc. if None
+    :param normal_indices: (num_frames, num_xyz) light normal indices to store as they are
+    :param normals: (num_frames, num_xyz, 3) vertex normals to look up light normal indices for if normal_indices
+                    isn't given. Computed from the triangles if neither is given.
+    :param gl_command_arrays: MD2.glCommandArrays_t to store, rebuilt from the triangles if None
+    :return: bytearray of the file
+    """
+    scale, translate, compressed = quantize_frames(positions)
+    num_frames, num_xyz = compressed.shape[:2]
+    vertex_indices = np.asarray(vertex_indices).reshape(-1, 3)
+    texture_indices = np.asarray(texture_indices).reshape(-1, 3)
+    st = np.asarray(st, dtype=np.float32).reshape(-1, 2)
+    if len(vertex_indices) != len(texture_indices):
+        raise ValueError(f"Error: {len(vertex_indices)} triangles but {len(texture_indices)} texture triangles")
+    if vertex_indices.size and not (0 <= vertex_indices.min() and vertex_indices.max() < num_xyz):
+        raise ValueError(f"Error: vertex indices exceed the {num_xyz} vertices")
+    if texture_indices.size and not (0 <= texture_indices.min() and texture_indices.max() < len(st)):
+        raise ValueError(f"Error: texture coordinate indices exceed the {len(st)} texture coordinates")
+    if frame_names is None:
+        frame_names = [f"frame{i}" for i in range(num_frames)]
+    frame_names = _names(frame_names, 16, "frame")
+    skin_names = _names(skin_names, 64, "skin")
+    if len(frame_names) != num_frames:
+        raise ValueError(f"Error: {len(frame_names)} frame names for {num_frames} frames")
+    if normal_indices is None:
+        if normals is None:
+            normals = compute_vertex_normals(positions, vertex_indices)
+        normal_indices = nearest_normal_indices(normals)
+    if gl_command_arrays is None:
+        gl_command_arrays = build_gl_command_arrays(vertex_indices, texture_indices, st)
+    gl_words = gl_command_words(gl_command_arrays)
+
+    framesize = 40 + 4 * num_xyz
+    ofs_skins = HEADER_SIZE
+    ofs_st = ofs_skins + 64 * len(skin_names)
+    ofs_tris = ofs_st + 4 * len(st)
+    ofs_frames = ofs_tris + 12 * len(vertex_indices)
+    ofs_glcmds = ofs_frames + framesize * num_frames
+    ofs_end = ofs_glcmds + gl_words.nbytes
+    buffer = bytearray(ofs_end)
+    struct.pack_into("<17i", buffer, 0, IDENT, VERSION, skinwidth, skinheight, framesize, len(skin_names), num_xyz,
+                     len(st), len(vertex_indices), len(gl_words), num_frames, ofs_skins, ofs_st, ofs_tris,
+                     ofs_frames, ofs_glcmds, ofs_end)
+    # every lump is filled through a numpy view of the buffer
+    np.frombuffer(buffer, dtype="S64", count=len(skin_names), offset=ofs_skins)[:] = skin_names
+    np.frombuffer(buffer, dtype="<i2", count=2 * len(st), offset=ofs_st).reshape(-1, 2)[:] = \
+        np.rint(st * np.array([skinwidth, skinheight], dtype=np.float32))
+    triangles = np.frombuffer(buffer, dtype="<i2", count=6 * len(vertex_indices), offset=ofs_tris).reshape(-1, 2, 3)
+    triangles[:, 0] = vertex_indices
+    triangles[:, 1] = texture_indices
+    frames = np.frombuffer(buffer, dtype=MD2.frame_dtype(num_xyz), count=num_frames, offset=ofs_frames)
+    frames["scale"] = scale
+    frames["translate"] = translate
+    frames["name"] = frame_names
+    frames["verts"][:, :, :3] = compressed
+    frames["verts"][:, :, 3] = normal_indices
+    np.frombuffer(buffer, dtype="<i4", count=len(gl_words), offset=ofs_glcmds)[:] = gl_words
+    return buffer
+
+
+def save_file(path, *args, **kwargs):
+    """
+    Writes an .md2 file with a single write, see encode_model for the arguments
+    """
+    buffer = encode_model(*args, **kwargs)
+    with open(path, "wb") as f:
+        f.write(buffer)
+
+
+def save_model(path, model, positions=None, st=None, rebuild_normals=False):
+    """
+    Writes an md2_object, e.g. one loaded with MD2.load_file, optionally with changed positions or texture
+    coordinates. Names, skin size and triangles are taken from the model and the gl commands are rebuilt.
+    :param positions: (num_frames, num_xyz, 3) positions replacing the model's
+    :param st: (num_st, 2) normalized texture coordinates replacing the model's, e.g. an edited UV layout
+    :param rebuild_normals: compute the light normal indices from the triangles instead of keeping the model's
+    """
+    positions = np.asarray(model.positions if positions is None else positions)
+    normal_indices = None if rebuild_normals or positions.shape[:2] != model.normal_indices.shape \
+        else model.normal_indices
+    save_file(path, positions, model.vertex_indices, model.texture_indices, model.st if st is None else st,
+              model.header.skinwidth, model.header.skinheight, model.skin_names, model.frame_info["name"].tolist(),
+              normal_indices)
@@ -0,0 +1,105 @@
+import mmap
+import os
+import numpy as np
+from .prepare_skin_paths import SKIN_EXTENSIONS, skin_key
+"""
+Reader for Quake 2 .pak archives. The archive is memory-mapped and entries are handed out as memoryview slices, so
+models and skins can be parsed straight from the archive without extracting or copying them.
+"""
+
+# directory entry: 56 byte file name, offset and length of the file inside the archive
+pak_entry_dtype = np.dtype([("name", "S56"), ("offset", "<i4"), ("length", "<i4")])
+
+
+class PakFile:
+    """
+    Memory-mapped .pak archive with a name -> (offset, length) index of its directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"Error: {path} is not a PAK file")
+        self._view = memoryview(self._mmap)
+        if bytes(self._view[:4]) != b"PACK":
+            self.close()
+            raise ValueError(f"Error: {path} is not a PAK file. Ident {bytes(self._view[:4])} should be b'PACK'")
+        (dir_offset, dir_length) = np.frombuffer(self._view, dtype="<i4", count=2, offset=4).tolist()
+        directory = np.frombuffer(self._view, dtype=pak_entry_dtype, count=dir_length // pak_entry_dtype.itemsize,
+                                  offset=dir_offset)
+        self.entries = dict()  # name -> (offset, length)
+        for name, offset, length in zip(directory["name"].tolist(), directory["offset"].tolist(),
+                                        directory["length"].tolist()):
+            self.entries[name.decode("ascii", "ignore")] = (offset, length)
+        # lower case path without extension -> {extension: name} for skin lookups
+        self._stems = dict()
+        for name in self.entries:
+            stem, ext = os.path.splitext(name.lower())
+            self._stems.setdefault(stem, dict())[ext] = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # slices handed out by read() are still in use, the mapping is freed once they are garbage collected
+            pass
+        self._file.close()
+
+    def names(self, extension=None):
+        """
+        :param extension: optional extension like ".md2" to filter by
+        :return: sorted entry names
+        """
+        return sorted(x for x in self.entries if extension is None or x.lower().endswith(extension))
+
+    def read(self, name):
+        """
+        :param name: entry name like 'models/items/ammo/tris.md2'
+        :return: zero-copy memoryview of the entry's bytes
+        """
+        offset, length = self.entries[name]
+        return self._view[offset:offset + length]
+
+    def find_skin(self, skin_name):
+        """
+        Looks up a skin name stored in an MD2 disregarding case and file extension like SkinResolver does
+        :param skin_name: skin name as stored in the MD2
+        :return: entry name with the best-ranked extension or None
+        """
+        candidates = self._stems.get(skin_key(skin_name), dict())
+        for ext in SKIN_EXTENSIONS:
+            if ext in candidates:
+                return candidates[ext]
+        return None
+
+
+def write_pak(path, files):
+    """
+    Writes a .pak archive, mostly useful for tests
+    :param path: output path
+    :param files: dict of entry name -> bytes
+    """
+    with open(path, "wb") as f:
+        f.write(bytes(12))
+        directory = np.zeros(len(files), dtype=pak_entry_dtype)
+        for i, (name, data) in enumerate(files.items()):
+            directory[i] = (name.encode("ascii"), f.tell(), len(data))
+            f.write(data)
+        dir_offset = f.tell()
+        f.write(directory.tobytes())
+        f.seek(0)
+        f.write(b"PACK" + np.array([dir_offset, directory.nbytes], dtype="<i4").tobytes())
@@ -0,0 +1,86 @@
+import struct
+import numpy as np
+"""
+Minimal PCX reader for Quake 2 skins. Decodes the RLE stream and the palette into a contiguous float32 RGBA buffer
+ready for Blender's image.pixels.foreach_set, so loading .pcx skins does not need PIL.
+"""
+
+PCX_HEADER_SIZE = 128
+PALETTE_SIZE = 768
+
+
+def decode_rle(data, size):
+    """
+    Decodes PCX run length encoding without a per byte Python loop.
+    A byte with its two high bits set (>= 0xC0) starts a run of (byte & 0x3F) repetitions of the following byte,
+    every other byte is a literal. Which bytes start a token only depends on the parity inside runs of high bytes:
+    the first byte after a low byte always starts a token, and markers and their values alternate from there.
+    :param data: RLE encoded bytes
+    :param size: number of decoded bytes expected
+    :return: uint8 array of the decoded bytes
+    """
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    high = encoded >= 0xC0
+    positions = np.arange(len(encoded))
+    # index of the first byte of the run of high bytes each byte belongs to
+    run_start = np.where(high & ~np.concatenate(([False], high[:-1])), positions, 0)
+    run_start = np.maximum.accumulate(run_start)
+    marker = high & ((positions - run_start) % 2 == 0)
+    # a byte directly following a marker is its value, all remaining bytes are literals
+    value = np.concatenate(([False], marker[:-1]))
+    literal = ~marker & ~value
+    if len(encoded) and marker[-1]:
+        raise ValueError("PCX RLE stream ends with a run marker")
+
+    token_starts = np.flatnonzero(marker | literal)
+    counts = np.where(marker[token_starts], encoded[token_starts] & 0x3F, 1)
+    values = encoded[token_starts + marker[token_starts]]
+    decoded = np.repeat(values, counts)
+    if len(decoded) < size:
+        raise ValueError(f"PCX image data too short: {len(decoded)} of {size} bytes")
+    return decoded[:size]
+
+
+def decode_pcx(pcx_bytes):
+    """
+    Decodes an 8 bit PCX image, either palettized (1 plane) or true color (3 or 4 planes)
+    :param pcx_bytes: bytes-like object holding a whole .pcx file
+    :return: tuple of width, height and a flat float32 RGBA array with the first row at the bottom like Blender expects
+    """
+    (manufacturer, version, encoding, bits_per_pixel, xmin, ymin, xmax, ymax) = struct.unpack("<BBBBHHHH", pcx_bytes[:12])
+    (num_planes, bytes_per_line) = struct.unpack("<BH", pcx_bytes[65:68])
+    if manufacturer != 0x0A or encoding != 1:
+        raise ValueError("Error: File is not a run length encoded PCX image")
+    if bits_per_pixel != 8 or num_planes not in (1, 3, 4):
+        raise ValueError(f"Error: Unsupported PCX format: {bits_per_pixel} bits per pixel, {num_planes} planes")
+    width = xmax - xmin + 1
+    height = ymax - ymin + 1
+
+    data_end = len(pcx_bytes)
+    if num_planes == 1:
+        data_end -= PALETTE_SIZE + 1
+        if pcx_bytes[data_end] != 0x0C:
+            raise ValueError("Error: PCX file misses its 256 color palette")
+    decoded = decode_rle(pcx_bytes[PCX_HEADER_SIZE:data_end], height * num_planes * bytes_per_line)
+    scanlines = decoded.reshape(height, num_planes, bytes_per_line)[:, :, :width]
+
+    rgba = np.full((height, width, 4), 255, dtype=np.uint8)
+    if num_planes == 1:
+        palette = np.frombuffer(pcx_bytes, dtype=np.uint8, count=PALETTE_SIZE, offset=data_end + 1).reshape(256, 3)
+        rgba[:, :, :3] = palette[scanlines[:, 0]]
+    else:
+        rgba[:, :, :num_planes] = scanlines.transpose(0, 2, 1)
+
+    pixels = rgba[::-1].astype(np.float32).ravel()
+    pixels *= 1 / 255
+    return width, height, pixels
+
+
+def load_pcx(path):
+    """
+    Loads a PCX image from disk
+    :param path: path to the .pcx file
+    :return: see decode_pcx
+    """
+    with open(path, "rb") as f:
+        return decode_pcx(f.read())
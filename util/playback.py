@@ -0,0 +1,105 @@
+import math
+import numpy as np
+from . import MD2
+"""
+Keyframe-free playback of MD2 animations. The frames stay compressed like in the file (one byte per coordinate with
+per frame scale and translate, for lazily loaded models a view of the memory-mapped file) and only the frame shown,
+or the two frames interpolated between, are decoded into a reused buffer. The frame change handler writing the buffer
+into the mesh is in blender_load_md2.py.
+"""
+
+
+def frame_blend(time, num_frames, loop=True):
+    """
+    Finds the frames to show at a point of an animation
+    :param time: time since the animation's start in animation frames, e.g. 2.5 is halfway between frame 2 and 3
+    :param num_frames: number of frames of the animation
+    :param loop: whether the animation loops, blending from its last frame back into its first one like the keyed
+                 animations do. Otherwise it holds its first and last frame before and after playing.
+    :return: tuple of the two frames' positions in the animation and the weight of the second one from 0 to 1
+    """
+    if num_frames < 1:
+        raise ValueError(f"Error: an animation needs at least one frame, not {num_frames}")
+    if loop:
+        time = math.fmod(time, num_frames)
+        time += num_frames if time < 0 else 0
+    else:
+        time = min(max(time, 0.0), num_frames - 1)
+    first = min(int(math.floor(time)), num_frames - 1)
+    return first, (first + 1) % num_frames, time - first
+
+
+class FramePlayer:
+    """
+    Decodes frames of one model from its compressed vertices for playback
+    """
+
+    def __init__(self, compressed, scale, translate, animations, fps=10, interpolate=True):
+        """
+        :param compressed: uint8 array (num_frames, num_xyz, 3 or more) of compressed vertices, extra columns like
+                           the light normal index are ignored
+        :param scale: float32 array (num_frames, 3)
+        :param translate: float32 array (num_frames, 3)
+        :param animations: dict of animation name -> list of the animation's MD2 frame indices, in playback order
+        :param fps: MD2 frames played per second
+        :param interpolate: blend linearly between frames, otherwise each frame is held until the next one
+        """
+        self.compressed = compressed
+        self.scale = scale
+        self.translate = translate
+        self.animations = animations
+        self.fps = fps
+        self.interpolate = interpolate
+        num_xyz = compressed.shape[1]
+        self._positions = np.empty((num_xyz, 3), dtype=np.float32)
+        self._next = np.empty((num_xyz, 3), dtype=np.float32)
+
+    @classmethod
+    def from_model(cls, model, animations, fps=10, interpolate=True):
+        """
+        :param model: md2_object. Lazily loaded models are played from their memory-mapped frames without a copy,
+                      the dequantized positions of other models are compressed again with their frames' scale and
+                      translate, which gives back the bytes of the file.
+        :return: FramePlayer, see __init__ for the other arguments
+        """
+        return cls(*MD2.compressed_frames(model), animations, fps, interpolate)
+
+    def _decode(self, frame, out):
+        np.multiply(self.compressed[frame, :, :3], self.scale[frame], out=out)
+        out += self.translate[frame]
+        return out
+
+    def frame(self, frame, next_frame=None, weight=0.0):
+        """
+        :param frame: MD2 frame index
+        :param next_frame: MD2 frame index blended in by weight
+        :param weight: weight of next_frame from 0 to 1
+        :return: float32 positions (num_xyz, 3). The buffer is reused by the next call.
+        """
+        positions = self._decode(frame, self._positions)
+        if next_frame is not None and weight > 0 and next_frame != frame:
+            following = self._decode(next_frame, self._next)
+            following -= positions
+            following *= weight
+            positions += following
+        return positions
+
+    def at(self, seconds, animation=None, loop=True):
+        """
+        :param seconds: time since the animation's start
+        :param animation: name of the animation to play, the first one if None or unknown
+        :return: float32 positions (num_xyz, 3) of the model at that time. The buffer is reused by the next call.
+        """
+        frames = self.animations.get(animation) or next(iter(self.animations.values()))
+        first, second, weight = frame_blend(seconds * self.fps, len(frames), loop)
+        if not self.interpolate:
+            weight = 0.0
+        return self.frame(frames[first], frames[second], weight)
+
+    @property
+    def nbytes(self):
+        """ memory held by the player, without the memory-mapped frames of lazily loaded models """
+        own = self._positions.nbytes + self._next.nbytes
+        if isinstance(self.compressed, np.ndarray) and self.compressed.base is None:
+            own += self.compressed.nbytes
+        return own
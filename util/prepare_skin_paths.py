@@ -1,15 +1,18 @@
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 def get_path_from_skin_name(md2_path: str, skin_name: str):
     # strings are always stored as 64 bytes, so unused bytes are set to '\x00'
     first_stored_path = skin_name.rstrip("\x00")
     # only first stored path is used since Digital Paintball 2 only uses that one
     first_stored_path = first_stored_path.split("/")[-1]
-    print(f'first_stored_path: {first_stored_path}')
+    logger.debug(f'first_stored_path: {first_stored_path}')
     # absolute path is formed by using the given md2 object path
     absolute_first_stored_path = "/".join(md2_path.split("/")[:-1]) + "/" + first_stored_path
-    print(f'absolute_first_stored_path: {absolute_first_stored_path}')
+    logger.debug(f'absolute_first_stored_path: {absolute_first_stored_path}')
     skin_path = absolute_first_stored_path
 
     return skin_path
@@ -22,10 +25,131 @@ def get_existing_skin_path(skin_path: str):
     """ Look for existing file of given name and supported image format """
     supported_image_formats = [".png", ".jpg", ".jpeg", ".tga", ".pcx"]  # Order doesn't match DP2 image order
     skin_path_unextended = os.path.splitext(skin_path)[0]  # remove extension (last one)
-    print(f'skin_path_unextended: {skin_path_unextended}')
+    logger.debug(f'skin_path_unextended: {skin_path_unextended}')
     for format in supported_image_formats:
         full_path = skin_path_unextended + format
-        print(f'full_path: {full_path}')
+        logger.debug(f'full_path: {full_path}')
         if os.path.isfile(full_path):
             skin_path = skin_path_unextended + format
             return skin_path
+
+
+SKIN_EXTENSIONS = [".png", ".jpg", ".jpeg", ".tga", ".pcx"]  # ranking of extensions, same as get_existing_skin_path
+
+
+def skin_key(skin_name: str):
+    """
+    Normalizes a stored skin name or relative path to the key used by SkinResolver
+    e.g. 'Models/sk89q/w_sitters/car.jpg\\x00ght.jpg' -> 'models/sk89q/w_sitters/car'
+    """
+    name = skin_name.split("\x00")[0].replace("\\", "/").strip("/").lower()
+    return os.path.splitext(name)[0]
+
+
+def skin_source_key(skin_path: str, pak_path: str = None):
+    """
+    Identifies the content of a resolved skin, so images created from it can be reused until the file changes
+    :param skin_path: path to the skin file or its entry name inside the .pak at pak_path
+    :param pak_path: optional path of the .pak archive the skin is read from
+    :return: string of the absolute path and its modification time and size
+    """
+    path = os.path.abspath(pak_path if pak_path else skin_path)
+    stat = os.stat(path)
+    source = f"{path}:{skin_path}" if pak_path else path
+    return f"{source}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+class SkinResolver:
+    """
+    Resolves stored skin names against a list of game search roots like quake2/baseq2. Every root is scanned once into a
+    case-insensitive index from the path without extension to the file with the best-ranked extension. Refreshing only
+    rescans directories whose mtime changed.
+    """
+
+    def __init__(self, search_roots, extensions=None):
+        self.search_roots = [os.path.abspath(x) for x in search_roots]
+        self.extensions = extensions or SKIN_EXTENSIONS
+        self._ranks = {x: rank for rank, x in enumerate(self.extensions)}
+        self._dirs = dict()  # directory -> (mtime, subdirectories, {lowercase stem: (rank, path)})
+        self.index = dict()  # lowercase path relative to its root without extension -> best path
+        self.name_index = dict()  # lowercase file name without extension -> best path
+        self.refresh()
+
+    def _scan_dir(self, directory):
+        """
+        Lists a directory, reusing the last listing if its mtime didn't change
+        :return: tuple of subdirectories and {lowercase stem: (rank, path)}, None if the directory doesn't exist
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._dirs.pop(directory, None)
+            return None
+        cached = self._dirs.get(directory)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+        subdirs = list()
+        skins = dict()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                rank = self._ranks.get(ext.lower())
+                if rank is None:
+                    continue
+                stem = stem.lower()
+                if stem not in skins or rank < skins[stem][0]:
+                    skins[stem] = (rank, entry.path)
+        self._dirs[directory] = (mtime, subdirs, skins)
+        return subdirs, skins
+
+    def refresh(self):
+        """
+        Rebuilds the index, only listing directories that changed since the last scan
+        """
+        index = dict()
+        name_index = dict()
+        seen = set()
+        for root in self.search_roots:
+            root_index = dict()
+            pending = [root]
+            while pending:
+                directory = pending.pop()
+                scanned = self._scan_dir(directory)
+                if scanned is None:
+                    continue
+                seen.add(directory)
+                subdirs, skins = scanned
+                pending.extend(subdirs)
+                prefix = os.path.relpath(directory, root).replace(os.sep, "/").lower()
+                prefix = "" if prefix == "." else prefix + "/"
+                for stem, (rank, path) in skins.items():
+                    root_index[prefix + stem] = path
+                    if stem not in name_index:
+                        name_index[stem] = path
+            # earlier roots take precedence like game search paths
+            for key, path in root_index.items():
+                index.setdefault(key, path)
+        # forget directories which were removed, except single model directories looked up by resolve()
+        for directory in [x for x in self._dirs if x not in seen and not os.path.isdir(x)]:
+            del self._dirs[directory]
+        self.index = index
+        self.name_index = name_index
+
+    def resolve(self, skin_name: str, md2_path: str = None):
+        """
+        Finds an existing skin for a name stored in an MD2. Like get_path_from_skin_name, the MD2's own directory is
+        checked first, then the stored path relative to the search roots, then the file name anywhere in the roots.
+        :param skin_name: skin name as stored in the MD2, e.g. 'models/sk89q/w_sitters/car.jpg'
+        :param md2_path: optional path of the MD2 file
+        :return: path to the skin file with the best-ranked extension or None
+        """
+        key = skin_key(skin_name)
+        stem = key.split("/")[-1]
+        if md2_path:
+            scanned = self._scan_dir(os.path.dirname(os.path.abspath(md2_path)))
+            if scanned is not None and stem in scanned[1]:
+                return scanned[1][stem][1]
+        return self.index.get(key) or self.name_index.get(stem)
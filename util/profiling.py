@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import cProfile
+import json
+import time
+"""
+Per stage timing and counters of an import, returned as a structured report
+"""
+
+
+class ImportReport:
+    """
+    Collects the wall time of named stages and counters like the number of vertices or keyframes.
+    Stages entered more than once accumulate their time, stages entered inside of another one are stored as
+    "outer/inner" so e.g. the parser's stages show up below the importer's parse stage.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()  # stage name -> seconds
+        self.counters = OrderedDict()  # counter name -> value
+        self._active = list()  # names of the stages currently entered
+
+    @contextmanager
+    def stage(self, name):
+        name = "/".join(self._active + [name])
+        self._active.append(name.rsplit("/", 1)[-1])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            self._active.pop()
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total_seconds(self):
+        """ time spent in top level stages """
+        return sum(seconds for name, seconds in self.stages.items() if "/" not in name)
+
+    def to_dict(self):
+        return {"stages": dict(self.stages), "counters": dict(self.counters), "total_seconds": self.total_seconds}
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def summary(self):
+        """ one line overview for logs """
+        stages = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.stages.items())
+        counters = ", ".join(f"{name} {value}" for name, value in self.counters.items())
+        return f"{self.total_seconds * 1000:.1f} ms ({stages}); {counters}"
+
+
+@contextmanager
+def profiled(path=None):
+    """
+    Runs the enclosed code under cProfile and writes the stats to path, does nothing if path is empty
+    """
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
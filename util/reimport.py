@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from typing import List
+import numpy as np
+from . import MD2
+from .animations import clean_frame_name
+"""
+Fingerprints of imported models, used to update a previous import in place when its source file changed. Only the
+parts whose fingerprint differs (frames, topology, UVs, skin or the animation settings) need to be rewritten.
+The fingerprints are stored as JSON in a custom property of the imported object.
+"""
+
+FINGERPRINT_VERSION = 2
+
+
+def array_hash(*arrays):
+    """
+    :return: short hex digest of the arrays' shapes and contents
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def frame_hashes(model, frames):
+    """
+    Hashes frames by their compressed vertices, scale and translate without dequantizing them. Coordinates on axes
+    with a zero scale don't change the positions and are left out, so a lazily loaded model and the same model loaded
+    eagerly give the same hashes.
+    :param model: md2_object
+    :param frames: MD2 frame indices
+    :return: list of hex digests in the order of frames
+    """
+    compressed, scale, translate = MD2.compressed_frames(model, np.asarray(frames, dtype=np.intp))
+    compressed = np.where(scale[:, np.newaxis] > 0, compressed[:, :, :3], 0)
+    return [array_hash(compressed[i], scale[i], translate[i]) for i in range(len(compressed))]
+
+
+def model_fingerprint(model, selected_frames, animation_settings=None, skin_key=None):
+    """
+    :param model: md2_object
+    :param selected_frames: indices of the imported MD2 frames in the order they were imported, only these frames
+                            are hashed
+    :param animation_settings: dict of import options the animation depends on, like the animation mode and fps
+    :param skin_key: key of the skin file the material shows (see skin_source_key), None if there is none
+    :return: JSON serializable dict
+    """
+    return {
+        "version": FINGERPRINT_VERSION,
+        "topology": array_hash(np.array([model.header.num_xyz]), model.vertex_indices),
+        "uvs": array_hash(model.st, model.texture_indices),
+        "frames": frame_hashes(model, selected_frames),  # in the order of selected_frames
+        "frame_names": [clean_frame_name(x) for x in model.frame_info["name"].tolist()],
+        "selected_frames": [int(x) for x in selected_frames],
+        "animation": animation_settings or dict(),
+        "skin": skin_key,
+    }
+
+
+def dumps_fingerprint(fingerprint):
+    return json.dumps(fingerprint, separators=(",", ":"))
+
+
+def loads_fingerprint(text):
+    """
+    :return: fingerprint dict or None if text isn't a fingerprint of the current version
+    """
+    try:
+        fingerprint = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(fingerprint, dict) or fingerprint.get("version") != FINGERPRINT_VERSION:
+        return None
+    return fingerprint
+
+
+@dataclass(slots=True)
+class reimport_plan_t:
+    topology: bool = False  # vertex count or triangles changed, the mesh has to be rebuilt
+    animation: bool = False  # frame layout or animation settings changed, all keys have to be rebuilt
+    frames: List[int] = field(default_factory=list)  # imported MD2 frames whose vertices changed
+    uvs: bool = False
+    skin: bool = False
+
+    @property
+    def unchanged(self):
+        return not (self.topology or self.animation or self.frames or self.uvs or self.skin)
+
+
+def plan_reimport(old, new):
+    """
+    Compares the fingerprint of the previous import to the one of the changed file
+    :param old: fingerprint stored with the previous import, None rebuilds everything
+    :param new: fingerprint of the model to import
+    :return: reimport_plan_t. A topology change implies rebuilding animation, UVs and skin as well.
+    """
+    if old is None or old["topology"] != new["topology"]:
+        return reimport_plan_t(topology=True, animation=True, uvs=True, skin=True)
+    plan = reimport_plan_t(uvs=old["uvs"] != new["uvs"], skin=old["skin"] != new["skin"])
+    plan.animation = old["frame_names"] != new["frame_names"] or old["selected_frames"] != new["selected_frames"] or \
+        old["animation"] != new["animation"]
+    if not plan.animation:
+        # equal selected frames, so both lists of frame hashes are in the same order
+        plan.frames = [x for x, a, b in zip(new["selected_frames"], old["frames"], new["frames"]) if a != b]
+    return plan
+
+
+class SourceWatcher:
+    """
+    Polls files for changes of their size or modification time, used to trigger re-imports
+    """
+
+    def __init__(self):
+        self.stats = dict()  # path -> (size, mtime_ns) or None if missing
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def watch(self, paths):
+        """
+        Sets the watched files, files watched before keep their last seen state
+        """
+        self.stats = {x: self.stats[x] if x in self.stats else self._stat(x) for x in paths}
+
+    def changed(self):
+        """
+        :return: list of watched files which changed since the last call and still exist
+        """
+        changed = list()
+        for path, old in self.stats.items():
+            new = self._stat(path)
+            if new != old:
+                self.stats[path] = new
+                if new is not None:
+                    changed.append(path)
+        return changed